@@ -0,0 +1,208 @@
+﻿import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+CLASSIFIER_MARKER = "分类器"
+
+
+def _messages(body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    messages = body.get("input") or body.get("messages") or []
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return messages
+
+
+def _filler_zh(rng: random.Random, chars: int) -> str:
+    # Per-item text, so story clustering does not see every item as the same story.
+    return "".join(chr(0x4E00 + rng.randrange(3000)) for _ in range(chars))
+
+
+def _classification_json(prompt: str) -> str:
+    category_ids = re.findall(r'"id": "([a-z_]+)"', prompt) or ["products_apps"]
+    seed = int(hashlib.md5(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    return json.dumps(
+        {
+            "summary_bullets_zh": [f"要点{i}：{_filler_zh(rng, 40)}。" for i in range(1, 6)],
+            "so_what_zh": "该进展可能影响相关领域的产品与研究方向。",
+            "primary_category_id": category_ids[seed % len(category_ids)],
+            "tags": ["模型", "发布", "评测", "应用"][: 3 + seed % 2],
+            "impact": ["High", "Medium", "Low"][seed % 3],
+            "confidence": 0.8,
+            "reason": "符合该类目的定义与边界。",
+        },
+        ensure_ascii=False,
+    )
+
+
+def _blog_markdown(prompt: str) -> str:
+    sections = "\n\n".join(f"### 主线 {i}\n本周相关新闻显示该方向持续升温，材料长度 {len(prompt)} 字符。" for i in range(1, 4))
+    return f"# 本周 AI 观察\n\n{sections}\n\n### 趋势展望\n继续关注。\n"
+
+
+def reply_for(body: Dict[str, Any]) -> Tuple[str, int]:
+    messages = _messages(body)
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    text = _classification_json(prompt) if CLASSIFIER_MARKER in system else _blog_markdown(prompt)
+    return text, max(1, len(prompt) // 4)
+
+
+def _usage_responses(input_tokens: int, text: str) -> Dict[str, Any]:
+    output_tokens = max(1, len(text) // 4)
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+        "input_tokens_details": {"cached_tokens": 0},
+        "output_tokens_details": {"reasoning_tokens": 0},
+    }
+
+
+def response_object(model: str, text: str, input_tokens: int) -> Dict[str, Any]:
+    return {
+        "id": "resp_bench",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "output": [
+            {
+                "type": "message",
+                "id": "msg_bench",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": _usage_responses(input_tokens, text),
+    }
+
+
+def chat_object(model: str, text: str, input_tokens: int) -> Dict[str, Any]:
+    output_tokens = max(1, len(text) // 4)
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive
+    # clients wait out a delayed ACK (~40 ms) on every call.
+    disable_nagle_algorithm = True
+    latency = 0.0
+    tail_rate = 0.0
+    tail_latency = 0.0
+    chunk_chars = 40
+
+    def log_message(self, format, *args):
+        return
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_events(self, events: List[Tuple[str, Dict[str, Any]]], done: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for name, payload in events:
+            prefix = f"event: {name}\n" if name else ""
+            self.wfile.write(f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        if done:
+            self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        delay = self.latency + (self.tail_latency if random.random() < self.tail_rate else 0.0)
+        if delay:
+            time.sleep(delay)
+        model = body.get("model", "bench-model")
+        text, input_tokens = reply_for(body)
+        chunks = [text[i : i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+
+        if self.path.endswith("/responses"):
+            if not body.get("stream"):
+                return self._send_json(200, response_object(model, text, input_tokens))
+            events = [
+                (
+                    "response.output_text.delta",
+                    {
+                        "type": "response.output_text.delta",
+                        "item_id": "msg_bench",
+                        "output_index": 0,
+                        "content_index": 0,
+                        "delta": chunk,
+                        "logprobs": [],
+                        "sequence_number": i,
+                    },
+                )
+                for i, chunk in enumerate(chunks)
+            ]
+            events.append(
+                (
+                    "response.completed",
+                    {
+                        "type": "response.completed",
+                        "response": response_object(model, text, input_tokens),
+                        "sequence_number": len(chunks),
+                    },
+                )
+            )
+            return self._send_events(events, done=False)
+
+        if self.path.endswith("/chat/completions"):
+            if not body.get("stream"):
+                return self._send_json(200, chat_object(model, text, input_tokens))
+            events = [
+                (
+                    "",
+                    {
+                        "id": "chatcmpl-bench",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+                    },
+                )
+                for chunk in chunks
+            ]
+            return self._send_events(events, done=True)
+
+        return self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+
+def start_fake_openai(
+    latency_ms: float = 0.0, port: int = 0, tail_rate: float = 0.0, tail_ms: float = 0.0
+) -> Tuple[ThreadingHTTPServer, str]:
+    handler = type(
+        "Handler",
+        (FakeOpenAIHandler,),
+        {"latency": latency_ms / 1000.0, "tail_rate": tail_rate, "tail_latency": tail_ms / 1000.0},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
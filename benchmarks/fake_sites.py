@@ -0,0 +1,123 @@
+﻿import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+WORDS = (
+    "model benchmark reasoning multimodal agent workflow GPU inference latency throughput dataset training "
+    "finetune open source weights license regulation policy funding acquisition product launch feature API "
+    "SDK framework vector embedding safety alignment privacy compliance research paper experiment"
+).split()
+
+
+def _sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+def article_html(feed: int, index: int, paragraphs: int = 12) -> str:
+    rng = random.Random(feed * 100003 + index)
+    body = "\n".join(
+        f"<p>{' '.join(_sentence(rng, rng.randint(12, 28)) for _ in range(4))}</p>" for _ in range(paragraphs)
+    )
+    nav = "".join(f'<li><a href="/nav/{i}">Section {i}</a></li>' for i in range(30))
+    return (
+        "<!doctype html><html><head><title>Article</title>"
+        "<script>var tracking = {};</script><style>body { font: 14px sans-serif; }</style></head>"
+        f"<body><nav><ul>{nav}</ul></nav><main><article><h1>Feed {feed} story {index}</h1>{body}</article></main>"
+        "<footer>Copyright</footer></body></html>"
+    )
+
+
+def feed_xml(base_url: str, feed: int, items: int) -> str:
+    rng = random.Random(feed)
+    entries = []
+    for index in range(items):
+        link = f"{base_url}/articles/{feed}/{index}.html"
+        title = f"{_sentence(rng, 6)[:-1]} ({feed}-{index})"
+        entries.append(
+            "<item>"
+            f"<title>{escape(title)}</title><link>{link}</link><guid>{link}</guid>"
+            f"<pubDate>Mon, 0{1 + index % 7} Jan 2024 0{index % 10}:00:00 +0000</pubDate>"
+            f"<description>{escape(_sentence(rng, 30))}</description>"
+            "</item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+        f"<title>Bench feed {feed}</title><link>{base_url}</link>{''.join(entries)}</channel></rss>"
+    )
+
+
+def list_page_html(base_url: str, source: int, items: int) -> str:
+    cards = "".join(
+        f'<div class="card"><a href="/articles/{1000 + source}/{i}.html"><h2>Web source {source} story number {i}</h2></a>'
+        f'<time datetime="2024-01-0{1 + i % 7}T09:00:00+00:00"></time></div>'
+        for i in range(items)
+    )
+    return f"<html><body>{cards}</body></html>"
+
+
+class FakeSiteHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    # A random share of responses is slowed down by tail_latency, like a
+    # host that now and then stalls.
+    tail_rate = 0.0
+    tail_latency = 0.0
+    items_per_feed = 20
+
+    def log_message(self, format, *args):
+        return
+
+    def _send(self, status: int, body: str, content_type: str) -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        delay = self.latency + (self.tail_latency if random.random() < self.tail_rate else 0.0)
+        if delay:
+            time.sleep(delay)
+        base_url = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split("/") if p]
+        try:
+            items = int(parse_qs(parsed.query).get("items", [self.items_per_feed])[0])
+            if len(parts) == 2 and parts[0] == "feeds":
+                return self._send(200, feed_xml(base_url, int(parts[1].split(".")[0]), items), "application/rss+xml")
+            if len(parts) == 2 and parts[0] == "lists":
+                return self._send(200, list_page_html(base_url, int(parts[1].split(".")[0]), items), "text/html")
+            if len(parts) == 3 and parts[0] == "articles":
+                return self._send(200, article_html(int(parts[1]), int(parts[2].split(".")[0])), "text/html")
+        except ValueError:
+            pass
+        return self._send(404, "not found", "text/plain")
+
+
+def start_fake_sites(
+    latency_ms: float = 0.0, items_per_feed: int = 20, port: int = 0, tail_rate: float = 0.0, tail_ms: float = 0.0
+) -> Tuple[ThreadingHTTPServer, str]:
+    handler = type(
+        "Handler",
+        (FakeSiteHandler,),
+        {
+            "latency": latency_ms / 1000.0,
+            "tail_rate": tail_rate,
+            "tail_latency": tail_ms / 1000.0,
+            "items_per_feed": items_per_feed,
+        },
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-sites", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def stop_server(server: Optional[ThreadingHTTPServer]) -> None:
+    if server is not None:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,99 @@
+﻿import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Set, Tuple
+
+import yaml
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+MAIN_PY = os.path.join(REPO_ROOT, "main.py")
+
+HEAVY_MODULES = (
+    "bs4",
+    "feedparser",
+    "jsonschema",
+    "openai",
+    "readability",
+    "requests",
+    "tenacity",
+    "trafilatura",
+)
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int]]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.startswith(" ") and not name.startswith("  "):
+            rows.append((name.strip(), int(cumulative)))
+    return rows
+
+
+def _imported_modules(stderr: str) -> Set[str]:
+    names = set()
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            names.add(line.split("|")[-1].strip())
+    return names
+
+
+def measure(args: List[str], cwd: str, baseline: Set[str]) -> Tuple[float, Set[str]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", MAIN_PY] + args,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    total_us = sum(us for name, us in _parse_importtime(proc.stderr) if name not in baseline)
+    return total_us / 1000.0, _imported_modules(proc.stderr)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time regression check for fast CLI commands")
+    parser.add_argument("--budget-ms", type=float, default=150.0, help="Max import time per command (best of --repeat)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command; the fastest is compared to the budget")
+    args = parser.parse_args(argv)
+
+    startup = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    baseline = _imported_modules(startup.stderr)
+
+    workdir = tempfile.mkdtemp(prefix="ai_news_import_time_")
+    with open(os.path.join(REPO_ROOT, "config.yaml"), "r", encoding="utf-8-sig") as f:
+        cfg = yaml.safe_load(f)
+    cfg.setdefault("storage", {})["db_path"] = os.path.join(workdir, "import_time.db")
+    cfg_path = os.path.join(workdir, "config.yaml")
+    with open(cfg_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, allow_unicode=True)
+
+    commands: Dict[str, List[str]] = {
+        "--help": ["--help"],
+        "init-db": ["init-db", "--config", cfg_path],
+    }
+
+    failed = False
+    for label, command in commands.items():
+        best = None
+        loaded: Set[str] = set()
+        for _ in range(max(1, args.repeat)):
+            elapsed, modules = measure(command, workdir, baseline)
+            best = elapsed if best is None else min(best, elapsed)
+            loaded |= modules
+        heavy = sorted(m for m in loaded if m.split(".")[0] in HEAVY_MODULES)
+        status = "ok"
+        if best > args.budget_ms or heavy:
+            status = "FAIL"
+            failed = True
+        print(f"{label:<10} {best:8.1f} ms (budget {args.budget_ms:.0f} ms)  {status}")
+        if heavy:
+            print(f"           heavy modules imported: {', '.join(heavy[:10])}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
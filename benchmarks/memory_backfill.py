@@ -0,0 +1,132 @@
+﻿import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_PATH = os.path.join(os.path.dirname(BENCH_DIR), "src")
+FEEDS = 20
+MIB = 1024 * 1024
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MIB
+
+
+def run_child(spec: Dict[str, Any]) -> Dict[str, Any]:
+    sys.path.insert(0, SRC_PATH)
+    sys.path.insert(0, BENCH_DIR)
+    os.chdir(spec["workdir"])
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = spec["llm_url"]
+
+    from run_benchmarks import build_config
+
+    from ai_news_feed import pipeline
+
+    cfg = build_config(spec)
+    cfg["output"]["include_weekly_blog"] = False
+
+    # The probes wrap functions the pipeline calls once per item and once per
+    # digest; the digest read marks the end of ingestion.
+    samples: List[Dict[str, float]] = []
+    phases: Dict[str, float] = {}
+    summarize = pipeline.summarize_and_classify
+    read_week = pipeline.iter_items_between
+
+    def summarize_probe(item, content, cfg):
+        done = len(samples) and samples[-1]["items"]
+        count = phases["items"] = phases.get("items", 0) + 1
+        if count - done >= spec["sample_every"]:
+            samples.append({"items": count, "traced_mb": tracemalloc.get_traced_memory()[0] / MIB, "rss_mb": _rss_mb()})
+        return summarize(item, content, cfg)
+
+    def read_week_probe(conn, start_iso, end_iso):
+        current, peak = tracemalloc.get_traced_memory()
+        phases.update(ingest_peak_mb=peak / MIB, ingest_end_mb=current / MIB, ingest_rss_mb=_rss_mb())
+        tracemalloc.reset_peak()
+        return read_week(conn, start_iso, end_iso)
+
+    pipeline.summarize_and_classify = summarize_probe
+    pipeline.iter_items_between = read_week_probe
+    tracemalloc.start()
+    pipeline.run_pipeline(cfg)
+    phases["digest_peak_mb"] = tracemalloc.get_traced_memory()[1] / MIB
+    phases["rss_mb"] = _rss_mb()
+    return {"phases": phases, "samples": samples}
+
+
+def run_size(items: int, site_url: str, llm_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix=f"ai_news_memory_{items}_")
+    spec = {
+        "feeds": FEEDS,
+        "items_per_feed": items // FEEDS,
+        "web_sources": 0,
+        "site_url": site_url,
+        "llm_url": llm_url,
+        "workdir": workdir,
+        "sample_every": max(1, items // 10),
+    }
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Backfill of {items} items failed:\n{proc.stderr[-4000:]}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        if not args.keep_workdirs:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Peak memory of a backfill run as the item count grows")
+    parser.add_argument("--items", default="1000,10000", help="Comma-separated backfill sizes")
+    parser.add_argument("--max-growth-mb", type=float, default=16.0, help="Allowed ingest peak growth, smallest to largest")
+    parser.add_argument("--keep-workdirs", action="store_true", help="Keep the databases and digests")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return 0
+
+    sys.path.insert(0, BENCH_DIR)
+    from fake_openai import start_fake_openai
+    from fake_sites import start_fake_sites, stop_server
+
+    sizes = sorted(int(n) for n in args.items.split(",") if n.strip())
+    site_server, site_url = start_fake_sites()
+    llm_server, llm_url = start_fake_openai()
+    try:
+        results = {items: run_size(items, site_url, llm_url, args) for items in sizes}
+    finally:
+        stop_server(site_server)
+        stop_server(llm_server)
+
+    # traced_mb is Python heap (tracemalloc); RSS also counts the interpreter,
+    # imported modules and the SQLite page cache.
+    print(f"{'items':>7} {'ingest peak':>12} {'ingest end':>11} {'digest peak':>12} {'rss':>8}   traced MiB every 10%")
+    for items, res in results.items():
+        ph = res["phases"]
+        curve = " ".join(f"{s['traced_mb']:.1f}" for s in res["samples"])
+        print(
+            f"{items:>7} {ph['ingest_peak_mb']:>10.1f}MB {ph['ingest_end_mb']:>9.1f}MB "
+            f"{ph['digest_peak_mb']:>10.1f}MB {ph['rss_mb']:>6.1f}MB   {curve}"
+        )
+
+    growth = results[sizes[-1]]["phases"]["ingest_peak_mb"] - results[sizes[0]]["phases"]["ingest_peak_mb"]
+    print(f"\nIngest peak growth {sizes[0]} -> {sizes[-1]} items: {growth:+.1f} MiB (limit {args.max_growth_mb:.1f})")
+    return 1 if growth > args.max_growth_mb else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+﻿import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_openai import _filler_zh  # noqa: E402
+
+from ai_news_feed.cluster import hashed_vectors  # noqa: E402
+from ai_news_feed.vectors import VectorStore  # noqa: E402
+
+BATCH = 1024
+
+
+def _vocabulary(rng: random.Random, size: int) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(size)]
+
+
+def make_story(rng: random.Random, vocab: List[str]) -> Tuple[str, List[str]]:
+    # Zipf-ish word choice, so a few title words are common and most are rare.
+    title = " ".join(vocab[min(len(vocab) - 1, int(rng.paretovariate(1.1)) - 1)] for _ in range(8))
+    return title, [_filler_zh(rng, 40) for _ in range(5)]
+
+
+def follow_up(rng: random.Random, vocab: List[str], title: str, bullets: List[str]) -> str:
+    # A later report of the same story: half the title reworded, some bullets kept.
+    words = title.split()
+    for i in rng.sample(range(len(words)), len(words) // 2):
+        words[i] = rng.choice(vocab)
+    return "\n".join([" ".join(words)] + rng.sample(bullets, 2) + [_filler_zh(rng, 40) for _ in range(3)])
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Append and top-k lookup speed of the related-history vector store")
+    parser.add_argument("--items", type=int, default=100000, help="Stored items")
+    parser.add_argument("--queries", type=int, default=200, help="Digest entries looked up at once")
+    parser.add_argument("--dims", type=int, default=512, help="Vector dimensions")
+    parser.add_argument("--top-k", type=int, default=3, help="Results per entry")
+    parser.add_argument("--min-recall", type=float, default=0.9, help="Fail if fewer follow-ups find their story")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(7)
+    vocab = _vocabulary(rng, 20000)
+    workdir = tempfile.mkdtemp(prefix="ai_news_vectors_")
+    try:
+        store = VectorStore(os.path.join(workdir, "vectors"), args.dims)
+        targets = set(rng.sample(range(args.items), args.queries))
+        queries: List[Tuple[int, str]] = []
+        embed_sec = 0.0
+        started = time.perf_counter()
+        for start in range(0, args.items, BATCH):
+            texts = []
+            for item_id in range(start, min(args.items, start + BATCH)):
+                title, bullets = make_story(rng, vocab)
+                texts.append("\n".join([title] + bullets))
+                if item_id in targets:
+                    queries.append((item_id, follow_up(rng, vocab, title, bullets)))
+            t0 = time.perf_counter()
+            vectors = hashed_vectors(texts, args.dims)
+            embed_sec += time.perf_counter() - t0
+            item_ids = list(range(start, start + len(texts)))
+            store.append(item_ids, item_ids, vectors)
+        store.close()
+        print(
+            f"append: {args.items} items in {time.perf_counter() - started:.1f}s "
+            f"(embedding {embed_sec:.1f}s), {os.path.getsize(os.path.join(workdir, 'vectors', 'vectors.f32')) / 1e6:.0f} MB"
+        )
+
+        store = VectorStore(os.path.join(workdir, "vectors"), args.dims)
+        query_vectors = hashed_vectors([text for _, text in queries], args.dims)
+        timings = []
+        for _ in range(3):
+            t0 = time.perf_counter()
+            found = store.top_k(query_vectors, args.top_k)
+            timings.append(time.perf_counter() - t0)
+        hits = sum(1 for (item_id, _), matches in zip(queries, found) if item_id in [i for i, _ in matches])
+        recall = hits / len(queries)
+        scores = sorted(matches[0][1] for matches in found if matches)
+        print(
+            f"lookup: {len(queries)} entries x top-{args.top_k} over {store.count} vectors in "
+            f"{min(timings) * 1000:.0f} ms (best of 3, first {timings[0] * 1000:.0f} ms)"
+        )
+        # Fresh stories have no past coverage; their best score is the noise
+        # floor related.min_score has to stay above.
+        unrelated = hashed_vectors(["\n".join([t] + b) for t, b in (make_story(rng, vocab) for _ in queries)], args.dims)
+        noise = sorted(matches[0][1] for matches in store.top_k(unrelated, 1) if matches)
+        print(
+            f"recall: {recall:.3f}  follow-up top score median {scores[len(scores) // 2]:.3f} min {scores[0]:.3f}; "
+            f"unrelated top score median {noise[len(noise) // 2]:.3f} max {noise[-1]:.3f}"
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0 if recall >= args.min_recall else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
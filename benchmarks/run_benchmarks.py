@@ -0,0 +1,260 @@
+﻿import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+SRC_PATH = os.path.join(REPO_ROOT, "src")
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "cold": {"feeds": 5, "items_per_feed": 20, "web_sources": 1, "runs": 1},
+    "warm": {"feeds": 5, "items_per_feed": 20, "web_sources": 1, "runs": 2},
+    "backlog_1k": {"feeds": 10, "items_per_feed": 100, "web_sources": 0, "runs": 1},
+    # Three configs over the same sources in one run; downloads should match `cold`.
+    "profiles_3": {"feeds": 5, "items_per_feed": 20, "web_sources": 1, "runs": 1, "profiles": 3},
+    # Feed i has priority i + 1 and about a quarter of the backlog fits the
+    # token budget; the rest should stay pending, all below what was summarized.
+    "budget_1k": {"feeds": 10, "items_per_feed": 100, "web_sources": 0, "runs": 1, "budget_tokens": 800000},
+}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def build_config(spec: Dict[str, Any]) -> Dict[str, Any]:
+    from ai_news_feed.config import load_config
+
+    cfg = load_config(os.path.join(REPO_ROOT, "config.yaml"))
+    site = spec["site_url"]
+    per_feed = spec["items_per_feed"]
+    cfg["feeds"] = [
+        {
+            "name": f"Bench feed {i}",
+            "url": f"{site}/feeds/{i}.xml?items={per_feed}",
+            "enabled": True,
+            "priority": i + 1 if spec.get("budget_tokens") else 1.0,
+        }
+        for i in range(spec["feeds"])
+    ]
+    cfg["web_sources"] = [
+        {
+            "name": f"Bench list {i}",
+            "list_url": f"{site}/lists/{i}.html?items={per_feed}",
+            "enabled": True,
+            "include_url_regex": "/articles/",
+            "max_items": per_feed,
+            # Generated list titles carry no taxonomy keywords; keep item counts comparable across commits.
+            "prefilter": False,
+        }
+        for i in range(spec["web_sources"])
+    ]
+    cfg["storage"]["db_path"] = os.path.join(spec["workdir"], "bench.db")
+    cfg["storage"]["vector_path"] = os.path.join(spec["workdir"], "bench.vectors")
+    cfg["output"]["path"] = os.path.join(spec["workdir"], "weekly")
+    cfg["output"]["blog_path"] = os.path.join(spec["workdir"], "blog")
+    cfg["summarizer"]["api_key_file"] = ""
+    # The fake server has no rate limits; client-side throttling would dominate the timings.
+    cfg["summarizer"]["requests_per_minute"] = 0
+    cfg["summarizer"]["tokens_per_minute"] = 0
+    cfg["tracing"]["trace_dir"] = os.path.join(spec["workdir"], "logs")
+    cfg["tracing"]["pricing"] = {}
+    cfg["latency"]["enabled"] = spec.get("latency", True)
+    cfg["budget"]["max_tokens"] = spec.get("budget_tokens", 0)
+    return cfg
+
+
+def run_child(spec: Dict[str, Any]) -> Dict[str, Any]:
+    sys.path.insert(0, SRC_PATH)
+    os.chdir(spec["workdir"])
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["OPENAI_BASE_URL"] = spec["llm_url"]
+
+    from ai_news_feed.db import get_connection, get_run_stage_stats, init_db, list_runs
+    from ai_news_feed.pipeline import run_profiles
+
+    # The first profile works in the scenario directory and holds the run stats.
+    cfgs = [build_config(spec)]
+    for i in range(1, spec.get("profiles", 1)):
+        workdir = os.path.join(spec["workdir"], f"profile{i}")
+        os.makedirs(workdir, exist_ok=True)
+        cfgs.append(build_config(dict(spec, workdir=workdir)))
+
+    def count_items() -> int:
+        total = 0
+        for cfg in cfgs:
+            init_db(cfg["storage"]["db_path"])
+            with get_connection(cfg["storage"]["db_path"]) as conn:
+                total += conn.execute("SELECT COUNT(*) FROM items WHERE status IS NOT 'pending'").fetchone()[0]
+        return total
+
+    before = count_items()
+    started = time.perf_counter()
+    run_profiles(cfgs)
+    elapsed = time.perf_counter() - started
+    after = count_items()
+
+    with get_connection(cfgs[0]["storage"]["db_path"]) as conn:
+        run_id = list_runs(conn, 1)[0]["run_id"]
+        stages = {
+            row["stage"]: {"count": row["count"], "p50_ms": row["p50_ms"], "p95_ms": row["p95_ms"], "total_ms": row["total_ms"]}
+            for row in get_run_stage_stats(conn, run_id)
+        }
+
+    items = after - before
+    result: Dict[str, Any] = {}
+    if spec.get("budget_tokens"):
+        result.update(pending_order(cfgs[0]))
+    return {
+        **result,
+        "items": items,
+        "elapsed_sec": round(elapsed, 4),
+        "items_per_sec": round(items / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "stages": stages,
+    }
+
+
+def pending_order(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    from ai_news_feed.budget import age_hours, item_priority
+    from ai_news_feed.db import get_connection
+    from ai_news_feed.utils import now_local
+
+    now = now_local()
+    weights = {feed["name"]: feed["priority"] for feed in cfg["feeds"]}
+    half_life = cfg["budget"]["recency_half_life_hours"]
+    with get_connection(cfg["storage"]["db_path"]) as conn:
+        rows = conn.execute("SELECT source, published_at, relevance, status FROM items").fetchall()
+    done = [
+        item_priority(weights[r["source"]], r["relevance"], age_hours(r["published_at"], now), half_life)
+        for r in rows
+        if r["status"] != "pending"
+    ]
+    pending = [
+        item_priority(weights[r["source"]], r["relevance"], age_hours(r["published_at"], now), half_life)
+        for r in rows
+        if r["status"] == "pending"
+    ]
+    floor = min(done) if done else float("inf")
+    # Pending items that outrank something summarized; ties do not count.
+    return {"pending": len(pending), "out_of_order": sum(1 for p in pending if p > floor + 1e-9)}
+
+
+def run_scenario(name: str, site_url: str, llm_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    scenario = SCENARIOS[name]
+    workdir = tempfile.mkdtemp(prefix=f"ai_news_bench_{name}_")
+    spec = dict(scenario, site_url=site_url, llm_url=llm_url, workdir=workdir, latency=not args.no_latency)
+    result: Dict[str, Any] = {}
+    try:
+        for _ in range(scenario["runs"]):
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                raise RuntimeError(f"Scenario {name} failed:\n{proc.stderr[-4000:]}")
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        if not args.keep_workdirs:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def print_report(results: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    print(f"commit {results['commit']}  python {results['python']}  params {results['params']}")
+    for name, res in results["scenarios"].items():
+        line = (
+            f"{name:<12} items={res['items']:<6} elapsed={res['elapsed_sec']:>8.3f}s "
+            f"items/s={res['items_per_sec']:>9.2f} peak_rss={res['peak_rss_mb']:>7.1f}MB"
+        )
+        if "pending" in res:
+            line += f" pending={res['pending']} out_of_order={res['out_of_order']}"
+        base = (baseline or {}).get("scenarios", {}).get(name)
+        if base and base.get("elapsed_sec"):
+            line += f"  ({(res['elapsed_sec'] / base['elapsed_sec'] - 1) * 100:+.1f}% time vs {baseline['commit']})"
+        print(line)
+        for stage, stats in sorted(res["stages"].items()):
+            print(
+                f"    {stage:<20} n={stats['count']:<6} p50={stats['p50_ms']:>9.2f}ms "
+                f"p95={stats['p95_ms']:>9.2f}ms total={stats['total_ms']:>10.1f}ms"
+            )
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks for ai_news_feed")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument("--http-latency-ms", type=float, default=0.0, help="Latency added to every feed/article response")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latency added to every LLM response")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Share of HTTP and LLM responses that stall")
+    parser.add_argument("--tail-ms", type=float, default=0.0, help="Extra latency of a stalled response")
+    parser.add_argument("--no-latency", action="store_true", help="Run without adaptive timeouts and hedging")
+    parser.add_argument("--output", help="Write results JSON here (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--keep-workdirs", action="store_true", help="Keep scenario databases and outputs")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return 0
+
+    sys.path.insert(0, BENCH_DIR)
+    from fake_openai import start_fake_openai
+    from fake_sites import start_fake_sites, stop_server
+
+    site_server, site_url = start_fake_sites(args.http_latency_ms, tail_rate=args.tail_rate, tail_ms=args.tail_ms)
+    llm_server, llm_url = start_fake_openai(args.llm_latency_ms, tail_rate=args.tail_rate, tail_ms=args.tail_ms)
+    try:
+        results = {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "params": {
+                "http_latency_ms": args.http_latency_ms,
+                "llm_latency_ms": args.llm_latency_ms,
+                "tail_rate": args.tail_rate,
+                "tail_ms": args.tail_ms,
+                "latency": not args.no_latency,
+            },
+            "scenarios": {},
+        }
+        for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+            if name not in SCENARIOS:
+                parser.error(f"Unknown scenario: {name}")
+            results["scenarios"][name] = run_scenario(name, site_url, llm_url, args)
+    finally:
+        stop_server(site_server)
+        stop_server(llm_server)
+
+    out_path = args.output or os.path.join(BENCH_DIR, "results", f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(f"\nResults written to {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
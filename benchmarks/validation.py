@@ -0,0 +1,100 @@
+﻿import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), "src"))
+sys.path.insert(0, BENCH_DIR)
+
+from fake_openai import _classification_json  # noqa: E402
+
+
+def make_responses(count: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    category_ids = '"id": "model_releases" "id": "products_apps" "id": "research"'
+    responses = []
+    for i in range(count):
+        text = _classification_json(f"{category_ids} item {i}")
+        roll = rng.random()
+        if roll < 0.15:
+            text = f"```json\n{text}\n```"
+        elif roll < 0.20:
+            text = f"以下是结果：\n{text}\n"
+        elif roll < 0.25:
+            data = json.loads(text)
+            data["tags"] = data["tags"][:2]
+            text = json.dumps(data, ensure_ascii=False)
+        elif roll < 0.28:
+            data = json.loads(text)
+            data.pop("reason")
+            text = json.dumps(data, ensure_ascii=False)
+        responses.append(text)
+    return responses
+
+
+def run_baseline(responses: List[str]) -> int:
+    from jsonschema import ValidationError, validate
+
+    from ai_news_feed.llm import OUTPUT_SCHEMA
+
+    failures = 0
+    for text in responses:
+        try:
+            validate(instance=json.loads(text), schema=OUTPUT_SCHEMA)
+        except (json.JSONDecodeError, ValidationError):
+            failures += 1
+    return failures
+
+
+def run_current(responses: List[str]) -> int:
+    from jsonschema import ValidationError
+
+    from ai_news_feed.llm import parse_json_response, validate_output
+
+    failures = 0
+    for text in responses:
+        try:
+            validate_output(parse_json_response(text))
+        except (json.JSONDecodeError, ValidationError):
+            failures += 1
+    return failures
+
+
+def check_equivalence(responses: List[str]) -> None:
+    from ai_news_feed.llm import _fast_output_check, _output_validator
+
+    validator = _output_validator()
+    for text in responses:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            continue
+        if _fast_output_check(data) and not validator.is_valid(data):
+            raise AssertionError(f"Fast path accepted invalid response: {text[:200]}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark LLM response parsing and OUTPUT_SCHEMA validation")
+    parser.add_argument("--count", type=int, default=10000, help="Number of responses to validate")
+    args = parser.parse_args(argv)
+
+    responses = make_responses(args.count)
+    check_equivalence(responses)
+
+    for label, fn in (("jsonschema.validate per call", run_baseline), ("compiled + fast path", run_current)):
+        started = time.perf_counter()
+        failures = fn(responses)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{label:<30} {elapsed * 1000:9.1f} ms  {elapsed / len(responses) * 1e6:8.1f} us/response  "
+            f"fallbacks={failures} ({failures / len(responses):.1%})"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+﻿import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+from .db import (
+    attach_partition,
+    attach_partitions,
+    compact_partition,
+    count_items_to_archive,
+    detach_partition,
+    get_connection,
+    init_db,
+    move_items_to_partition,
+    partition_stats,
+)
+from .markdown import week_start
+from .utils import now_local
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _manifest_path(cfg: Dict[str, Any]) -> str:
+    return os.path.join(cfg["storage"]["archive_path"], MANIFEST_NAME)
+
+
+def partition_schema(year: str) -> str:
+    return f"archive_{year}"
+
+
+def load_manifest(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    path = _manifest_path(cfg)
+    if not os.path.exists(path):
+        return {"partitions": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(cfg: Dict[str, Any], manifest: Dict[str, Any]) -> None:
+    path = _manifest_path(cfg)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def archive_partitions(cfg: Dict[str, Any]) -> List[Tuple[str, str]]:
+    partitions = []
+    for year, entry in sorted(load_manifest(cfg)["partitions"].items()):
+        path = os.path.join(cfg["storage"]["archive_path"], entry["file"])
+        if os.path.exists(path):
+            partitions.append((partition_schema(year), path))
+        else:
+            logging.warning("Archive partition %s is missing; its items are skipped", path)
+    return partitions
+
+
+def attach_archives(conn: sqlite3.Connection, cfg: Dict[str, Any], writable: bool = False) -> List[str]:
+    return attach_partitions(conn, archive_partitions(cfg), writable)
+
+
+def archive_cutoff(weeks: int) -> datetime:
+    return week_start(*now_local().isocalendar()[:2]) - timedelta(weeks=weeks)
+
+
+def archive_items(cfg: Dict[str, Any], weeks: int, dry_run: bool = False) -> List[Dict[str, Any]]:
+    db_path = cfg["storage"]["db_path"]
+    archive_path = cfg["storage"]["archive_path"]
+    cutoff = archive_cutoff(weeks).isoformat()
+    results: List[Dict[str, Any]] = []
+    with get_connection(db_path) as conn:
+        pending = count_items_to_archive(conn, cutoff)
+        if dry_run or not pending:
+            return [{"year": row["year"], "moved": row["n"]} for row in pending]
+
+        os.makedirs(archive_path, exist_ok=True)
+        manifest = load_manifest(cfg)
+        # Partitions do not carry the feeds rows their items point at.
+        conn.execute("PRAGMA foreign_keys = OFF")
+        for row in pending:
+            year = row["year"]
+            entry = manifest["partitions"].setdefault(year, {"file": f"items-{year}.db"})
+            path = os.path.join(archive_path, entry["file"])
+            init_db(path)
+            # List the partition before moving anything into it, so an
+            # interrupted run never leaves items outside the manifest.
+            save_manifest(cfg, manifest)
+
+            schema = partition_schema(year)
+            attach_partition(conn, schema, path, writable=True)
+            moved = move_items_to_partition(conn, schema, year, cutoff)
+            conn.commit()
+            compact_partition(conn, schema)
+            stats = partition_stats(conn, schema)
+            detach_partition(conn, schema)
+
+            entry.update(
+                items=stats["items"],
+                first_collected_at=stats["first_collected_at"],
+                last_collected_at=stats["last_collected_at"],
+                size_bytes=os.path.getsize(path),
+                updated_at=now_local().isoformat(),
+            )
+            save_manifest(cfg, manifest)
+            logging.info("Archived %s items from %s into %s", moved, year, path)
+            results.append({"year": year, "moved": moved, "items": stats["items"], "path": path})
+
+        size_before = os.path.getsize(db_path)
+        conn.execute("VACUUM")
+        logging.info("Vacuumed %s: %.1f MB -> %.1f MB", db_path, size_before / 1e6, os.path.getsize(db_path) / 1e6)
+    return results
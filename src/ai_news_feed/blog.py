@@ -1,8 +1,29 @@
-﻿import os
+﻿import hashlib
+import logging
+import os
 import re
-from typing import Any, Dict
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from .llm import generate_weekly_blog
+from .db import (
+    get_blog_section_summary,
+    get_blog_state,
+    get_connection,
+    upsert_blog_section_summary,
+    upsert_blog_state,
+)
+from .llm import (
+    BLOG_SYSTEM_PROMPT,
+    SECTION_SYSTEM_PROMPT,
+    build_blog_prompt,
+    build_section_prompt,
+    generate_weekly_blog,
+    summarize_week_section,
+)
+from .markdown import strip_volatile_lines
 from .utils import now_local
 
 
@@ -13,8 +34,181 @@ def blog_output_filename(cfg: Dict[str, Any]) -> str:
     return template.format(year=year, week=f"{week:02d}")
 
 
-def render_blog_from_week_md(week_md: str, cfg: Dict[str, Any]) -> str:
-    return generate_weekly_blog(week_md, cfg)
+def render_blog_from_week_md(
+    week_md: str,
+    cfg: Dict[str, Any],
+    conn: Optional[sqlite3.Connection] = None,
+    on_chunk: Optional[Callable[[str], None]] = None,
+) -> str:
+    if blog_mode(week_md, cfg) == "single":
+        return generate_weekly_blog(week_md, cfg, on_chunk)
+    if conn is None:
+        with get_connection(cfg["storage"]["db_path"]) as own_conn:
+            return _render_blog_map_reduce(week_md, cfg, own_conn, on_chunk)
+    return _render_blog_map_reduce(week_md, cfg, conn, on_chunk)
+
+
+def blog_mode(week_md: str, cfg: Dict[str, Any]) -> str:
+    mode = cfg.get("blog", {}).get("mode", "single")
+    if mode != "auto":
+        return mode
+    max_chars = cfg.get("blog", {}).get("max_chars_input", 20000)
+    return "map_reduce" if len(strip_volatile_lines(week_md)) > max_chars else "single"
+
+
+def _parse_sections(body: str) -> List[Tuple[str, List[str]]]:
+    sections: List[Tuple[str, List[str]]] = []
+    for line in body.splitlines():
+        if line.startswith("## "):
+            sections.append((line[3:].strip(), []))
+        elif line.startswith("### "):
+            if not sections:
+                sections.append(("本周新闻", []))
+            sections[-1][1].append(line)
+        elif sections and sections[-1][1]:
+            sections[-1][1][-1] += "\n" + line
+    return sections
+
+
+def split_week_sections(week_md: str, max_chars: int) -> List[Tuple[str, str]]:
+    chunks: List[Tuple[str, str]] = []
+    for title, items in _parse_sections(strip_volatile_lines(week_md)):
+        groups: List[List[str]] = []
+        size = 0
+        for item in items:
+            item = item.strip()[:max_chars]
+            if groups and size + len(item) + 2 <= max_chars:
+                groups[-1].append(item)
+                size += len(item) + 2
+            else:
+                groups.append([item])
+                size = len(item)
+        for idx, group in enumerate(groups, start=1):
+            label = title if len(groups) == 1 else f"{title} ({idx}/{len(groups)})"
+            chunks.append((label, "\n\n".join(group)))
+    return chunks
+
+
+def section_input_hash(title: str, content: str, cfg: Dict[str, Any]) -> str:
+    blog_cfg = cfg.get("blog", {})
+    model = blog_cfg.get("section_model", blog_cfg.get("model", cfg["summarizer"]["model"]))
+    prompt = build_section_prompt(title, content, blog_cfg.get("section_summary_max_chars", 800))
+    digest = hashlib.sha256()
+    for part in (model, SECTION_SYSTEM_PROMPT, prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _render_blog_map_reduce(
+    week_md: str,
+    cfg: Dict[str, Any],
+    conn: sqlite3.Connection,
+    on_chunk: Optional[Callable[[str], None]] = None,
+) -> str:
+    blog_cfg = cfg.get("blog", {})
+    sections = split_week_sections(week_md, int(blog_cfg.get("section_max_chars_input", 12000)))
+    keys = [section_input_hash(title, content, cfg) for title, content in sections]
+
+    summaries: Dict[str, str] = {}
+    pending: Dict[str, Tuple[str, str]] = {}
+    for key, (title, content) in zip(keys, sections):
+        cached = get_blog_section_summary(conn, key)
+        if cached is not None:
+            summaries[key] = cached
+        else:
+            pending[key] = (title, content)
+    logging.info("Blog map-reduce: %s sections, %s cached, %s to summarize", len(sections), len(summaries), len(pending))
+
+    if pending:
+        workers = max(1, min(int(blog_cfg.get("map_concurrency", 3)), len(pending)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(summarize_week_section, title, content, cfg): (key, content)
+                for key, (title, content) in pending.items()
+            }
+            for future in as_completed(futures):
+                key, content = futures[future]
+                try:
+                    summaries[key] = future.result()
+                    upsert_blog_section_summary(conn, key, summaries[key], now_local().isoformat())
+                except Exception:
+                    logging.exception("Blog section summary failed; using truncated section text")
+                    summaries[key] = content[: int(blog_cfg.get("section_summary_max_chars", 800))]
+
+    title_line = next((line for line in week_md.splitlines() if line.startswith("# ")), "")
+    parts = [title_line] if title_line else []
+    for key, (title, _) in zip(keys, sections):
+        parts.append(f"## {title}\n{summaries[key].strip()}")
+    return generate_weekly_blog("\n\n".join(parts), cfg, on_chunk)
+
+
+def count_week_items(week_md: str) -> int:
+    return sum(1 for line in week_md.splitlines() if line.startswith("### "))
+
+
+def blog_input_hash(week_md: str, cfg: Dict[str, Any]) -> str:
+    model = cfg.get("blog", {}).get("model", cfg["summarizer"]["model"])
+    max_chars = cfg.get("blog", {}).get("max_chars_input", 20000)
+    mode = blog_mode(week_md, cfg)
+    content = strip_volatile_lines(week_md)
+    if mode == "single":
+        content = content[:max_chars]
+    digest = hashlib.sha256()
+    for part in (model, mode, BLOG_SYSTEM_PROMPT, build_blog_prompt(content)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def blog_needs_refresh(
+    conn: sqlite3.Connection, out_path: str, week_md: str, cfg: Dict[str, Any]
+) -> Tuple[bool, str]:
+    if not os.path.exists(out_path):
+        return True, "missing output"
+    state = get_blog_state(conn, os.path.abspath(out_path))
+    if state is None:
+        return True, "no previous generation"
+    if state["input_hash"] == blog_input_hash(week_md, cfg):
+        return False, "weekly digest unchanged"
+    min_delta = int(cfg.get("blog", {}).get("regenerate_min_item_delta", 0))
+    delta = abs(count_week_items(week_md) - int(state["item_count"] or 0))
+    if delta < min_delta:
+        return False, f"only {delta} item(s) changed (threshold {min_delta})"
+    return True, "weekly digest changed"
+
+
+def record_blog_generation(conn: sqlite3.Connection, out_path: str, week_md: str, cfg: Dict[str, Any]) -> None:
+    upsert_blog_state(
+        conn,
+        os.path.abspath(out_path),
+        blog_input_hash(week_md, cfg),
+        count_week_items(week_md),
+        now_local().isoformat(),
+    )
+
+
+@contextmanager
+def blog_stream(out_path: str, echo: bool = True):
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+
+        def on_chunk(chunk: str) -> None:
+            f.write(chunk)
+            f.flush()
+            if echo:
+                sys.stdout.write(chunk)
+                sys.stdout.flush()
+
+        try:
+            yield on_chunk
+        except BaseException:
+            # A failed stream leaves no partial article next to the blog.
+            f.close()
+            os.remove(tmp_path)
+            raise
+    if echo:
+        sys.stdout.write("\n")
 
 
 def write_blog(content: str, out_path: str) -> None:
@@ -0,0 +1,68 @@
+﻿import logging
+import math
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from .tracing import token_cost
+from .utils import to_local
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"limits": None, "pricing": {}, "tokens": 0, "cost_usd": 0.0}
+
+
+def start_budget(cfg: Dict[str, Any]) -> None:
+    limits = cfg.get("budget", {})
+    pricing = cfg.get("tracing", {}).get("pricing", {}) or {}
+    if float(limits.get("max_cost_usd") or 0) and not pricing:
+        logging.warning("budget.max_cost_usd is set but tracing.pricing is empty; only max_tokens applies")
+    with _lock:
+        _state.update(limits=limits, pricing=pricing, tokens=0, cost_usd=0.0)
+
+
+def finish_budget() -> Tuple[int, float]:
+    with _lock:
+        spent = (_state["tokens"], _state["cost_usd"])
+        _state.update(limits=None, pricing={}, tokens=0, cost_usd=0.0)
+    return spent
+
+
+def charge(model: Optional[str], input_tokens: int, output_tokens: int) -> None:
+    with _lock:
+        if _state["limits"] is None:
+            return
+        _state["tokens"] += int(input_tokens) + int(output_tokens)
+        _state["cost_usd"] += token_cost(_state["pricing"], model, int(input_tokens), int(output_tokens))
+
+
+def budget_spent() -> Tuple[int, float]:
+    with _lock:
+        return _state["tokens"], _state["cost_usd"]
+
+
+def budget_exhausted() -> bool:
+    # Checked between items, so a run overshoots by at most the calls already
+    # in flight; 0 means no limit.
+    with _lock:
+        limits = _state["limits"]
+        if not limits:
+            return False
+        max_tokens = int(limits.get("max_tokens") or 0)
+        max_cost = float(limits.get("max_cost_usd") or 0)
+        return bool(
+            (max_tokens and _state["tokens"] >= max_tokens) or (max_cost and _state["cost_usd"] >= max_cost)
+        )
+
+
+def age_hours(value: Optional[str], now: datetime) -> Optional[float]:
+    try:
+        return max(0.0, (now - to_local(datetime.fromisoformat(value))).total_seconds() / 3600)
+    except (TypeError, ValueError):
+        return None
+
+
+def item_priority(weight: float, relevance: Optional[int], age: float, half_life_hours: float) -> float:
+    # Source weight times keyword relevance, halved for every half-life of age.
+    # Kept as log2 so items older than a few hundred half-lives still compare
+    # instead of all underflowing to zero.
+    return math.log2(float(weight) * (1 + max(0, relevance or 0))) - age / float(half_life_hours)
@@ -1,5 +1,6 @@
 ﻿from typing import Any, Dict, List, Tuple
 
+from .models import Item
 from .utils import normalize_whitespace
 
 
@@ -16,9 +17,47 @@ def keyword_score(text: str, keywords: List[str]) -> Tuple[int, List[str]]:
     return score, hits
 
 
-def fallback_classify(item: Dict[str, Any], content: str, taxonomy: Dict[str, Any]) -> Dict[str, Any]:
-    title = item.get("title") or ""
-    rss_summary = item.get("rss_summary") or ""
+def taxonomy_keywords(taxonomy: Dict[str, Any]) -> List[str]:
+    keywords: List[str] = []
+    for cat in taxonomy.get("categories", []):
+        keywords.extend(cat.get("keywords", []))
+    return list(dict.fromkeys(keywords))
+
+
+def relevance_score(
+    entry: Item, source: Dict[str, Any], cfg: Dict[str, Any]
+) -> Tuple[int, str]:
+    title = entry.title or ""
+    text = normalize_whitespace(f"{title} {entry.rss_summary or ''}")
+    prefilter = cfg.get("prefilter", {})
+
+    # Exclusions only look at the title: a summary that mentions a podcast or a
+    # job opening in passing is still a news item.
+    excludes = prefilter.get("exclude_keywords", []) + source.get("exclude_keywords", [])
+    _, excluded = keyword_score(title, excludes)
+    if excluded:
+        return -1, f"excluded keyword: {excluded[0]}"
+
+    keywords = taxonomy_keywords(cfg.get("taxonomy", {}))
+    score_body, hits = keyword_score(text, keywords)
+    score_title, _ = keyword_score(title, keywords)
+    score_source, source_hits = keyword_score(text, source.get("include_keywords", []))
+    score = score_body + score_title + score_source * 2
+    return score, f"relevance {score} ({', '.join((source_hits + hits)[:5]) or 'no keyword hits'})"
+
+
+def passes_prefilter(entry: Item, source: Dict[str, Any], cfg: Dict[str, Any]) -> Tuple[bool, int, str]:
+    # The score is also returned with filtering off: it orders the backlog.
+    score, reason = relevance_score(entry, source, cfg)
+    prefilter = cfg.get("prefilter", {})
+    if not prefilter.get("enabled", True) or not source.get("prefilter", True):
+        return True, max(0, score), ""
+    return score >= source.get("min_relevance", prefilter.get("min_score", 1)), score, reason
+
+
+def fallback_classify(item: Item, content: str, taxonomy: Dict[str, Any]) -> Dict[str, Any]:
+    title = item.title or ""
+    rss_summary = item.rss_summary or ""
     head = content[:2000] if content else ""
     text = normalize_whitespace(f"{title} {rss_summary} {head}")
 
@@ -5,18 +5,25 @@ import sys
 from dotenv import load_dotenv
 
 from .config import load_config
-from .db import init_db
-from .blog import (
-    append_reference_section,
-    blog_output_filename,
-    ensure_frontmatter,
-    extract_title,
-    normalize_author,
-    render_blog_from_week_md,
-    write_blog,
+from .db import (
+    count_items_matching,
+    get_connection,
+    get_item_links,
+    get_run_stage_stats,
+    init_db,
+    list_feeds,
+    list_runs,
+    max_item_id,
+    rebuild_search_index,
+    search_items,
+    tag_week_counts,
 )
 from .utils import now_local
-from .pipeline import run_pipeline
+from .profiling import PROFILE_MODES, checkpoint, profile_session
+from .recording import recording_session
+
+# Command modules (pipeline, blog, llm) are imported inside run_command so that
+# --help, init-db, stats and feeds do not pay for loading them.
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -24,7 +31,63 @@ def build_parser() -> argparse.ArgumentParser:
     sub = parser.add_subparsers(dest="command")
 
     run_cmd = sub.add_parser("run", help="Run RSS fetch + summarize + output")
-    run_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    run_cmd.add_argument(
+        "--config", action="append", required=True, help="Path to config.yaml; repeat to run several profiles over shared fetches"
+    )
+    run_cmd.add_argument("--fetch-all", action="store_true", help="Fetch every source, ignoring poll schedules")
+
+    serve_cmd = sub.add_parser("serve", help="Stay resident and run the pipeline on schedule.cron")
+    serve_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    serve_cmd.add_argument("--run-now", action="store_true", help="Run once at startup before waiting for the schedule")
+
+    reprocess_cmd = sub.add_parser("reprocess", help="Re-run enrichment for stored items (resumable)")
+    reprocess_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    reprocess_cmd.add_argument(
+        "--status", action="append", help="Item status to match, repeatable (default: failed)"
+    )
+    reprocess_cmd.add_argument("--since", help="Collected on or after this date (YYYY-MM-DD or ISO timestamp)")
+    reprocess_cmd.add_argument("--until", help="Collected before this date (YYYY-MM-DD or ISO timestamp)")
+    reprocess_cmd.add_argument("--source", help="Source name")
+    reprocess_cmd.add_argument("--category", help="Primary category id")
+    reprocess_cmd.add_argument("--model", help="Model that produced the current enrichment ('keyword' for fallback)")
+    reprocess_cmd.add_argument("--batch-size", type=int, help="Items per checkpoint (default: 4 x summarizer.concurrency)")
+    reprocess_cmd.add_argument("--restart", action="store_true", help="Start over instead of resuming a matching job")
+    reprocess_cmd.add_argument("--dry-run", action="store_true", help="Only count matching items")
+
+    search_cmd = sub.add_parser("search", help="Full-text search over collected items")
+    search_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    search_cmd.add_argument("query", nargs="*", help="Terms to match (all required; trailing * for prefix)")
+    search_cmd.add_argument("--since", help="Collected on or after this date (YYYY-MM-DD or ISO timestamp)")
+    search_cmd.add_argument("--until", help="Collected before this date (YYYY-MM-DD or ISO timestamp)")
+    search_cmd.add_argument("--category", help="Primary category id")
+    search_cmd.add_argument("--source", help="Source name")
+    search_cmd.add_argument("--limit", type=int, default=20, help="Maximum results")
+    search_cmd.add_argument("--reindex", action="store_true", help="Rebuild the search index from the items table")
+
+    related_cmd = sub.add_parser("related", help="Find past items similar to a text in the vector store")
+    related_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    related_cmd.add_argument("query", nargs="*", help="Text to match (title or summary)")
+    related_cmd.add_argument("--limit", type=int, default=10, help="Maximum results")
+    related_cmd.add_argument("--rebuild", action="store_true", help="Rebuild the vector store from the items table")
+
+    trends_cmd = sub.add_parser("trends", help="Show week-over-week tag frequencies")
+    trends_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    trends_cmd.add_argument("--weeks", type=int, default=4, help="Number of weeks to compare, ending with the current one")
+    trends_cmd.add_argument("--limit", type=int, default=20, help="Maximum tags")
+    trends_cmd.add_argument("--category", help="Primary category id")
+
+    archive_cmd = sub.add_parser("archive", help="Move old items into per-year read-only partition files")
+    archive_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    archive_cmd.add_argument("--weeks", type=int, help="Archive items collected before this many weeks ago (default: storage.archive_after_weeks)")
+    archive_cmd.add_argument("--dry-run", action="store_true", help="Only count items per year")
+
+    render_cmd = sub.add_parser("render", help="Rebuild weekly digests from the database")
+    render_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    render_target = render_cmd.add_mutually_exclusive_group(required=True)
+    render_target.add_argument("--week", action="append", help="ISO week to render (YYYY-Www), repeatable")
+    render_target.add_argument("--all", action="store_true", help="Render every week that has processed items")
+    render_cmd.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    render_cmd.add_argument("--force", action="store_true", help="Rewrite outputs even if their content is unchanged")
 
     init_cmd = sub.add_parser("init-db", help="Initialize SQLite DB")
     init_cmd.add_argument("--config", required=True, help="Path to config.yaml")
@@ -32,10 +95,40 @@ def build_parser() -> argparse.ArgumentParser:
     blog_cmd = sub.add_parser("blog", help="Generate weekly blog from a weekly md file")
     blog_cmd.add_argument("--config", required=True, help="Path to config.yaml")
     blog_cmd.add_argument("--week-file", required=True, help="Path to weekly md file")
+    blog_cmd.add_argument("--force", action="store_true", help="Regenerate even if the weekly file is unchanged")
+    blog_cmd.add_argument("--stream", action="store_true", help="Stream the blog to the terminal as it is written")
+
+    stats_cmd = sub.add_parser("stats", help="Show per-stage timing, token and cost stats for recent runs")
+    stats_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+    stats_cmd.add_argument("--run-id", help="Run to show (default: latest)")
+    stats_cmd.add_argument("--last", type=int, default=10, help="Number of recent runs to list")
+    stats_cmd.add_argument("--by-host", action="store_true", help="Break stage stats down by host/model")
+    stats_cmd.add_argument(
+        "--latency", action="store_true", help="Show latency history per host/model with derived timeouts"
+    )
+
+    feeds_cmd = sub.add_parser("feeds", help="Show feed health and next poll times")
+    feeds_cmd.add_argument("--config", required=True, help="Path to config.yaml")
+
+    for cmd in sub.choices.values():
+        cmd.add_argument("--profile", choices=PROFILE_MODES, help="Profile the command (cProfile, stack sampling or tracemalloc)")
+        cmd.add_argument("--profile-out", help="Profile output path (default: profiles/<command>-<timestamp>.<ext>)")
+        traffic = cmd.add_mutually_exclusive_group()
+        traffic.add_argument("--record", metavar="DIR", help="Record all feed, article and LLM traffic to DIR")
+        traffic.add_argument("--replay", metavar="DIR", help="Serve feed, article and LLM traffic from a recording in DIR")
 
     return parser
 
 
+def _print_table(headers, rows) -> None:
+    cells = [[str(h) for h in headers]] + [[str(v) for v in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for idx, row in enumerate(cells):
+        print("  ".join(value.ljust(widths[i]) for i, value in enumerate(row)).rstrip())
+        if idx == 0:
+            print("  ".join("-" * w for w in widths))
+
+
 def main(argv=None):
     load_dotenv()
 
@@ -46,24 +139,124 @@ def main(argv=None):
         parser.print_help()
         return 2
 
-    cfg = load_config(args.config)
+    # run takes one or more configs; the others are loaded by the run command.
+    configs = args.config if isinstance(args.config, list) else [args.config]
+    cfg = load_config(configs[0])
 
+    with recording_session(args.record, args.replay), profile_session(args.profile, args.profile_out, args.command):
+        return run_command(args, cfg, parser)
+
+
+def run_command(args, cfg, parser) -> int:
     if args.command == "init-db":
         init_db(cfg["storage"]["db_path"])
         return 0
 
     if args.command == "run":
-        run_pipeline(cfg)
+        from .pipeline import run_profiles
+
+        cfgs = [cfg] + [load_config(path) for path in args.config[1:]]
+        if args.fetch_all:
+            for profile_cfg in cfgs:
+                profile_cfg["polling"]["enabled"] = False
+        run_profiles(cfgs)
         return 0
 
+    if args.command == "serve":
+        from .daemon import Daemon
+
+        Daemon(cfg, args.config).serve(run_now=args.run_now)
+        return 0
+
+    if args.command == "reprocess":
+        import threading
+
+        from .daemon import install_stop_handlers
+        from .pipeline import setup_logging
+        from .latency import finish_latency, start_latency
+        from .reprocess import reprocess_items
+        from .tracing import finish_run, start_run
+
+        filters = {
+            "status": args.status or ["failed"],
+            "since": args.since,
+            "until": args.until,
+            "source": args.source,
+            "primary_category": args.category,
+            "model": args.model,
+        }
+        filters = {k: v for k, v in filters.items() if v}
+        db_path = cfg["storage"]["db_path"]
+        init_db(db_path)
+        if args.dry_run:
+            from .archive import attach_archives
+
+            with get_connection(db_path) as conn:
+                attach_archives(conn, cfg)
+                print(f"{count_items_matching(conn, filters, max_item_id(conn))} items match {filters}")
+            return 0
+        setup_logging()
+        stop_event = threading.Event()
+        install_stop_handlers(stop_event, "the current batch")
+        start_run(cfg, "reprocess")
+        start_latency(cfg)
+        try:
+            job = reprocess_items(cfg, filters, restart=args.restart, batch_size=args.batch_size, stop_event=stop_event)
+        finally:
+            finish_latency(db_path)
+            finish_run(db_path)
+        print(
+            f"Job {job['job_id']} {job['status']}: {job['done']} reprocessed, {job['failed']} failed "
+            f"of {job['total']}"
+        )
+        return 0 if job["status"] == "done" else 1
+
     if args.command == "blog":
+        from .blog import (
+            append_reference_section,
+            blog_mode,
+            blog_needs_refresh,
+            blog_output_filename,
+            blog_stream,
+            ensure_frontmatter,
+            extract_title,
+            normalize_author,
+            record_blog_generation,
+            render_blog_from_week_md,
+            write_blog,
+        )
+        from .latency import finish_latency, start_latency
+        from .pipeline import setup_logging
+        from .tracing import finish_run, span, start_run
+
         with open(args.week_file, "r", encoding="utf-8") as f:
             week_md = f.read()
-        blog_md = render_blog_from_week_md(week_md, cfg)
         blog_name = blog_output_filename(cfg)
         blog_dir = cfg["output"].get("blog_path", cfg["output"]["path"])
-        os.makedirs(blog_dir, exist_ok=True)
         out_path = os.path.join(blog_dir, blog_name)
+        db_path = cfg["storage"]["db_path"]
+        init_db(db_path)
+        if not args.force:
+            with get_connection(db_path) as conn:
+                refresh, reason = blog_needs_refresh(conn, out_path, week_md, cfg)
+            if not refresh:
+                print(f"Blog up to date ({reason}): {out_path}")
+                return 0
+        os.makedirs(blog_dir, exist_ok=True)
+        start_run(cfg, "blog")
+        start_latency(cfg)
+        try:
+            with span("render_blog", mode=blog_mode(week_md, cfg)):
+                if args.stream or cfg["blog"].get("stream", False):
+                    setup_logging()
+                    with blog_stream(out_path, cfg["blog"].get("stream_echo", True)) as on_chunk:
+                        blog_md = render_blog_from_week_md(week_md, cfg, on_chunk=on_chunk)
+                else:
+                    blog_md = render_blog_from_week_md(week_md, cfg)
+        finally:
+            finish_latency(db_path)
+            finish_run(db_path)
+        checkpoint("render_blog")
         blog_dir_abs = os.path.abspath(blog_dir)
         weekly_path_abs = os.path.abspath(args.week_file)
         rel_link = os.path.relpath(weekly_path_abs, start=blog_dir_abs).replace(os.sep, "/")
@@ -81,6 +274,254 @@ def main(argv=None):
         blog_md = ensure_frontmatter(blog_md, blog_title, now_local().strftime("%Y-%m-%d"))
         blog_md = append_reference_section(blog_md, weekly_title, rel_link)
         write_blog(blog_md, out_path)
+        with get_connection(db_path) as conn:
+            record_blog_generation(conn, out_path, week_md, cfg)
+        return 0
+
+    if args.command == "stats":
+        db_path = cfg["storage"]["db_path"]
+        init_db(db_path)
+        if args.latency:
+            from .latency import histogram_rows
+
+            with get_connection(db_path) as conn:
+                rows = histogram_rows(cfg, conn)
+            if not rows:
+                print("No latency history recorded yet.")
+                return 0
+            _print_table(
+                ["kind", "key", "samples", "p50_ms", "p95_ms", "p99_ms", "timeout_s", "hedge_after_s", "updated_at"],
+                [
+                    [
+                        r["kind"],
+                        r["key"],
+                        f"{r['samples']:.0f}",
+                        f"{r['p50_ms']:.0f}",
+                        f"{r['p95_ms']:.0f}",
+                        f"{r['p99_ms']:.0f}",
+                        f"{r['timeout_sec']:.1f}" if r["timeout_sec"] is not None else "-",
+                        f"{r['hedge_after_sec']:.2f}" if r["hedge_after_sec"] is not None else "-",
+                        r["updated_at"],
+                    ]
+                    for r in rows
+                ],
+            )
+            return 0
+        with get_connection(db_path) as conn:
+            runs = list_runs(conn, max(1, args.last))
+            if not runs:
+                print("No runs recorded yet.")
+                return 0
+            _print_table(
+                ["run_id", "command", "started_at", "finished_at", "in_tokens", "out_tokens", "cost_usd"],
+                [
+                    [
+                        r["run_id"],
+                        r["command"],
+                        r["started_at"],
+                        r["finished_at"],
+                        r["input_tokens"],
+                        r["output_tokens"],
+                        f"{r['cost_usd']:.4f}",
+                    ]
+                    for r in runs
+                ],
+            )
+            run_id = args.run_id or runs[0]["run_id"]
+            stats = get_run_stage_stats(conn, run_id, by_host=args.by_host)
+        print(f"\nRun {run_id}")
+        _print_table(
+            [
+                "stage",
+                "host",
+                "count",
+                "errors",
+                "p50_ms",
+                "p95_ms",
+                "total_ms",
+                "in_tokens",
+                "out_tokens",
+                "out_tok/s",
+                "cost_usd",
+            ],
+            [
+                [
+                    r["stage"],
+                    r["host"] or "*",
+                    r["count"],
+                    r["errors"],
+                    f"{r['p50_ms']:.1f}",
+                    f"{r['p95_ms']:.1f}",
+                    f"{r['total_ms']:.1f}",
+                    r["input_tokens"],
+                    r["output_tokens"],
+                    f"{r['output_tokens'] / (r['total_ms'] / 1000):.1f}" if r["output_tokens"] and r["total_ms"] else "-",
+                    f"{r['cost_usd']:.4f}",
+                ]
+                for r in stats
+            ],
+        )
+        return 0
+
+    if args.command == "search":
+        import time
+
+        from .archive import attach_archives
+        from .search import build_match_query, format_snippet
+
+        db_path = cfg["storage"]["db_path"]
+        init_db(db_path)
+        with get_connection(db_path) as conn:
+            if args.reindex:
+                print(f"Indexed {rebuild_search_index(conn)} items")
+            match = build_match_query(" ".join(args.query))
+            if not match:
+                if not args.reindex:
+                    parser.error("search needs a query")
+                return 0
+            started = time.perf_counter()
+            schemas = attach_archives(conn, cfg)
+            rows = search_items(
+                conn, match, args.since, args.until, args.category, args.source, max(1, args.limit), schemas
+            )
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        for idx, row in enumerate(rows, 1):
+            print(f"{idx}. {row['title']}")
+            print(f"   {row['collected_at'][:10]}  {row['source']}  {row['primary_category']}  {row['url']}")
+            print(f"   {format_snippet(row['snippet'])}")
+        print(f"{len(rows)} results in {elapsed_ms:.1f} ms")
+        return 0
+
+    if args.command == "related":
+        import time
+
+        from .archive import attach_archives
+        from .cluster import hashed_vectors
+        from .vectors import open_vector_store, rebuild_vector_store
+
+        db_path = cfg["storage"]["db_path"]
+        init_db(db_path)
+        if args.rebuild:
+            print(f"Stored vectors for {rebuild_vector_store(cfg)} items in {cfg['storage']['vector_path']}")
+        text = " ".join(args.query).strip()
+        if not text:
+            if not args.rebuild:
+                parser.error("related needs a query")
+            return 0
+        store = open_vector_store(cfg)
+        started = time.perf_counter()
+        found = store.top_k(hashed_vectors([text], store.dims), max(1, args.limit))[0]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with get_connection(db_path) as conn:
+            attach_archives(conn, cfg)
+            links = {row["id"]: row for row in get_item_links(conn, [item_id for item_id, _ in found])}
+        rows = [(score, links[item_id]) for item_id, score in found if item_id in links]
+        for idx, (score, row) in enumerate(rows, 1):
+            print(f"{idx}. {row['title']}")
+            print(f"   {score:.3f}  {(row['collected_at'] or '')[:10]}  {row['source']}  {row['url']}")
+        print(f"{len(rows)} results from {store.count} vectors in {elapsed_ms:.1f} ms")
+        return 0
+
+    if args.command == "trends":
+        from datetime import timedelta
+
+        from .archive import attach_archives
+        from .markdown import week_label, week_start
+
+        weeks = max(2, args.weeks)
+        first = week_start(*now_local().isocalendar()[:2]) - timedelta(weeks=weeks - 1)
+        starts = [(first + timedelta(weeks=i)).date() for i in range(weeks)]
+        db_path = cfg["storage"]["db_path"]
+        init_db(db_path)
+        with get_connection(db_path) as conn:
+            attach_archives(conn, cfg)
+            rows = tag_week_counts(conn, first.isoformat(), args.category)
+        counts = {}
+        for row in rows:
+            counts.setdefault(row["tag"], {})[row["week_start"]] = row["n"]
+        if not counts:
+            print("No tagged items in this period.")
+            return 0
+        series = {tag: [by_week.get(start.isoformat(), 0) for start in starts] for tag, by_week in counts.items()}
+        ranked = sorted(series.items(), key=lambda kv: (-kv[1][-1], -(kv[1][-1] - kv[1][-2]), kv[0]))
+        _print_table(
+            ["tag"] + [week_label(*start.isocalendar()[:2]) for start in starts] + ["change"],
+            [[tag] + values + [f"{values[-1] - values[-2]:+d}"] for tag, values in ranked[: max(1, args.limit)]],
+        )
+        return 0
+
+    if args.command == "render":
+        import time
+
+        from .archive import attach_archives
+        from .markdown import parse_week
+        from .render import render_weeks, weeks_with_items
+
+        if cfg["output"].get("mode", "weekly_file") != "weekly_file":
+            parser.error("render needs output.mode: weekly_file")
+        db_path = cfg["storage"]["db_path"]
+        init_db(db_path)
+        if args.all:
+            with get_connection(db_path) as conn:
+                attach_archives(conn, cfg)
+                weeks = weeks_with_items(conn)
+        else:
+            try:
+                weeks = sorted({parse_week(value) for value in args.week})
+            except ValueError as exc:
+                parser.error(str(exc))
+        if not weeks:
+            print("No processed items to render.")
+            return 0
+        started = time.perf_counter()
+        rows = render_weeks(cfg, weeks, force=args.force, workers=args.workers)
+        _print_table(["week", "items", "status", "path"], [(w, count, status, path) for w, path, status, count in rows])
+        written = sum(1 for row in rows if row[2] == "written")
+        print(f"{len(rows)} weeks ({written} written) in {time.perf_counter() - started:.2f} s")
+        return 0
+
+    if args.command == "archive":
+        from .archive import archive_items
+        from .pipeline import setup_logging
+
+        weeks = args.weeks if args.weeks is not None else cfg["storage"]["archive_after_weeks"]
+        if weeks < 1:
+            parser.error("--weeks must be at least 1")
+        init_db(cfg["storage"]["db_path"])
+        setup_logging()
+        results = archive_items(cfg, weeks, dry_run=args.dry_run)
+        if not results:
+            print(f"No items older than {weeks} weeks.")
+            return 0
+        if args.dry_run:
+            _print_table(["year", "would_move"], [(r["year"], r["moved"]) for r in results])
+            return 0
+        _print_table(["year", "moved", "partition_items", "path"], [(r["year"], r["moved"], r["items"], r["path"]) for r in results])
+        return 0
+
+    if args.command == "feeds":
+        db_path = cfg["storage"]["db_path"]
+        init_db(db_path)
+        with get_connection(db_path) as conn:
+            feeds = list_feeds(conn)
+        if not feeds:
+            print("No feeds fetched yet.")
+            return 0
+        _print_table(
+            ["name", "enabled", "last_fetch_at", "fail_count", "poll_every_h", "next_fetch_at", "last_error"],
+            [
+                [
+                    f["name"],
+                    "yes" if f["enabled"] else "no",
+                    f["last_fetch_at"] or "-",
+                    f["fail_count"] or 0,
+                    f"{f['poll_interval_sec'] / 3600:.1f}" if f["poll_interval_sec"] else "-",
+                    f["next_fetch_at"] or "due",
+                    (f["last_error"] or "")[:60],
+                ]
+                for f in feeds
+            ],
+        )
         return 0
 
     parser.print_help()
@@ -0,0 +1,182 @@
+﻿import re
+import zlib
+from dataclasses import replace
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from .models import Item
+
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9.+-]*[a-z0-9]|[a-z0-9]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its new of on or that the this to with will".split()
+)
+_IMPACT_RANK = {"High": 0, "Medium": 1, "Low": 2}
+
+# TF-IDF vectors are hashed into this many signed dimensions; the sign cancels
+# collisions in expectation, so cosine error stays around 1/sqrt(dims).
+HASH_DIMS = 1024
+# Similarity is computed a block of rows at a time; this caps the block at
+# 16 MiB of float32 however many items the week has.
+_BLOCK_CELLS = 4 * 1024 * 1024
+# Documents tokenized per pass; only the distinct terms of each pass are kept.
+_FEATURE_CHUNK = 1024
+_BIGRAM_FLAG = np.uint64(1 << 62)
+
+
+def _is_cjk(codepoints: np.ndarray) -> np.ndarray:
+    return ((codepoints >= 0x3400) & (codepoints <= 0x9FFF)) | ((codepoints >= 0xF900) & (codepoints <= 0xFAFF))
+
+
+def item_text(item: Item) -> str:
+    return "\n".join([item.title or ""] + item.summary_bullets)
+
+
+def _features(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # Returns parallel (doc, feature) arrays: Latin words plus CJK character
+    # bigrams, which stand in for words in unsegmented Chinese.
+    docs: List[int] = []
+    feats: List[int] = []
+    for idx, text in enumerate(texts):
+        for word in _WORD_RE.findall(text.lower()):
+            if word not in _STOPWORDS:
+                docs.append(idx)
+                feats.append(zlib.crc32(word.encode("utf-8")))
+
+    joined = "\n".join(texts)
+    codepoints = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32)
+    lengths = np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts))
+    owner = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)[: len(codepoints)]
+    cjk = _is_cjk(codepoints)
+    pos = np.nonzero(cjk[:-1] & cjk[1:])[0]
+    bigrams = (codepoints[pos].astype(np.uint64) << np.uint64(21)) | codepoints[pos + 1] | _BIGRAM_FLAG
+
+    doc_ids = np.concatenate([np.asarray(docs, dtype=np.int64), owner[pos]])
+    feat_ids = np.concatenate([np.asarray(feats, dtype=np.uint64), bigrams])
+    return doc_ids, feat_ids
+
+
+def _term_counts(texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # A 40-bit feature hash packed under the doc id gives one sort key for
+    # both term counting and document frequencies.
+    keys: List[np.ndarray] = []
+    counts: List[np.ndarray] = []
+    for start in range(0, len(texts), _FEATURE_CHUNK):
+        doc_ids, feat_ids = _features(texts[start : start + _FEATURE_CHUNK])
+        hashed = (feat_ids * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(24)
+        chunk_keys, tf = np.unique(((doc_ids + start).astype(np.uint64) << np.uint64(40)) | hashed, return_counts=True)
+        keys.append(chunk_keys)
+        counts.append(tf.astype(np.int32))
+    if not keys:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int32)
+    return np.concatenate(keys), np.concatenate(counts)
+
+
+def tfidf_vectors(texts: List[str], dims: int = HASH_DIMS) -> np.ndarray:
+    n = len(texts)
+    keys, tf = _term_counts(texts)
+    if not len(keys):
+        return np.zeros((n, dims), dtype=np.float32)
+
+    doc_ids = (keys >> np.uint64(40)).astype(np.int64)
+    hashed = keys & np.uint64((1 << 40) - 1)
+
+    # Everything below is order-independent, so regroup by feature to count
+    # document frequencies without mapping back.
+    order = np.argsort(hashed)
+    doc_ids, hashed, tf = doc_ids[order], hashed[order], tf[order]
+    runs = np.diff(np.flatnonzero(np.r_[True, hashed[1:] != hashed[:-1], True]))
+    df = np.repeat(runs, runs)
+    weights = (1.0 + np.log(tf)) * (np.log((1 + n) / (1 + df)) + 1.0)
+    norms = np.sqrt(np.bincount(doc_ids, weights=weights * weights, minlength=n))
+    weights /= norms[doc_ids]
+    # Terms seen in one document count towards its norm but can never match
+    # another, so they are left out of the hashed vector.
+    shared = df > 1
+    doc_ids, hashed, weights = doc_ids[shared], hashed[shared], weights[shared]
+
+    cols = (hashed % np.uint64(dims)).astype(np.int64)
+    signs = np.where((hashed >> np.uint64(39)) == 1, -1.0, 1.0)
+    vectors = np.zeros((n, dims), dtype=np.float32)
+    np.add.at(vectors, (doc_ids, cols), (signs * weights).astype(np.float32))
+    return vectors
+
+
+def hashed_vectors(texts: List[str], dims: int) -> np.ndarray:
+    # Term-frequency only, so a document's vector does not depend on the rest
+    # of the corpus and can be stored once; the related-history lookup applies
+    # IDF per dimension at query time.
+    vectors = np.zeros((len(texts), dims), dtype=np.float32)
+    keys, tf = _term_counts(texts)
+    if not len(keys):
+        return vectors
+    doc_ids = (keys >> np.uint64(40)).astype(np.int64)
+    hashed = keys & np.uint64((1 << 40) - 1)
+    cols = (hashed % np.uint64(dims)).astype(np.int64)
+    signs = np.where((hashed >> np.uint64(39)) == 1, -1.0, 1.0)
+    np.add.at(vectors, (doc_ids, cols), (signs * (1.0 + np.log(tf))).astype(np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def similar_pairs(vectors: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    n = len(vectors)
+    step = max(1, _BLOCK_CELLS // max(n, 1))
+    left: List[np.ndarray] = []
+    right: List[np.ndarray] = []
+    for start in range(0, n, step):
+        rows, cols = np.nonzero(vectors[start : start + step] @ vectors[start:].T >= threshold)
+        # Column offsets start at this block, so cols > rows is the upper triangle.
+        upper = cols > rows
+        left.append(rows[upper] + start)
+        right.append(cols[upper] + start)
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(left), np.concatenate(right)
+
+
+def cluster_labels(texts: List[str], threshold: float) -> List[int]:
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    left, right = similar_pairs(tfidf_vectors(texts), threshold)
+    for a, b in zip(left.tolist(), right.tolist()):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+    return [find(i) for i in range(len(texts))]
+
+
+def _lead_key(item: Item) -> Tuple[int, str]:
+    # The highest-impact, earliest report leads a story.
+    when = item.published_at or item.collected_at or "9999"
+    return _IMPACT_RANK.get(item.impact, len(_IMPACT_RANK)), when
+
+
+def cluster_stories(items: List[Item], cfg: Dict[str, Any]) -> List[Item]:
+    if len(items) < 2:
+        return items
+    labels = cluster_labels([item_text(item) for item in items], float(cfg["clustering"]["similarity_threshold"]))
+    groups: Dict[int, List[Item]] = {}
+    for label, item in zip(labels, items):
+        groups.setdefault(label, []).append(item)
+
+    stories = []
+    for members in groups.values():
+        if len(members) == 1:
+            stories.append(members[0])
+            continue
+        members = sorted(members, key=_lead_key)
+        lead = replace(members[0], also_reported=[])
+        seen = {lead.url}
+        for other in members[1:]:
+            if other.url not in seen:
+                seen.add(other.url)
+                lead.also_reported.append({"source": other.source, "url": other.url})
+        stories.append(lead)
+    return stories
@@ -1,9 +1,11 @@
 ﻿import os
-from dataclasses import dataclass
 from typing import Any, Dict
 
 import yaml
 
+from .routing import ROUTE_CONDITIONS
+from .schedule import CronError, CronSchedule
+
 
 class ConfigError(Exception):
     pass
@@ -23,7 +25,31 @@ def apply_defaults(cfg: Dict[str, Any]) -> None:
     cfg.setdefault("feeds", [])
     cfg.setdefault("web_sources", [])
     cfg.setdefault("schedule", {"mode": "cron", "cron": "0 9 * * MON"})
+    cfg.setdefault("polling", {})
+    cfg["polling"].setdefault("enabled", True)
+    cfg["polling"].setdefault("min_interval_min", 30)
+    cfg["polling"].setdefault("max_interval_hours", 72)
+    cfg["polling"].setdefault("default_interval_hours", 6)
+    cfg["polling"].setdefault("cadence_factor", 0.5)
+    cfg["polling"].setdefault("failure_backoff_base_min", 30)
+    cfg["polling"].setdefault("failure_backoff_max_hours", 168)
+    cfg["polling"].setdefault("fetch_timeout_sec", 30)
+    cfg.setdefault("prefilter", {})
+    cfg["prefilter"].setdefault("enabled", True)
+    cfg["prefilter"].setdefault("min_score", 1)
+    cfg["prefilter"].setdefault("exclude_keywords", [])
+    cfg.setdefault("clustering", {})
+    cfg["clustering"].setdefault("enabled", True)
+    cfg["clustering"].setdefault("similarity_threshold", 0.3)
     cfg.setdefault("storage", {"db_path": "./data/ai_news.db"})
+    cfg["storage"].setdefault("archive_path", os.path.join(os.path.dirname(cfg["storage"]["db_path"]), "archive"))
+    cfg["storage"].setdefault("archive_after_weeks", 52)
+    cfg["storage"].setdefault("vector_path", os.path.splitext(cfg["storage"]["db_path"])[0] + ".vectors")
+    cfg.setdefault("related", {})
+    cfg["related"].setdefault("enabled", True)
+    cfg["related"].setdefault("dims", 512)
+    cfg["related"].setdefault("top_k", 3)
+    cfg["related"].setdefault("min_score", 0.3)
     cfg.setdefault("output", {})
     cfg["output"].setdefault("mode", "weekly_file")
     cfg["output"].setdefault("path", "./output")
@@ -45,12 +71,51 @@ def apply_defaults(cfg: Dict[str, Any]) -> None:
     cfg["summarizer"].setdefault("timeout_sec", 60)
     cfg["summarizer"].setdefault("concurrency", 3)
     cfg["summarizer"].setdefault("retries", 3)
+    cfg["summarizer"].setdefault("backoff_base_sec", 1.0)
+    cfg["summarizer"].setdefault("backoff_max_sec", 30.0)
+    cfg["summarizer"].setdefault("requests_per_minute", 500)
+    cfg["summarizer"].setdefault("tokens_per_minute", 200000)
+    cfg["summarizer"].setdefault("circuit_breaker_failures", 5)
+    cfg["summarizer"].setdefault("circuit_breaker_cooldown_sec", 120)
+    cfg["summarizer"].setdefault("routes", [])
     cfg["summarizer"].setdefault("api_key_env", "OPENAI_API_KEY")
     cfg["summarizer"].setdefault("api_key_file", "")
 
     cfg.setdefault("blog", {})
     cfg["blog"].setdefault("model", cfg["summarizer"]["model"])
     cfg["blog"].setdefault("max_chars_input", 20000)
+    cfg["blog"].setdefault("regenerate_min_item_delta", 0)
+    cfg["blog"].setdefault("mode", "auto")
+    cfg["blog"].setdefault("section_model", cfg["blog"]["model"])
+    cfg["blog"].setdefault("section_max_chars_input", 12000)
+    cfg["blog"].setdefault("section_summary_max_chars", 800)
+    cfg["blog"].setdefault("map_concurrency", cfg["summarizer"]["concurrency"])
+    cfg["blog"].setdefault("stream", False)
+    cfg["blog"].setdefault("stream_echo", True)
+    cfg["blog"].setdefault("stream_idle_timeout_sec", 30)
+
+    cfg.setdefault("tracing", {})
+    cfg["tracing"].setdefault("enabled", True)
+    cfg["tracing"].setdefault("trace_dir", "logs")
+    cfg["tracing"].setdefault("pricing", {})
+
+    cfg.setdefault("latency", {})
+    cfg["latency"].setdefault("enabled", True)
+    cfg["latency"].setdefault("min_samples", 20)
+    cfg["latency"].setdefault("max_samples", 2000)
+    cfg["latency"].setdefault("adaptive_timeouts", True)
+    cfg["latency"].setdefault("timeout_percentile", 99)
+    cfg["latency"].setdefault("timeout_multiplier", 3.0)
+    cfg["latency"].setdefault("min_timeout_sec", 5)
+    cfg["latency"].setdefault("hedge_http", True)
+    cfg["latency"].setdefault("hedge_llm", True)
+    cfg["latency"].setdefault("hedge_percentile", 95)
+    cfg["latency"].setdefault("hedge_max_fraction", 0.1)
+
+    cfg.setdefault("budget", {})
+    cfg["budget"].setdefault("max_tokens", 0)
+    cfg["budget"].setdefault("max_cost_usd", 0)
+    cfg["budget"].setdefault("recency_half_life_hours", 24)
 
     cfg.setdefault("classification", {})
     cfg["classification"].setdefault("mode", "llm_with_keyword_fallback")
@@ -78,6 +143,43 @@ def validate_config(cfg: Dict[str, Any]) -> None:
             raise ConfigError("Each web_source requires name and list_url")
         src.setdefault("enabled", True)
         src.setdefault("max_items", 50)
+    for source in cfg["feeds"] + cfg["web_sources"] + [cfg["prefilter"]]:
+        for key in ("include_keywords", "exclude_keywords"):
+            if not isinstance(source.get(key, []), list):
+                raise ConfigError(f"{key} must be a list")
+    for source in cfg["feeds"] + cfg["web_sources"]:
+        if float(source.get("priority", 1.0)) <= 0:
+            raise ConfigError(f"{source['name']}: priority must be positive")
+    for rule in cfg["summarizer"]["routes"]:
+        if not isinstance(rule, dict) or not isinstance(rule.get("when", {}), dict):
+            raise ConfigError("summarizer.routes entries must be mappings with a `when` mapping")
+        unknown = set(rule.get("when", {})) - set(ROUTE_CONDITIONS)
+        if unknown:
+            raise ConfigError(f"Unknown route condition(s): {', '.join(sorted(unknown))}")
+    if not 0 < float(cfg["clustering"]["similarity_threshold"]) <= 1:
+        raise ConfigError("clustering.similarity_threshold must be in (0, 1]")
+    if float(cfg["polling"]["fetch_timeout_sec"]) <= 0:
+        raise ConfigError("polling.fetch_timeout_sec must be positive")
+    if int(cfg["related"]["dims"]) < 1:
+        raise ConfigError("related.dims must be positive")
+    for key in ("timeout_percentile", "hedge_percentile"):
+        if not 0 < float(cfg["latency"][key]) <= 100:
+            raise ConfigError(f"latency.{key} must be in (0, 100]")
+    if not 0 <= float(cfg["latency"]["hedge_max_fraction"]) <= 1:
+        raise ConfigError("latency.hedge_max_fraction must be in [0, 1]")
+    for key in ("max_tokens", "max_cost_usd"):
+        if float(cfg["budget"][key]) < 0:
+            raise ConfigError(f"budget.{key} must be 0 (no limit) or positive")
+    if float(cfg["budget"]["recency_half_life_hours"]) <= 0:
+        raise ConfigError("budget.recency_half_life_hours must be positive")
+    if cfg["schedule"].get("mode", "cron") != "cron":
+        raise ConfigError("schedule.mode must be cron")
+    try:
+        CronSchedule(cfg["schedule"].get("cron", ""))
+    except CronError as exc:
+        raise ConfigError(f"schedule.cron: {exc}")
+    if cfg["blog"]["mode"] not in ("single", "map_reduce", "auto"):
+        raise ConfigError("blog.mode must be one of: single, map_reduce, auto")
     if not cfg["taxonomy"]["categories"]:
         raise ConfigError("taxonomy.categories cannot be empty")
 
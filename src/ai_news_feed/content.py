@@ -1,15 +1,19 @@
 ﻿import re
 from typing import Optional, Tuple
+from urllib.parse import urlparse
 
-import requests
-from bs4 import BeautifulSoup
-from readability import Document
-import trafilatura
-
+from .recording import http_get
+from .tracing import span
 from .utils import normalize_whitespace
 
 
+# bs4, readability and trafilatura are imported on first use: they dominate
+# CLI startup time and most commands never extract an article.
+
+
 def clean_html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     for tag in soup(["script", "style", "noscript"]):
         tag.extract()
@@ -18,6 +22,8 @@ def clean_html_to_text(html: str) -> str:
 
 
 def extract_with_readability(html: str) -> Optional[str]:
+    from readability import Document
+
     try:
         doc = Document(html)
         summary_html = doc.summary()
@@ -27,6 +33,8 @@ def extract_with_readability(html: str) -> Optional[str]:
 
 
 def extract_with_trafilatura(html: str, url: str) -> Optional[str]:
+    import trafilatura
+
     try:
         extracted = trafilatura.extract(html, url=url, include_comments=False, include_tables=False)
         if not extracted:
@@ -41,15 +49,19 @@ def fetch_and_extract(url: str, rss_summary: Optional[str], timeout: int, max_ch
         return (normalize_whitespace(rss_summary or ""), "rss_only")
 
     try:
-        resp = requests.get(url, timeout=timeout, headers={"User-Agent": "ai-news-feed/1.0"})
-        resp.raise_for_status()
-        html = resp.text
+        with span("article_download", host=urlparse(url).netloc) as sp:
+            resp = http_get(url, timeout=timeout, headers={"User-Agent": "ai-news-feed/1.0"})
+            resp.raise_for_status()
+            html = resp.text
+            sp["bytes"] = len(html)
     except Exception:
         return (normalize_whitespace(rss_summary or ""), "rss_only")
 
-    text = extract_with_readability(html)
+    with span("extract_readability", host=urlparse(url).netloc):
+        text = extract_with_readability(html)
     if not text:
-        text = extract_with_trafilatura(html, url)
+        with span("extract_trafilatura", host=urlparse(url).netloc):
+            text = extract_with_trafilatura(html, url)
 
     if not text:
         return (normalize_whitespace(rss_summary or ""), "rss_only")
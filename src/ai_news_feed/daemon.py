@@ -0,0 +1,84 @@
+﻿import logging
+import signal
+import threading
+from typing import Any, Dict
+
+from .config import load_config
+from .db import init_db
+from .pipeline import run_pipeline, setup_logging
+from .schedule import CronSchedule
+from .utils import now_local
+
+# Re-check the clock at least this often while idle, so suspend/resume and DST
+# changes do not delay a tick.
+MAX_SLEEP_SEC = 60.0
+
+
+def install_stop_handlers(stop_event: threading.Event, what: str) -> None:
+    # First SIGINT/SIGTERM asks for a clean stop; a second one aborts.
+    def handle(signum, frame) -> None:
+        if stop_event.is_set():
+            logging.warning("Second %s received; exiting immediately", signal.Signals(signum).name)
+            raise KeyboardInterrupt
+        logging.info("%s received; finishing %s, then stopping (repeat to force)", signal.Signals(signum).name, what)
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handle)
+    signal.signal(signal.SIGTERM, handle)
+
+
+class Daemon:
+    def __init__(self, cfg: Dict[str, Any], config_path: str):
+        self.cfg = cfg
+        self.config_path = config_path
+        self.stop_event = threading.Event()
+        self.reload_requested = False
+
+    def _handle_reload(self, signum, frame) -> None:
+        logging.info("SIGHUP received; config will be reloaded before the next run")
+        self.reload_requested = True
+
+    def install_signal_handlers(self) -> None:
+        install_stop_handlers(self.stop_event, "the in-flight item")
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._handle_reload)
+
+    def _reload_config(self) -> None:
+        self.reload_requested = False
+        try:
+            self.cfg = load_config(self.config_path)
+            init_db(self.cfg["storage"]["db_path"])
+            logging.info("Reloaded config from %s", self.config_path)
+        except Exception:
+            logging.exception("Config reload failed; keeping the previous config")
+
+    def tick(self) -> None:
+        try:
+            run_pipeline(self.cfg, self.stop_event)
+        except Exception:
+            logging.exception("Scheduled run failed")
+
+    def wait_until(self, when) -> bool:
+        while not self.stop_event.is_set() and not self.reload_requested:
+            remaining = (when - now_local()).total_seconds()
+            if remaining <= 0:
+                return True
+            self.stop_event.wait(min(remaining, MAX_SLEEP_SEC))
+        return False
+
+    def serve(self, run_now: bool = False) -> None:
+        setup_logging()
+        init_db(self.cfg["storage"]["db_path"])
+        self.install_signal_handlers()
+        logging.info("Serving on schedule %r", self.cfg["schedule"]["cron"])
+        if run_now:
+            self.tick()
+        while not self.stop_event.is_set():
+            if self.reload_requested:
+                self._reload_config()
+            setup_logging()
+            next_run = CronSchedule(self.cfg["schedule"]["cron"]).next_after(now_local())
+            logging.info("Next run at %s", next_run.isoformat())
+            if self.wait_until(next_run):
+                self.tick()
+        logging.info("Shut down cleanly")
@@ -1,7 +1,34 @@
 ﻿import os
 import sqlite3
 from contextlib import contextmanager
-from typing import Any, Dict, List
+from dataclasses import replace
+from urllib.parse import quote
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .models import Item
+from .search import MARK_END, MARK_START, RANK_WEIGHTS, search_fields
+
+# Bullets and tags are read back as one group_concat column per list.
+LIST_SEP = "\x1f"
+
+# Archived items leave a stub in the hot database that keeps the dedup key and
+# reserves the id; everything else moves to the partition.
+_STUB_COLUMNS = ("id", "feed_id", "dedup_key", "collected_at", "source", "status")
+
+# Views that archive partitions are unioned through; each database file has its
+# own copy so the correlated lookups stay inside one file.
+_VIEWS = {
+    "item_rows": """
+        SELECT items.*,
+            (SELECT group_concat(text, char(31)) FROM item_bullets WHERE item_id = items.id) AS bullets,
+            (SELECT group_concat(tag, char(31)) FROM item_tags WHERE item_id = items.id) AS tags
+        FROM items
+    """,
+    "tag_rows": """
+        SELECT item_tags.item_id, item_tags.tag, items.collected_at, items.status, items.primary_category
+        FROM item_tags JOIN items ON items.id = item_tags.item_id
+    """,
+}
 
 
 def ensure_parent_dir(path: str) -> None:
@@ -13,7 +40,7 @@ def ensure_parent_dir(path: str) -> None:
 @contextmanager
 def get_connection(db_path: str):
     ensure_parent_dir(db_path)
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, uri=True)
     conn.row_factory = sqlite3.Row
     try:
         conn.execute("PRAGMA foreign_keys = ON")
@@ -23,6 +50,16 @@ def get_connection(db_path: str):
         conn.close()
 
 
+@contextmanager
+def read_only_connection(db_path: str):
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
 def init_db(db_path: str) -> None:
     with get_connection(db_path) as conn:
         conn.executescript(
@@ -34,7 +71,9 @@ def init_db(db_path: str) -> None:
                 enabled INTEGER,
                 last_fetch_at TEXT,
                 fail_count INTEGER,
-                last_error TEXT
+                last_error TEXT,
+                next_fetch_at TEXT,
+                poll_interval_sec INTEGER
             );
 
             CREATE TABLE IF NOT EXISTS items (
@@ -57,10 +96,279 @@ def init_db(db_path: str) -> None:
                 category_reason TEXT NULL,
                 status TEXT,
                 error TEXT NULL,
+                model TEXT NULL,
                 FOREIGN KEY(feed_id) REFERENCES feeds(id)
             );
+
+            CREATE TABLE IF NOT EXISTS blog_state (
+                blog_path TEXT PRIMARY KEY,
+                input_hash TEXT,
+                item_count INTEGER,
+                generated_at TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS blog_section_cache (
+                input_hash TEXT PRIMARY KEY,
+                summary TEXT,
+                created_at TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                command TEXT,
+                started_at TEXT,
+                finished_at TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS run_stage_stats (
+                run_id TEXT,
+                stage TEXT,
+                host TEXT,
+                count INTEGER,
+                errors INTEGER,
+                p50_ms REAL,
+                p95_ms REAL,
+                total_ms REAL,
+                input_tokens INTEGER,
+                output_tokens INTEGER,
+                cost_usd REAL,
+                PRIMARY KEY (run_id, stage, host),
+                FOREIGN KEY(run_id) REFERENCES runs(run_id)
+            );
+
+            CREATE TABLE IF NOT EXISTS reprocess_jobs (
+                job_id TEXT PRIMARY KEY,
+                filters_json TEXT,
+                max_item_id INTEGER,
+                last_item_id INTEGER,
+                total INTEGER,
+                done INTEGER,
+                failed INTEGER,
+                status TEXT,
+                created_at TEXT,
+                updated_at TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS latency_histograms (
+                kind TEXT,
+                key TEXT,
+                counts_json TEXT,
+                samples REAL,
+                updated_at TEXT,
+                PRIMARY KEY (kind, key)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_items_collected_at ON items(collected_at);
+            CREATE INDEX IF NOT EXISTS idx_items_pending ON items(id) WHERE status = 'pending';
             """
         )
+        _add_missing_columns(conn, "feeds", {"next_fetch_at": "TEXT", "poll_interval_sec": "INTEGER"})
+        _add_missing_columns(
+            conn, "items", {"model": "TEXT", "so_what": "TEXT", "rss_summary": "TEXT", "relevance": "INTEGER"}
+        )
+        _init_item_lists(conn)
+        for name, select in _VIEWS.items():
+            conn.execute(f"CREATE VIEW IF NOT EXISTS {name} AS {select}")
+        _init_search_index(conn)
+
+
+def _init_item_lists(conn: sqlite3.Connection) -> None:
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'item_tags'").fetchone()
+    if exists:
+        return
+    # WITHOUT ROWID keeps each item's rows clustered in position order, which
+    # is the order group_concat reads them back in.
+    conn.executescript(
+        """
+        CREATE TABLE item_bullets (
+            item_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (item_id, position)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE item_tags (
+            item_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            PRIMARY KEY (item_id, position)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX idx_item_tags_tag ON item_tags(tag, item_id);
+        """
+    )
+    # Migrate databases created before the lists were normalized.
+    conn.execute(
+        """
+        INSERT INTO item_bullets (item_id, position, text)
+        SELECT items.id, j.key, j.value FROM items, json_each(items.summary_zh, '$.bullets') AS j
+        WHERE json_valid(items.summary_zh)
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO item_tags (item_id, position, tag)
+        SELECT items.id, j.key, j.value FROM items, json_each(items.tags_json) AS j
+        WHERE json_valid(items.tags_json)
+        """
+    )
+    conn.execute(
+        "UPDATE items SET so_what = json_extract(summary_zh, '$.so_what') "
+        "WHERE so_what IS NULL AND json_valid(summary_zh)"
+    )
+
+
+def split_list(value: Optional[str]) -> List[str]:
+    return value.split(LIST_SEP) if value else []
+
+
+def _write_item_lists(conn: sqlite3.Connection, item_id: int, item: Item, schema: str = "main") -> None:
+    conn.execute(f"DELETE FROM {schema}.item_bullets WHERE item_id = ?", (item_id,))
+    conn.execute(f"DELETE FROM {schema}.item_tags WHERE item_id = ?", (item_id,))
+    conn.executemany(
+        f"INSERT INTO {schema}.item_bullets (item_id, position, text) VALUES (?, ?, ?)",
+        [(item_id, idx, text) for idx, text in enumerate(item.summary_bullets)],
+    )
+    conn.executemany(
+        f"INSERT INTO {schema}.item_tags (item_id, position, tag) VALUES (?, ?, ?)",
+        [(item_id, idx, tag) for idx, tag in enumerate(item.tags)],
+    )
+
+
+def _init_search_index(conn: sqlite3.Connection) -> None:
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'items_fts'").fetchone()
+    if exists:
+        return
+    # rowid is items.id; only processed items are indexed.
+    conn.execute(
+        "CREATE VIRTUAL TABLE items_fts USING fts5(title, summary, tags, source, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> int:
+    conn.execute("DELETE FROM items_fts")
+    count = 0
+    for row in conn.execute(
+        "SELECT id, title, so_what, source, bullets, tags FROM item_rows WHERE status = 'processed'"
+    ).fetchall():
+        _index_item(
+            conn,
+            row["id"],
+            Item(
+                title=row["title"],
+                summary_bullets=split_list(row["bullets"]),
+                so_what=row["so_what"],
+                tags=split_list(row["tags"]),
+                source=row["source"],
+            ),
+        )
+        count += 1
+    return count
+
+
+def _index_item(conn: sqlite3.Connection, item_id: int, item: Item, schema: str = "main") -> None:
+    conn.execute(
+        f"INSERT INTO {schema}.items_fts (rowid, title, summary, tags, source) VALUES (?, ?, ?, ?, ?)",
+        [item_id]
+        + search_fields(item.title, item.summary_bullets, item.so_what, item.tags, item.source),
+    )
+
+
+def _unindex_item(conn: sqlite3.Connection, item_id: int, schema: str = "main") -> None:
+    conn.execute(f"DELETE FROM {schema}.items_fts WHERE rowid = ?", (item_id,))
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: Dict[str, str]) -> None:
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, column_type in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [row["name"] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def attach_partition(conn: sqlite3.Connection, schema: str, path: str, writable: bool = False) -> None:
+    mode = "rw" if writable else "ro"
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (f"file:{quote(os.path.abspath(path))}?mode={mode}",))
+
+
+def detach_partition(conn: sqlite3.Connection, schema: str) -> None:
+    conn.execute(f"DETACH DATABASE {schema}")
+
+
+def attach_partitions(
+    conn: sqlite3.Connection, partitions: Sequence[Tuple[str, str]], writable: bool = False
+) -> List[str]:
+    for schema, path in partitions:
+        attach_partition(conn, schema, path, writable)
+    schemas = ["main"] + [schema for schema, _ in partitions]
+    # TEMP views shadow the main tables for unqualified reads, so every query
+    # below sees hot and archived items alike; writes name their schema.
+    for table in ("items", "item_rows", "tag_rows"):
+        columns = _columns(conn, "main", table)
+        selects = []
+        for schema in schemas:
+            present = set(_columns(conn, schema, table))
+            select_list = ", ".join(c if c in present else f"NULL AS {c}" for c in columns)
+            where = " WHERE status IS NOT 'archived'" if schema == "main" else ""
+            selects.append(f"SELECT {select_list}, '{schema}' AS db_schema FROM {schema}.{table}{where}")
+        conn.execute(f"CREATE TEMP VIEW {table} AS {' UNION ALL '.join(selects)}")
+    return schemas
+
+
+def move_items_to_partition(conn: sqlite3.Connection, schema: str, year: str, before_iso: str) -> int:
+    conn.execute("DROP TABLE IF EXISTS temp.moving_ids")
+    conn.execute(
+        "CREATE TEMP TABLE moving_ids AS SELECT id FROM main.items "
+        "WHERE collected_at < ? AND substr(collected_at, 1, 4) = ? AND status IS NOT 'archived'",
+        (before_iso, year),
+    )
+    moved = conn.execute("SELECT COUNT(*) FROM temp.moving_ids").fetchone()[0]
+    selection = "IN (SELECT id FROM temp.moving_ids)"
+    if moved:
+        present = set(_columns(conn, schema, "items"))
+        columns = ", ".join(c for c in _columns(conn, "main", "items") if c in present)
+        conn.execute(f"INSERT INTO {schema}.items ({columns}) SELECT {columns} FROM main.items WHERE id {selection}")
+        # Partitions are only read by versions that use the normalized lists.
+        conn.execute(f"UPDATE {schema}.items SET summary_zh = NULL, tags_json = NULL WHERE id {selection}")
+        for table in ("item_bullets", "item_tags"):
+            conn.execute(f"INSERT INTO {schema}.{table} SELECT * FROM main.{table} WHERE item_id {selection}")
+            conn.execute(f"DELETE FROM main.{table} WHERE item_id {selection}")
+        conn.execute(
+            f"INSERT INTO {schema}.items_fts (rowid, title, summary, tags, source) "
+            f"SELECT rowid, title, summary, tags, source FROM main.items_fts WHERE rowid {selection}"
+        )
+        conn.execute(f"DELETE FROM main.items_fts WHERE rowid {selection}")
+        cleared = ", ".join(f"{c} = NULL" for c in _columns(conn, "main", "items") if c not in _STUB_COLUMNS)
+        conn.execute(f"UPDATE main.items SET {cleared}, status = 'archived' WHERE id {selection}")
+    conn.execute("DROP TABLE temp.moving_ids")
+    return moved
+
+
+def count_items_to_archive(conn: sqlite3.Connection, before_iso: str):
+    return conn.execute(
+        "SELECT substr(collected_at, 1, 4) AS year, COUNT(*) AS n FROM main.items "
+        "WHERE collected_at < ? AND status IS NOT 'archived' GROUP BY year ORDER BY year",
+        (before_iso,),
+    ).fetchall()
+
+
+def compact_partition(conn: sqlite3.Connection, schema: str) -> None:
+    # Partitions are only appended to by archive, so merge the FTS segments and
+    # drop free pages while nothing else is writing.
+    conn.execute(f"INSERT INTO {schema}.items_fts (items_fts) VALUES ('optimize')")
+    conn.commit()
+    conn.execute(f"VACUUM {schema}")
+
+
+def partition_stats(conn: sqlite3.Connection, schema: str):
+    return conn.execute(
+        f"SELECT COUNT(*) AS items, MIN(collected_at) AS first_collected_at, MAX(collected_at) AS last_collected_at "
+        f"FROM {schema}.items"
+    ).fetchone()
 
 
 def upsert_feed(conn: sqlite3.Connection, feed: Dict[str, Any]) -> int:
@@ -76,62 +384,419 @@ def upsert_feed(conn: sqlite3.Connection, feed: Dict[str, Any]) -> int:
     return int(row["id"]) if row else 0
 
 
-def mark_feed_success(conn: sqlite3.Connection, feed_id: int, fetched_at: str) -> None:
+def get_feed(conn: sqlite3.Connection, feed_id: int):
+    return conn.execute("SELECT * FROM feeds WHERE id = ?", (feed_id,)).fetchone()
+
+
+def list_feeds(conn: sqlite3.Connection):
+    return conn.execute("SELECT * FROM feeds ORDER BY COALESCE(next_fetch_at, ''), name").fetchall()
+
+
+def mark_feed_success(
+    conn: sqlite3.Connection,
+    feed_id: int,
+    fetched_at: str,
+    next_fetch_at: Optional[str] = None,
+    poll_interval_sec: Optional[int] = None,
+) -> None:
     conn.execute(
-        "UPDATE feeds SET last_fetch_at = ?, last_error = NULL WHERE id = ?",
-        (fetched_at, feed_id),
+        "UPDATE feeds SET last_fetch_at = ?, last_error = NULL, fail_count = 0, next_fetch_at = ?, "
+        "poll_interval_sec = COALESCE(?, poll_interval_sec) WHERE id = ?",
+        (fetched_at, next_fetch_at, poll_interval_sec, feed_id),
     )
 
 
-def mark_feed_failure(conn: sqlite3.Connection, feed_id: int, error: str) -> None:
+def mark_feed_failure(
+    conn: sqlite3.Connection, feed_id: int, error: str, next_fetch_at: Optional[str] = None
+) -> None:
     conn.execute(
-        "UPDATE feeds SET fail_count = COALESCE(fail_count, 0) + 1, last_error = ? WHERE id = ?",
-        (error, feed_id),
+        "UPDATE feeds SET fail_count = COALESCE(fail_count, 0) + 1, last_error = ?, next_fetch_at = ? WHERE id = ?",
+        (error, next_fetch_at, feed_id),
     )
 
 
+def mark_feed_due(conn: sqlite3.Connection, feed_id: int) -> None:
+    conn.execute("UPDATE feeds SET next_fetch_at = NULL WHERE id = ?", (feed_id,))
+
+
 def item_exists(conn: sqlite3.Connection, dedup_key: str) -> bool:
     row = conn.execute("SELECT 1 FROM items WHERE dedup_key = ?", (dedup_key,)).fetchone()
     return row is not None
 
 
-def insert_item(conn: sqlite3.Connection, item: Dict[str, Any]) -> None:
-    conn.execute(
+def insert_item(conn: sqlite3.Connection, item: Item) -> int:
+    cur = conn.execute(
         """
         INSERT INTO items (
             feed_id, guid, url, dedup_key, title, author, published_at, collected_at,
-            source, content_status, summary_zh, primary_category, tags_json, impact,
-            category_confidence, category_reason, status, error
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            source, content_status, summary_zh, so_what, primary_category, tags_json, impact,
+            category_confidence, category_reason, status, error, model, rss_summary, relevance
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
-            item.get("feed_id"),
-            item.get("guid"),
-            item.get("url"),
-            item.get("dedup_key"),
-            item.get("title"),
-            item.get("author"),
-            item.get("published_at"),
-            item.get("collected_at"),
-            item.get("source"),
-            item.get("content_status"),
-            item.get("summary_zh"),
-            item.get("primary_category"),
-            item.get("tags_json"),
-            item.get("impact"),
-            item.get("category_confidence"),
-            item.get("category_reason"),
-            item.get("status"),
-            item.get("error"),
+            item.feed_id,
+            item.guid,
+            item.url,
+            item.dedup_key,
+            item.title,
+            item.author,
+            item.published_at,
+            item.collected_at,
+            item.source,
+            item.content_status,
+            item.summary_zh,
+            item.so_what,
+            item.primary_category,
+            item.tags_json,
+            item.impact,
+            item.category_confidence,
+            item.category_reason,
+            item.status,
+            item.error,
+            item.model,
+            # Only pending and failed rows need the feed summary, as the fallback
+            # text for the next attempt (a run or a reprocess).
+            item.rss_summary if item.status in ("pending", "failed") else None,
+            item.relevance,
         ),
     )
+    _write_item_lists(conn, cur.lastrowid, item)
+    if item.status == "processed":
+        _index_item(conn, cur.lastrowid, item)
+    return cur.lastrowid
 
 
-def list_items_between(conn: sqlite3.Connection, start_iso: str, end_iso: str):
+def update_item_enrichment(
+    conn: sqlite3.Connection, item_id: int, item: Item, schema: str = "main"
+) -> None:
+    conn.execute(
+        f"""
+        UPDATE {schema}.items SET
+            content_status = ?, summary_zh = ?, so_what = ?, primary_category = ?, tags_json = ?, impact = ?,
+            category_confidence = ?, category_reason = ?, status = ?, error = ?, model = ?
+        WHERE id = ?
+        """,
+        (
+            item.content_status,
+            item.summary_zh,
+            item.so_what,
+            item.primary_category,
+            item.tags_json,
+            item.impact,
+            item.category_confidence,
+            item.category_reason,
+            item.status,
+            item.error,
+            item.model,
+            item_id,
+        ),
+    )
+    _write_item_lists(conn, item_id, item, schema)
+    _unindex_item(conn, item_id, schema)
+    if item.status == "processed":
+        row = conn.execute(f"SELECT title, source FROM {schema}.items WHERE id = ?", (item_id,)).fetchone()
+        _index_item(conn, item_id, replace(item, title=row["title"], source=row["source"]), schema)
+
+
+def list_pending_items(conn: sqlite3.Connection):
+    return conn.execute(
+        "SELECT id, url, dedup_key, source, published_at, collected_at, relevance FROM main.items "
+        "WHERE status = 'pending'"
+    ).fetchall()
+
+
+def get_item(conn: sqlite3.Connection, item_id: int):
+    return conn.execute("SELECT * FROM main.items WHERE id = ?", (item_id,)).fetchone()
+
+
+def complete_pending_item(conn: sqlite3.Connection, item_id: int, item: Item) -> None:
+    # Collected when summarized, so items left over from an earlier run land
+    # in the current week's digest. Failed items keep the feed summary for
+    # reprocess.
+    conn.execute(
+        "UPDATE main.items SET collected_at = ?,"
+        " rss_summary = CASE WHEN ? = 'failed' THEN rss_summary END WHERE id = ?",
+        (item.collected_at, item.status, item_id),
+    )
+    update_item_enrichment(conn, item_id, item)
+
+
+def mark_item_failed(conn: sqlite3.Connection, item_id: int, error: str, schema: str = "main") -> None:
+    # Rows that already have a good enrichment keep it when a re-run fails.
+    conn.execute(f"UPDATE {schema}.items SET error = ? WHERE id = ? AND status = 'processed'", (error, item_id))
+    conn.execute(
+        f"UPDATE {schema}.items SET status = 'failed', error = ? WHERE id = ? AND status != 'processed'", (error, item_id)
+    )
+
+
+def _item_filter_sql(filters: Dict[str, Any]):
+    clauses, params = [], []
+    if filters.get("status"):
+        clauses.append(f"status IN ({', '.join('?' for _ in filters['status'])})")
+        params.extend(filters["status"])
+    if filters.get("since"):
+        clauses.append("collected_at >= ?")
+        params.append(filters["since"])
+    if filters.get("until"):
+        clauses.append("collected_at < ?")
+        params.append(filters["until"])
+    for column in ("source", "primary_category", "model"):
+        if filters.get(column):
+            clauses.append(f"{column} = ?")
+            params.append(filters[column])
+    return " AND ".join(clauses) or "1 = 1", params
+
+
+def count_items_matching(conn: sqlite3.Connection, filters: Dict[str, Any], max_item_id: int) -> int:
+    where, params = _item_filter_sql(filters)
+    row = conn.execute(f"SELECT COUNT(*) FROM items WHERE {where} AND id <= ?", params + [max_item_id]).fetchone()
+    return int(row[0])
+
+
+def select_items_matching(
+    conn: sqlite3.Connection, filters: Dict[str, Any], after_id: int, max_item_id: int, limit: int
+):
+    where, params = _item_filter_sql(filters)
+    return conn.execute(
+        f"SELECT * FROM items WHERE {where} AND id > ? AND id <= ? ORDER BY id LIMIT ?",
+        params + [after_id, max_item_id, limit],
+    ).fetchall()
+
+
+def search_items(
+    conn: sqlite3.Connection,
+    match: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    category: Optional[str] = None,
+    source: Optional[str] = None,
+    limit: int = 20,
+    schemas: Sequence[str] = ("main",),
+):
+    clauses, params = ["items_fts MATCH ?"], [match]
+    if since:
+        clauses.append("items.collected_at >= ?")
+        params.append(since)
+    if until:
+        clauses.append("items.collected_at < ?")
+        params.append(until)
+    if category:
+        clauses.append("items.primary_category = ?")
+        params.append(category)
+    if source:
+        clauses.append("items.source = ?")
+        params.append(source)
+    weights = ", ".join(str(w) for w in RANK_WEIGHTS)
+    # FTS tables cannot be unioned, so each archive partition is queried on its
+    # own and the best matches are merged.
+    rows = []
+    for schema in schemas:
+        rows.extend(
+            conn.execute(
+                f"""
+                SELECT items.id, items.title, items.url, items.source, items.collected_at, items.primary_category,
+                       bm25(items_fts, {weights}) AS rank,
+                       snippet(items_fts, -1, '{MARK_START}', '{MARK_END}', '…', 24) AS snippet
+                FROM {schema}.items_fts AS items_fts JOIN {schema}.items AS items ON items.id = items_fts.rowid
+                WHERE {" AND ".join(clauses)}
+                ORDER BY rank
+                LIMIT ?
+                """,
+                params + [limit],
+            ).fetchall()
+        )
+    return sorted(rows, key=lambda row: row["rank"])[:limit]
+
+
+def max_item_id(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM items").fetchone()
+    return int(row[0])
+
+
+def get_reprocess_job(conn: sqlite3.Connection, job_id: str):
+    return conn.execute("SELECT * FROM reprocess_jobs WHERE job_id = ?", (job_id,)).fetchone()
+
+
+def create_reprocess_job(
+    conn: sqlite3.Connection, job_id: str, filters_json: str, max_id: int, total: int, created_at: str
+) -> None:
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO reprocess_jobs
+            (job_id, filters_json, max_item_id, last_item_id, total, done, failed, status, created_at, updated_at)
+        VALUES (?, ?, ?, 0, ?, 0, 0, 'running', ?, ?)
+        """,
+        (job_id, filters_json, max_id, total, created_at, created_at),
+    )
+
+
+def update_reprocess_job(
+    conn: sqlite3.Connection, job_id: str, last_item_id: int, done: int, failed: int, status: str, updated_at: str
+) -> None:
+    conn.execute(
+        """
+        UPDATE reprocess_jobs
+        SET last_item_id = ?, done = done + ?, failed = failed + ?, status = ?, updated_at = ?
+        WHERE job_id = ?
+        """,
+        (last_item_id, done, failed, status, updated_at, job_id),
+    )
+
+
+def iter_items_between(conn: sqlite3.Connection, start_iso: str, end_iso: str) -> sqlite3.Cursor:
     return conn.execute(
         """
-        SELECT * FROM items
+        SELECT * FROM item_rows
         WHERE collected_at >= ? AND collected_at < ? AND status = 'processed'
         """,
         (start_iso, end_iso),
+    )
+
+
+def get_item_links(conn: sqlite3.Connection, item_ids: Sequence[int]):
+    # Archive stubs have no title, so only full rows (hot or attached) count.
+    if not item_ids:
+        return []
+    placeholders = ", ".join("?" for _ in item_ids)
+    return conn.execute(
+        f"SELECT id, title, url, source, collected_at FROM items WHERE id IN ({placeholders}) AND title IS NOT NULL",
+        list(item_ids),
     ).fetchall()
+
+
+def iter_processed_item_rows(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    return conn.execute("SELECT * FROM item_rows WHERE status = 'processed' ORDER BY id")
+
+
+def list_items_between(conn: sqlite3.Connection, start_iso: str, end_iso: str):
+    return iter_items_between(conn, start_iso, end_iso).fetchall()
+
+
+def list_collected_dates(conn: sqlite3.Connection) -> List[str]:
+    rows = conn.execute(
+        "SELECT DISTINCT substr(collected_at, 1, 10) FROM items WHERE status = 'processed' ORDER BY 1"
+    ).fetchall()
+    return [row[0] for row in rows if row[0]]
+
+
+def tag_week_counts(conn: sqlite3.Connection, since_iso: str, category: Optional[str] = None):
+    # Weeks start on Monday of the local collection date (the stored offset is
+    # local, so the date prefix is used rather than converting to UTC).
+    sql = """
+        SELECT date(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days') AS week_start,
+               tag, COUNT(*) AS n
+        FROM (
+            SELECT substr(collected_at, 1, 10) AS day, tag FROM tag_rows
+            WHERE status = 'processed' AND collected_at >= ?{category}
+        )
+        GROUP BY week_start, tag
+        ORDER BY week_start, n DESC
+    """
+    params: List[Any] = [since_iso]
+    if category:
+        params.append(category)
+    return conn.execute(sql.format(category=" AND primary_category = ?" if category else ""), params).fetchall()
+
+
+def get_blog_state(conn: sqlite3.Connection, blog_path: str):
+    return conn.execute("SELECT * FROM blog_state WHERE blog_path = ?", (blog_path,)).fetchone()
+
+
+def upsert_blog_state(
+    conn: sqlite3.Connection, blog_path: str, input_hash: str, item_count: int, generated_at: str
+) -> None:
+    conn.execute(
+        """
+        INSERT INTO blog_state (blog_path, input_hash, item_count, generated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(blog_path) DO UPDATE SET
+            input_hash = excluded.input_hash,
+            item_count = excluded.item_count,
+            generated_at = excluded.generated_at
+        """,
+        (blog_path, input_hash, item_count, generated_at),
+    )
+
+
+def get_blog_section_summary(conn: sqlite3.Connection, input_hash: str):
+    row = conn.execute(
+        "SELECT summary FROM blog_section_cache WHERE input_hash = ?", (input_hash,)
+    ).fetchone()
+    return row["summary"] if row else None
+
+
+def upsert_blog_section_summary(conn: sqlite3.Connection, input_hash: str, summary: str, created_at: str) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO blog_section_cache (input_hash, summary, created_at) VALUES (?, ?, ?)",
+        (input_hash, summary, created_at),
+    )
+
+
+def insert_run(conn: sqlite3.Connection, run_id: str, command: str, started_at: str, finished_at: str) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO runs (run_id, command, started_at, finished_at) VALUES (?, ?, ?, ?)",
+        (run_id, command, started_at, finished_at),
+    )
+
+
+def insert_run_stage_stats(conn: sqlite3.Connection, run_id: str, rows: List[Dict[str, Any]]) -> None:
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO run_stage_stats (
+            run_id, stage, host, count, errors, p50_ms, p95_ms, total_ms,
+            input_tokens, output_tokens, cost_usd
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                run_id,
+                row["stage"],
+                row["host"],
+                row["count"],
+                row["errors"],
+                row["p50_ms"],
+                row["p95_ms"],
+                row["total_ms"],
+                row["input_tokens"],
+                row["output_tokens"],
+                row["cost_usd"],
+            )
+            for row in rows
+        ],
+    )
+
+
+def list_runs(conn: sqlite3.Connection, limit: int):
+    return conn.execute(
+        """
+        SELECT r.run_id, r.command, r.started_at, r.finished_at,
+               COALESCE(SUM(s.input_tokens), 0) AS input_tokens,
+               COALESCE(SUM(s.output_tokens), 0) AS output_tokens,
+               COALESCE(SUM(s.cost_usd), 0) AS cost_usd
+        FROM runs r
+        LEFT JOIN run_stage_stats s ON s.run_id = r.run_id AND s.host = ''
+        GROUP BY r.run_id
+        ORDER BY r.started_at DESC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
+
+
+def get_run_stage_stats(conn: sqlite3.Connection, run_id: str, by_host: bool = False):
+    host_filter = "" if by_host else "AND host = ''"
+    return conn.execute(
+        f"SELECT * FROM run_stage_stats WHERE run_id = ? {host_filter} ORDER BY stage, host",
+        (run_id,),
+    ).fetchall()
+
+
+def list_latency_histograms(conn: sqlite3.Connection):
+    return conn.execute("SELECT * FROM latency_histograms ORDER BY kind, key").fetchall()
+
+
+def upsert_latency_histograms(conn: sqlite3.Connection, rows: List[Tuple[str, str, str, float, str]]) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO latency_histograms (kind, key, counts_json, samples, updated_at) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
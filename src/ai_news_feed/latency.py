@@ -0,0 +1,236 @@
+﻿import bisect
+import json
+import logging
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from .db import get_connection, list_latency_histograms, upsert_latency_histograms
+from .utils import now_local
+
+# Bucket upper bounds 25% apart, from 10 ms to about 9 minutes; the last
+# bucket holds everything slower.
+BOUNDS_MS = [10.0 * 1.25**i for i in range(50)]
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"settings": None, "histograms": {}, "calls": {}, "hedges": {}}
+
+
+class Histogram:
+    def __init__(self, counts: Optional[List[float]] = None):
+        self.counts = [0.0] * (len(BOUNDS_MS) + 1)
+        for i, count in enumerate((counts or [])[: len(self.counts)]):
+            self.counts[i] = float(count)
+
+    @property
+    def samples(self) -> float:
+        return sum(self.counts)
+
+    def add(self, duration_ms: float) -> None:
+        self.counts[bisect.bisect_left(BOUNDS_MS, duration_ms)] += 1
+
+    def percentile(self, pct: float) -> float:
+        rank = pct / 100.0 * self.samples
+        seen = 0.0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return BOUNDS_MS[min(i, len(BOUNDS_MS) - 1)]
+        return BOUNDS_MS[-1]
+
+    def decay(self, max_samples: float) -> None:
+        # Halving keeps the shape but lets recent runs outweigh old ones.
+        while self.samples > max_samples:
+            self.counts = [count / 2 for count in self.counts]
+
+
+def start_latency(cfg: Dict[str, Any]) -> None:
+    settings = cfg.get("latency", {})
+    if not settings.get("enabled", True):
+        with _lock:
+            _state.update(settings=None, histograms={}, calls={}, hedges={})
+        return
+    with get_connection(cfg["storage"]["db_path"]) as conn:
+        rows = list_latency_histograms(conn)
+    histograms = {(row["kind"], row["key"]): Histogram(json.loads(row["counts_json"])) for row in rows}
+    with _lock:
+        _state.update(settings=settings, histograms=histograms, calls={}, hedges={})
+
+
+def finish_latency(db_path: str) -> None:
+    with _lock:
+        settings, histograms = _state["settings"], _state["histograms"]
+        calls, hedges = _state["calls"], _state["hedges"]
+        _state.update(settings=None, histograms={}, calls={}, hedges={})
+    if settings is None:
+        return
+    for kind, count in sorted(hedges.items()):
+        logging.info("Hedged %s of %s %s requests", count, calls.get(kind, 0), kind)
+    updated_at = now_local().isoformat()
+    rows = []
+    for (kind, key), hist in sorted(histograms.items()):
+        hist.decay(settings["max_samples"])
+        rows.append((kind, key, json.dumps([round(c, 3) for c in hist.counts]), hist.samples, updated_at))
+    with get_connection(db_path) as conn:
+        upsert_latency_histograms(conn, rows)
+
+
+def _histogram(kind: str, key: str, settings: Dict[str, Any]) -> Optional[Histogram]:
+    hist = _state["histograms"].get((kind, key))
+    if hist is None or hist.samples < settings["min_samples"]:
+        return None
+    return hist
+
+
+def timeout_for(kind: str, key: str, ceiling: float, settings: Optional[Dict[str, Any]] = None) -> float:
+    # The configured timeout stays the upper bound; hosts and models with
+    # enough history get a multiple of their observed tail instead.
+    settings = settings or _state["settings"]
+    if not settings or not settings["adaptive_timeouts"]:
+        return ceiling
+    hist = _histogram(kind, key, settings)
+    if hist is None:
+        return ceiling
+    derived = hist.percentile(settings["timeout_percentile"]) / 1000.0 * settings["timeout_multiplier"]
+    return max(float(settings["min_timeout_sec"]), min(float(ceiling), derived))
+
+
+def hedge_delay(kind: str, key: str, timeout: float, settings: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    settings = settings or _state["settings"]
+    if not settings or not settings.get(f"hedge_{kind}", False):
+        return None
+    hist = _histogram(kind, key, settings)
+    if hist is None:
+        return None
+    delay = hist.percentile(settings["hedge_percentile"]) / 1000.0
+    return delay if delay < timeout else None
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__
+
+
+def _record(kind: str, key: str, duration_ms: float) -> None:
+    with _lock:
+        if _state["settings"] is None:
+            return
+        hist = _state["histograms"].get((kind, key))
+        if hist is None:
+            hist = _state["histograms"][(kind, key)] = Histogram()
+        hist.add(duration_ms)
+
+
+def _timed(kind: str, key: str, fn: Callable[[float], Any], timeout: float) -> Any:
+    # Timeouts are recorded at the time they took, so a host that keeps timing
+    # out pushes its own timeout back up towards the ceiling.
+    started = time.perf_counter()
+    try:
+        result = fn(timeout)
+    except Exception as exc:
+        if _is_timeout(exc):
+            _record(kind, key, (time.perf_counter() - started) * 1000)
+        raise
+    _record(kind, key, (time.perf_counter() - started) * 1000)
+    return result
+
+
+def _start(
+    kind: str, key: str, fn: Callable[[float], Any], timeout: float, before: Optional[Callable[[], None]] = None
+) -> Future:
+    # Daemon threads, so an abandoned request never holds up interpreter exit.
+    future: Future = Future()
+
+    def target() -> None:
+        try:
+            if before is not None:
+                before()
+            future.set_result(_timed(kind, key, fn, timeout))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=target, name=f"{kind}-request", daemon=True).start()
+    return future
+
+
+def _take_hedge(kind: str) -> bool:
+    with _lock:
+        settings = _state["settings"]
+        if settings is None:
+            return False
+        hedges = _state["hedges"].get(kind, 0)
+        if hedges + 1 > math.floor(settings["hedge_max_fraction"] * _state["calls"].get(kind, 0)):
+            return False
+        _state["hedges"][kind] = hedges + 1
+        return True
+
+
+def timed_call(
+    kind: str,
+    key: str,
+    fn: Callable[[float], Any],
+    timeout: float,
+    before_hedge: Optional[Callable[[], None]] = None,
+) -> Any:
+    # Runs fn(timeout) with a timeout derived from the key's history. A call
+    # still running at the observed hedge percentile gets one duplicate (within
+    # hedge_max_fraction of the run's calls) and the first success wins; the
+    # slower request is left to finish in the background.
+    settings = _state["settings"]
+    if settings is None:
+        return fn(timeout)
+    with _lock:
+        _state["calls"][kind] = _state["calls"].get(kind, 0) + 1
+    timeout = timeout_for(kind, key, timeout, settings)
+    delay = hedge_delay(kind, key, timeout, settings)
+    if delay is None:
+        return _timed(kind, key, fn, timeout)
+
+    primary = _start(kind, key, fn, timeout)
+    done, _ = wait([primary], timeout=delay)
+    if done or not _take_hedge(kind):
+        return primary.result()
+    pending = {primary, _start(kind, key, fn, timeout, before_hedge)}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+def histogram_rows(cfg: Dict[str, Any], conn) -> List[Dict[str, Any]]:
+    settings = cfg["latency"]
+    rows = []
+    for row in list_latency_histograms(conn):
+        hist = Histogram(json.loads(row["counts_json"]))
+        enough = hist.samples >= settings["min_samples"]
+        rows.append(
+            {
+                "kind": row["kind"],
+                "key": row["key"],
+                "samples": hist.samples,
+                "p50_ms": hist.percentile(50),
+                "p95_ms": hist.percentile(95),
+                "p99_ms": hist.percentile(99),
+                # Before the configured timeout of the call caps it.
+                "timeout_sec": (
+                    max(
+                        float(settings["min_timeout_sec"]),
+                        hist.percentile(settings["timeout_percentile"]) / 1000.0 * settings["timeout_multiplier"],
+                    )
+                    if enough and settings["adaptive_timeouts"]
+                    else None
+                ),
+                "hedge_after_sec": (
+                    hist.percentile(settings["hedge_percentile"]) / 1000.0
+                    if enough and settings.get(f"hedge_{row['kind']}", False)
+                    else None
+                ),
+                "updated_at": row["updated_at"],
+            }
+        )
+    return rows
@@ -1,11 +1,19 @@
 ﻿import json
+import logging
 import os
-from typing import Any, Dict
-
-from jsonschema import validate, ValidationError
-from tenacity import retry, stop_after_attempt, wait_fixed
+import re
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, Optional
 
+from .budget import charge
 from .classify import fallback_classify
+from .latency import timed_call
+from .models import Item
+from .ratelimit import CircuitOpenError, estimate_tokens, get_llm_guard, retry_after_seconds
+from .recording import llm_key, llm_loose_key, mode as recording_mode, record_llm, replay_llm
+from .routing import select_route
+from .tracing import span
 
 SYSTEM_PROMPT = (
     "你是一个严谨的中文新闻编辑与分类器。你必须只输出严格的 JSON，不要输出任何多余文字、"
@@ -24,6 +32,11 @@ BLOG_SYSTEM_PROMPT = (
     "4) 避免空泛陈词，基于材料进行推断。"
 )
 
+SECTION_SYSTEM_PROMPT = (
+    "你是一位严谨的中文科技编辑。请把输入的某一类目下的本周新闻压缩为要点摘要，供后续撰写周报博客使用。"
+    "要求：保留关键事实、数字、公司与模型名称；合并同一事件的多条报道；不要编造材料中没有的信息。"
+)
+
 OUTPUT_SCHEMA = {
     "type": "object",
     "required": [
@@ -48,15 +61,26 @@ OUTPUT_SCHEMA = {
 }
 
 
-def build_user_prompt(item: Dict[str, Any], content: str, taxonomy: Dict[str, Any]) -> str:
+KEYWORD_MODEL = "keyword"
+
+# Latency history is kept per model and prompt kind: a blog post takes far
+# longer than one item's summary on the same model.
+_LATENCY_LABELS = {SYSTEM_PROMPT: "summarize", BLOG_SYSTEM_PROMPT: "blog", SECTION_SYSTEM_PROMPT: "section"}
+
+OUTPUT_KEYS = frozenset(OUTPUT_SCHEMA["required"])
+
+_CODE_FENCE_RE = re.compile(r"^```[\w-]*[ \t]*\n?(.*?)\n?```$", re.S)
+
+
+def build_user_prompt(item: Item, content: str, taxonomy: Dict[str, Any]) -> str:
     taxonomy_excerpt = json.dumps(taxonomy, ensure_ascii=False)
     return (
         "请根据以下文章信息生成“中文摘要 + 主类目 + 标签 + 影响评级”。请严格遵守输出 JSON 格式与字段约束。\n\n"
         "【文章信息】\n"
-        f"title: {item.get('title')}\n"
-        f"source: {item.get('source')}\n"
-        f"url: {item.get('url')}\n"
-        f"published_at: {item.get('published_at')}\n"
+        f"title: {item.title}\n"
+        f"source: {item.source}\n"
+        f"url: {item.url}\n"
+        f"published_at: {item.published_at}\n"
         "content:\n"
         f"{content}\n\n"
         "【taxonomy】\n"
@@ -85,31 +109,215 @@ def extract_text_from_response(resp: Any) -> str:
     raise ValueError("Unrecognized OpenAI response format")
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-def call_openai(model: str, api_key: str, user_prompt: str, timeout: int, system_prompt: str = SYSTEM_PROMPT) -> str:
+def _record_usage(sp: Dict[str, Any], usage: Any) -> int:
+    if usage is None:
+        return 0
+    sp["input_tokens"] = getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", 0) or 0
+    sp["output_tokens"] = getattr(usage, "output_tokens", None) or getattr(usage, "completion_tokens", 0) or 0
+    charge(sp.get("model"), sp["input_tokens"], sp["output_tokens"])
+    return sp["input_tokens"] + sp["output_tokens"]
+
+
+def _error_headers(exc: BaseException):
+    return getattr(getattr(exc, "response", None), "headers", None)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _responses_unsupported(exc: BaseException) -> bool:
+    return isinstance(exc, AttributeError) or getattr(exc, "status_code", None) == 404
+
+
+# Set once the Responses API turns out to be unavailable, so later calls go
+# straight to Chat Completions instead of paying for a failed request each time.
+_api_state = {"use_chat": False}
+
+
+@lru_cache(maxsize=4)
+def _openai_client(api_key: str):
     from openai import OpenAI
 
-    client = OpenAI(api_key=api_key)
+    # Clients are thread-safe and hold the HTTP connection pool, so one per key is
+    # shared by all workers (and across scheduled runs in `serve`).
+    return OpenAI(api_key=api_key, max_retries=0)
+
+
+def call_openai(
+    model: str,
+    api_key: str,
+    user_prompt: str,
+    timeout: int,
+    system_prompt: str = SYSTEM_PROMPT,
+    cfg: Optional[Dict[str, Any]] = None,
+) -> str:
+    key = llm_key(model, system_prompt, user_prompt)
+    loose_key = llm_loose_key(model, system_prompt, user_prompt)
+    replayed = replay_llm(key, loose_key)
+    if replayed is not None:
+        return replayed
     try:
-        resp = client.responses.create(
-            model=model,
-            input=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            timeout=timeout,
-        )
-        return extract_text_from_response(resp)
-    except Exception:
-        resp = client.chat.completions.create(
+        text = _call_openai_api(model, api_key, user_prompt, timeout, system_prompt, cfg)
+    except Exception as exc:
+        record_llm(key, model, error=exc, loose_key=loose_key)
+        raise
+    record_llm(key, model, text, loose_key=loose_key)
+    return text
+
+
+def _call_openai_api(
+    model: str, api_key: str, user_prompt: str, timeout: int, system_prompt: str, cfg: Optional[Dict[str, Any]]
+) -> str:
+    from tenacity import Retrying, retry_if_exception, stop_after_attempt
+
+    guard = get_llm_guard(cfg)
+    estimated = estimate_tokens(system_prompt, user_prompt)
+
+    def wait(retry_state) -> float:
+        exc = retry_state.outcome.exception()
+        return guard.backoff(retry_state.attempt_number, retry_after_seconds(_error_headers(exc)))
+
+    for attempt in Retrying(
+        stop=stop_after_attempt(guard.retries),
+        wait=wait,
+        retry=retry_if_exception(_is_retryable),
+        reraise=True,
+    ):
+        with attempt:
+            if not guard.breaker.allow():
+                raise CircuitOpenError("LLM circuit breaker is open")
+            guard.limiter.acquire(estimated)
+            try:
+                # A hedged duplicate takes its own rate-limit reservation.
+                text, headers, used = timed_call(
+                    "llm",
+                    f"{model}/{_LATENCY_LABELS.get(system_prompt, 'other')}",
+                    lambda t: _call_openai_once(model, api_key, user_prompt, t, system_prompt),
+                    timeout,
+                    before_hedge=lambda: guard.limiter.acquire(estimated),
+                )
+            except Exception as exc:
+                headers = _error_headers(exc)
+                guard.limiter.update_from_headers(headers)
+                if _is_retryable(exc):
+                    guard.breaker.record_failure()
+                    if getattr(exc, "status_code", None) == 429:
+                        guard.limiter.pause(retry_after_seconds(headers) or guard.backoff_base)
+                raise
+            guard.limiter.update_from_headers(headers)
+            guard.limiter.reconcile(estimated, used or estimated)
+            guard.breaker.record_success()
+            return text
+
+
+def _call_openai_once(model: str, api_key: str, user_prompt: str, timeout: int, system_prompt: str):
+    client = _openai_client(api_key)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    if not _api_state["use_chat"]:
+        try:
+            with span("llm", host=model, model=model, api="responses") as sp:
+                raw = client.responses.with_raw_response.create(model=model, input=messages, timeout=timeout)
+                resp = raw.parse()
+                used = _record_usage(sp, getattr(resp, "usage", None))
+                return extract_text_from_response(resp), raw.headers, used
+        except Exception as exc:
+            if not _responses_unsupported(exc):
+                raise
+            logging.info("Responses API unavailable for %s; using Chat Completions", model)
+            _api_state["use_chat"] = True
+
+    with span("llm", host=model, model=model, api="chat") as sp:
+        raw = client.chat.completions.with_raw_response.create(model=model, messages=messages, timeout=timeout)
+        resp = raw.parse()
+        used = _record_usage(sp, getattr(resp, "usage", None))
+        return extract_text_from_response(resp), raw.headers, used
+
+
+def stream_openai(
+    model: str,
+    api_key: str,
+    user_prompt: str,
+    idle_timeout: float,
+    system_prompt: str = SYSTEM_PROMPT,
+    cfg: Optional[Dict[str, Any]] = None,
+) -> Iterator[str]:
+    key = llm_key(model, system_prompt, user_prompt)
+    loose_key = llm_loose_key(model, system_prompt, user_prompt)
+    replayed = replay_llm(key, loose_key)
+    if replayed is not None:
+        yield replayed
+        return
+    guard = get_llm_guard(cfg)
+    if not guard.breaker.allow():
+        raise CircuitOpenError("LLM circuit breaker is open")
+    guard.limiter.acquire(estimate_tokens(system_prompt, user_prompt))
+    parts = []
+    try:
+        for chunk in _stream_openai_api(model, api_key, user_prompt, idle_timeout, system_prompt):
+            parts.append(chunk)
+            yield chunk
+    except Exception as exc:
+        if _is_retryable(exc):
+            guard.breaker.record_failure()
+        record_llm(key, model, error=exc, loose_key=loose_key)
+        raise
+    guard.breaker.record_success()
+    record_llm(key, model, "".join(parts), loose_key=loose_key)
+
+
+def _stream_openai_api(
+    model: str, api_key: str, user_prompt: str, idle_timeout: float, system_prompt: str
+) -> Iterator[str]:
+    # The HTTP read timeout applies per chunk, so a stalled stream fails after
+    # idle_timeout seconds of silence instead of a fixed wall-clock limit.
+    client = _openai_client(api_key)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+    if not _api_state["use_chat"]:
+        started = False
+        try:
+            with span("llm", host=model, model=model, api="responses", stream=True) as sp:
+                stream = client.responses.create(model=model, input=messages, stream=True, timeout=idle_timeout)
+                for event in stream:
+                    event_type = getattr(event, "type", "")
+                    if event_type in ("error", "response.failed"):
+                        raise RuntimeError(f"Streaming response failed: {event_type}")
+                    if event_type == "response.completed":
+                        _record_usage(sp, getattr(event.response, "usage", None))
+                    if event_type == "response.output_text.delta" and event.delta:
+                        started = True
+                        yield event.delta
+            return
+        except Exception as exc:
+            if started or not _responses_unsupported(exc):
+                raise
+            logging.info("Responses API unavailable for %s; using Chat Completions", model)
+            _api_state["use_chat"] = True
+
+    with span("llm", host=model, model=model, api="chat", stream=True) as sp:
+        stream = client.chat.completions.create(
             model=model,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            timeout=timeout,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=idle_timeout,
         )
-        return extract_text_from_response(resp)
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                _record_usage(sp, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
 
 def _read_key_from_file(path: str) -> str:
@@ -126,29 +334,102 @@ def _load_api_key(cfg: Dict[str, Any]) -> str:
     api_key = os.getenv(api_key_env, "")
     if not api_key:
         api_key = _read_key_from_file(cfg.get("summarizer", {}).get("api_key_file", ""))
+    if not api_key and recording_mode() == "replay":
+        return "replay"
     if not api_key:
         raise RuntimeError(f"Missing API key env var or file: {api_key_env}")
     return api_key
 
 
-def summarize_and_classify(item: Dict[str, Any], content: str, cfg: Dict[str, Any]) -> Dict[str, Any]:
+def parse_json_response(text: str) -> Any:
+    text = (text or "").strip()
+    fenced = _CODE_FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise
+        return json.loads(text[start : end + 1])
+
+
+@lru_cache(maxsize=None)
+def _output_validator():
+    from jsonschema.validators import validator_for
+
+    cls = validator_for(OUTPUT_SCHEMA)
+    cls.check_schema(OUTPUT_SCHEMA)
+    return cls(OUTPUT_SCHEMA)
+
+
+def _is_str_list(value: Any, min_items: int, max_items: int) -> bool:
+    return (
+        isinstance(value, list)
+        and min_items <= len(value) <= max_items
+        and all(isinstance(v, str) for v in value)
+    )
+
+
+def _fast_output_check(data: Any) -> bool:
+    # Hand-written check of OUTPUT_SCHEMA. It only ever accepts valid data;
+    # anything it rejects goes through the full validator for the error.
+    if not isinstance(data, dict) or data.keys() != OUTPUT_KEYS:
+        return False
+    confidence = data["confidence"]
+    return (
+        _is_str_list(data["summary_bullets_zh"], 5, 10)
+        and _is_str_list(data["tags"], 3, 8)
+        and isinstance(data["so_what_zh"], str)
+        and isinstance(data["primary_category_id"], str)
+        and isinstance(data["reason"], str)
+        and data["impact"] in ("High", "Medium", "Low")
+        and isinstance(confidence, (int, float))
+        and not isinstance(confidence, bool)
+        and 0 <= confidence <= 1
+    )
+
+
+def validate_output(data: Any) -> None:
+    if _fast_output_check(data):
+        return
+    _output_validator().validate(data)
+
+
+def summarize_and_classify(item: Item, content: str, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    # Records which model produced the enrichment in item.model ("keyword" for
+    # the keyword classifier) so `reprocess --model` can target it later.
     taxonomy = cfg.get("taxonomy", {})
+    item.model = KEYWORD_MODEL
     if cfg.get("classification", {}).get("mode") == "keyword_only":
         return fallback_classify(item, content, taxonomy)
 
     api_key = _load_api_key(cfg)
 
+    route = select_route(item, content, cfg)
+    content = content[: route["max_chars_input"]]
     prompt = build_user_prompt(item, content, taxonomy)
-    text = call_openai(
-        model=cfg["summarizer"]["model"],
-        api_key=api_key,
-        user_prompt=prompt,
-        timeout=cfg["summarizer"].get("timeout_sec", 60),
-    )
+    try:
+        with span("summarize", host=route["name"], model=route["model"], chars=len(content)):
+            text = call_openai(
+                model=route["model"],
+                api_key=api_key,
+                user_prompt=prompt,
+                timeout=route["timeout_sec"],
+                cfg=cfg,
+            )
+    except CircuitOpenError:
+        if cfg.get("classification", {}).get("mode") == "llm_only":
+            raise
+        return fallback_classify(item, content, taxonomy)
+
+    from jsonschema import ValidationError
 
     try:
-        data = json.loads(text)
-        validate(instance=data, schema=OUTPUT_SCHEMA)
+        data = parse_json_response(text)
+        validate_output(data)
+        item.model = route["model"]
         return data
     except (json.JSONDecodeError, ValidationError):
         if cfg.get("classification", {}).get("mode") == "llm_only":
@@ -156,13 +437,8 @@ def summarize_and_classify(item: Dict[str, Any], content: str, cfg: Dict[str, An
         return fallback_classify(item, content, taxonomy)
 
 
-def generate_weekly_blog(week_md: str, cfg: Dict[str, Any]) -> str:
-    api_key = _load_api_key(cfg)
-    model = cfg.get("blog", {}).get("model", cfg["summarizer"]["model"])
-    max_chars = cfg.get("blog", {}).get("max_chars_input", 20000)
-    content = week_md[:max_chars]
-
-    user_prompt = (
+def build_blog_prompt(content: str) -> str:
+    return (
         "请根据以下本周新闻汇总撰写一篇中文博客文章。"
         "输出为 Markdown，包含标题、若干小标题（使用###）、段落、以及一个“趋势展望”小节。"
         "不要复述每条新闻，而是提炼主线并结合多条新闻展开分析。"
@@ -170,10 +446,73 @@ def generate_weekly_blog(week_md: str, cfg: Dict[str, Any]) -> str:
         f"{content}\n"
     )
 
+
+def generate_weekly_blog(
+    week_md: str, cfg: Dict[str, Any], on_chunk: Optional[Callable[[str], None]] = None
+) -> str:
+    api_key = _load_api_key(cfg)
+    model = cfg.get("blog", {}).get("model", cfg["summarizer"]["model"])
+    max_chars = cfg.get("blog", {}).get("max_chars_input", 20000)
+    content = week_md[:max_chars]
+
+    user_prompt = build_blog_prompt(content)
+
+    if on_chunk is not None:
+        started = time.monotonic()
+        first_byte = None
+        parts = []
+        for chunk in stream_openai(
+            model=model,
+            api_key=api_key,
+            user_prompt=user_prompt,
+            idle_timeout=cfg["blog"].get("stream_idle_timeout_sec", 30),
+            system_prompt=BLOG_SYSTEM_PROMPT,
+            cfg=cfg,
+        ):
+            if first_byte is None:
+                first_byte = time.monotonic() - started
+            parts.append(chunk)
+            on_chunk(chunk)
+        total = time.monotonic() - started
+        text = "".join(parts)
+        logging.info(
+            "Blog streamed: first byte %.2fs, total %.2fs, %s chars",
+            first_byte if first_byte is not None else total,
+            total,
+            len(text),
+        )
+        return text
+
     return call_openai(
         model=model,
         api_key=api_key,
         user_prompt=user_prompt,
         timeout=cfg["summarizer"].get("timeout_sec", 60),
         system_prompt=BLOG_SYSTEM_PROMPT,
+        cfg=cfg,
+    )
+
+
+def build_section_prompt(title: str, content: str, max_chars_output: int) -> str:
+    return (
+        f"请将以下“{title}”类目下的本周新闻压缩为不超过{max_chars_output}字的中文要点摘要。"
+        "输出为 Markdown 列表，突出最重要的进展、相互关联与趋势信号，不要输出标题。"
+        "\n\n【类目新闻】\n"
+        f"{content}\n"
+    )
+
+
+def summarize_week_section(title: str, content: str, cfg: Dict[str, Any]) -> str:
+    api_key = _load_api_key(cfg)
+    blog_cfg = cfg.get("blog", {})
+    model = blog_cfg.get("section_model", blog_cfg.get("model", cfg["summarizer"]["model"]))
+    max_chars_output = blog_cfg.get("section_summary_max_chars", 800)
+
+    return call_openai(
+        model=model,
+        api_key=api_key,
+        user_prompt=build_section_prompt(title, content, max_chars_output),
+        timeout=cfg["summarizer"].get("timeout_sec", 60),
+        system_prompt=SECTION_SYSTEM_PROMPT,
+        cfg=cfg,
     )
@@ -1,8 +1,12 @@
-﻿import json
+﻿import re
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
-from .utils import now_local, to_local
+from .db import split_list
+from .models import Item
+from .utils import LOCAL_TZ, now_local, to_local
+
+_WEEK_RE = re.compile(r"^(\d{4})-?W(\d{1,2})$", re.IGNORECASE)
 
 
 def _frontmatter(title: str, date_str: str) -> str:
@@ -41,13 +45,13 @@ def _parse_dt(value: str) -> float:
         return 0.0
 
 
-def sort_items(items: List[Dict[str, Any]], append_order: str) -> List[Dict[str, Any]]:
+def sort_items(items: List[Item], append_order: str) -> List[Item]:
     impact_rank = {"High": 0, "Medium": 1, "Low": 2}
     reverse_time = append_order == "newest_first"
 
     def key(item):
-        impact = impact_rank.get(item.get("impact"), 3)
-        dt = item.get("published_at") or item.get("collected_at") or ""
+        impact = impact_rank.get(item.impact, 3)
+        dt = item.published_at or item.collected_at or ""
         ts = _parse_dt(dt)
         if reverse_time:
             ts = -ts
@@ -56,35 +60,96 @@ def sort_items(items: List[Dict[str, Any]], append_order: str) -> List[Dict[str,
     return sorted(items, key=key)
 
 
-def _render_item(lines: List[str], item: Dict[str, Any]) -> None:
-    title = item.get("title") or "(Untitled)"
+def _render_item(lines: List[str], item: Item) -> None:
+    title = item.title or "(Untitled)"
     lines.append(f"### {title}")
-    lines.append(f"- 来源：{item.get('source')}")
-    published_or_collected = item.get("published_at") or item.get("collected_at")
+    lines.append(f"- 来源：{item.source}")
+    published_or_collected = item.published_at or item.collected_at
     lines.append(f"- 发布：{_format_datetime(published_or_collected)}")
-    lines.append(f"- 收录：{_format_datetime(item.get('collected_at'))}")
-    lines.append(f"- 链接：{item.get('url')}")
+    lines.append(f"- 收录：{_format_datetime(item.collected_at)}")
+    lines.append(f"- 链接：{item.url}")
+    if item.also_reported:
+        lines.append("- 其他报道：")
+        for other in item.also_reported:
+            lines.append(f"  - {other.get('source')}：{other.get('url')}")
+    if item.related:
+        lines.append("- 相关报道：")
+        for past in item.related:
+            lines.append(f"  - {past.get('date')} {past.get('title')}（{past.get('source')}）：{past.get('url')}")
     lines.append("")
     lines.append("**摘要**")
-    bullets = item.get("summary_bullets", [])
-    for bullet in bullets:
+    for bullet in item.summary_bullets:
         lines.append(f"- {bullet}")
     lines.append("")
     lines.append("**意义**")
-    lines.append(item.get("so_what", ""))
+    lines.append(item.so_what or "")
     lines.append("")
-    tags = item.get("tags", [])
-    tag_str = " / ".join(tags)
+    tag_str = " / ".join(item.tags)
     lines.append(f"**标签**：{tag_str}")
     lines.append("")
     lines.append("---")
     lines.append("")
 
 
-def render_weekly(items: List[Dict[str, Any]], cfg: Dict[str, Any]) -> str:
+def parse_week(value: str) -> Tuple[int, int]:
+    match = _WEEK_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid ISO week {value!r}; expected YYYY-Www")
+    year, week = int(match.group(1)), int(match.group(2))
+    week_start(year, week)
+    return year, week
+
+
+def week_label(year: int, week: int) -> str:
+    return f"{year}-W{week:02d}"
+
+
+def week_start(year: int, week: int) -> datetime:
+    # Raises ValueError for weeks the ISO year does not have (e.g. W53).
+    return datetime.fromisocalendar(year, week, 1).replace(tzinfo=LOCAL_TZ)
+
+
+def digest_item(row: Any) -> Item:
+    return Item(
+        item_id=row["id"],
+        title=row["title"],
+        url=row["url"],
+        source=row["source"],
+        published_at=row["published_at"],
+        collected_at=row["collected_at"],
+        primary_category=row["primary_category"],
+        impact=row["impact"],
+        summary_bullets=split_list(row["bullets"]),
+        so_what=row["so_what"] or "",
+        tags=split_list(row["tags"]),
+    )
+
+
+def strip_volatile_lines(week_md: str) -> str:
+    body = week_md
+    if body.lstrip().startswith("---\n"):
+        parts = body.lstrip().split("---\n", 2)
+        if len(parts) == 3:
+            body = parts[2]
+    lines = [line for line in body.splitlines() if not line.startswith("生成时间：")]
+    return "\n".join(lines).strip()
+
+
+def render_weekly(
+    items: List[Item], cfg: Dict[str, Any], week: Optional[Tuple[int, int]] = None, conn: Any = None
+) -> str:
+    if cfg["clustering"].get("enabled", True):
+        from .cluster import cluster_stories
+
+        items = cluster_stories(items, cfg)
+    # Related past coverage needs the database for titles and links.
+    if conn is not None and cfg["related"].get("enabled", True):
+        from .vectors import attach_related
+
+        attach_related(items, cfg, conn)
     now = now_local()
-    year, week, _ = now.isocalendar()
-    title = f"AI Weekly Digest — {year}-W{week:02d}"
+    year, week_num = week or now.isocalendar()[:2]
+    title = f"AI Weekly Digest — {week_label(year, week_num)}"
     lines = [f"# {title}", f"生成时间：{now.strftime('%Y-%m-%d %H:%M')} (Australia/Melbourne)", ""]
 
     taxonomy = cfg.get("taxonomy", {})
@@ -100,9 +165,9 @@ def render_weekly(items: List[Dict[str, Any]], cfg: Dict[str, Any]) -> str:
             return _frontmatter(title, now.strftime("%Y-%m-%d")) + body
         return body
 
-    grouped: Dict[str, List[Dict[str, Any]]] = {c["id"]: [] for c in categories}
+    grouped: Dict[str, List[Item]] = {c["id"]: [] for c in categories}
     for item in items:
-        grouped.setdefault(item.get("primary_category"), []).append(item)
+        grouped.setdefault(item.primary_category, []).append(item)
 
     for cat in categories:
         cat_id = cat["id"]
@@ -119,11 +184,10 @@ def render_weekly(items: List[Dict[str, Any]], cfg: Dict[str, Any]) -> str:
     return body
 
 
-def output_filename(cfg: Dict[str, Any]) -> str:
+def output_filename(cfg: Dict[str, Any], week: Optional[Tuple[int, int]] = None) -> str:
     mode = cfg["output"].get("mode", "weekly_file")
     if mode == "single_file":
         return "ai_news.md"
-    now = now_local()
-    year, week, _ = now.isocalendar()
+    year, week_num = week or now_local().isocalendar()[:2]
     template = cfg["output"]["filename_template"]
-    return template.format(year=year, week=f"{week:02d}")
+    return template.format(year=year, week=f"{week_num:02d}")
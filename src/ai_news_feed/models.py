@@ -0,0 +1,47 @@
+﻿from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass(slots=True)
+class Item:
+    # One article from fetch to digest. Feed entries fill the first block, the
+    # pipeline adds collection fields and the enrichment, and digest rows only
+    # carry what the weekly file renders.
+    url: Optional[str] = None
+    title: Optional[str] = None
+    guid: Optional[str] = None
+    author: Optional[str] = None
+    published_at: Optional[str] = None
+    rss_summary: Optional[str] = None
+
+    item_id: Optional[int] = None
+    feed_id: Optional[int] = None
+    dedup_key: Optional[str] = None
+    collected_at: Optional[str] = None
+    source: Optional[str] = None
+    source_tier: Optional[str] = None
+    # Prefilter keyword score, kept to order the pending backlog.
+    relevance: Optional[int] = None
+    content_status: Optional[str] = None
+    # Extracted article text; only held between fetching and summarizing.
+    content: Optional[str] = None
+
+    summary_zh: Optional[str] = None
+    summary_bullets: List[str] = field(default_factory=list)
+    so_what: Optional[str] = None
+    primary_category: Optional[str] = None
+    tags: List[str] = field(default_factory=list)
+    tags_json: Optional[str] = None
+    impact: Optional[str] = None
+    category_confidence: Optional[float] = None
+    category_reason: Optional[str] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+    model: Optional[str] = None
+
+    also_reported: List[Dict[str, Optional[str]]] = field(default_factory=list)
+    related: List[Dict[str, Optional[str]]] = field(default_factory=list)
+
+    def update(self, fields: Dict[str, object]) -> None:
+        for name, value in fields.items():
+            setattr(self, name, value)
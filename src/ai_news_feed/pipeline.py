@@ -1,53 +1,99 @@
 ﻿import json
 import logging
+import math
 import os
+import sqlite3
+import threading
+from contextlib import ExitStack
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
+from .archive import attach_archives
+from .budget import age_hours, budget_exhausted, budget_spent, finish_budget, item_priority, start_budget
+from .classify import passes_prefilter
+from .config import ConfigError
 from .content import fetch_and_extract
 from .db import (
+    complete_pending_item,
     get_connection,
+    get_feed,
+    get_item,
     init_db,
     insert_item,
     item_exists,
-    list_items_between,
+    iter_items_between,
+    list_pending_items,
+    mark_feed_due,
     mark_feed_failure,
     mark_feed_success,
+    read_only_connection,
     upsert_feed,
 )
+from .latency import finish_latency, start_latency
 from .llm import summarize_and_classify
 from .blog import (
     append_reference_section,
+    blog_mode,
+    blog_needs_refresh,
     blog_output_filename,
+    blog_stream,
     ensure_frontmatter,
     extract_title,
     normalize_author,
+    record_blog_generation,
     render_blog_from_week_md,
     write_blog,
 )
-from .markdown import output_filename, render_weekly
+from .markdown import digest_item, output_filename, render_weekly
+from .models import Item
+from .polling import failure_backoff_sec, feed_is_due, next_fetch_at, poll_interval_sec
+from .profiling import checkpoint
+from .routing import max_fetch_chars
 from .rss import fetch_feed_entries
+from .tracing import finish_run, span, start_run
 from .utils import now_local
-from .web_sources import fetch_web_list_entries
+from .web_sources import fetch_web_list_entries, list_fetch_key
+
+
+_log_file: Dict[str, Any] = {"path": None, "handler": None}
 
 
 def setup_logging() -> None:
+    # Called at the start of every run, so a long-lived `serve` moves on to
+    # the new day's file instead of writing to the first one forever.
     os.makedirs("logs", exist_ok=True)
     date_str = now_local().strftime("%Y-%m-%d")
     log_path = os.path.join("logs", f"app-{date_str}.log")
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s %(levelname)s %(message)s",
-        handlers=[logging.FileHandler(log_path, encoding="utf-8"), logging.StreamHandler()],
-    )
+    if _log_file["path"] == log_path:
+        return
+    root = logging.getLogger()
+    handler = logging.FileHandler(log_path, encoding="utf-8")
+    previous = _log_file["handler"]
+    if previous is None:
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s %(levelname)s %(message)s",
+            handlers=[handler, logging.StreamHandler()],
+        )
+        if handler not in root.handlers:
+            # Logging was configured elsewhere; leave it alone.
+            handler.close()
+            return
+    else:
+        handler.setFormatter(previous.formatter)
+        root.removeHandler(previous)
+        previous.close()
+        root.addHandler(handler)
+    _log_file.update(path=log_path, handler=handler)
 
 
-def dedup_key(entry: Dict[str, Any], mode: str) -> str:
+def dedup_key(entry: Item, mode: str) -> str:
     if mode == "url":
-        return entry.get("url") or ""
+        return entry.url or ""
     if mode == "guid":
-        return entry.get("guid") or entry.get("url") or ""
-    return entry.get("guid") or entry.get("url") or ""
+        return entry.guid or entry.url or ""
+    return entry.guid or entry.url or ""
 
 
 def week_bounds(dt: datetime) -> Tuple[datetime, datetime]:
@@ -58,246 +104,404 @@ def week_bounds(dt: datetime) -> Tuple[datetime, datetime]:
     return start, end
 
 
-def run_pipeline(cfg: Dict[str, Any]) -> None:
+@dataclass
+class Profile:
+    # One config of a run: its own database, taxonomy, summarizer and outputs.
+    cfg: Dict[str, Any]
+    conn: sqlite3.Connection
+    queued: int = 0
+    processed: int = 0
+    # VectorStore for related-coverage links, when they are enabled.
+    vectors: Any = None
+
+
+@dataclass
+class Subscription:
+    profile: Profile
+    source: Dict[str, Any]
+    # feeds row that holds the poll schedule; items.feed_id stays empty for web sources.
+    source_id: int
+    feed_id: Optional[int]
+
+
+def fetch_timeout(subs: List[Subscription]) -> float:
+    # One download serves every subscribed profile, so it gets the most patient one's timeout.
+    return max(float(sub.profile.cfg["polling"]["fetch_timeout_sec"]) for sub in subs)
+
+
+def fetch_if_due(
+    subs: List[Subscription], url: str, fetch: Callable[[str], List[Item]]
+) -> Tuple[List[Subscription], List[Item]]:
+    # Fetches once for every profile whose schedule says the source is due.
+    now = now_local()
+    due = []
+    for sub in subs:
+        row = get_feed(sub.profile.conn, sub.source_id)
+        if feed_is_due(row, now, sub.profile.cfg["polling"]):
+            due.append((sub, row))
+        else:
+            logging.info("Skipping %s: next fetch due at %s", url, row["next_fetch_at"])
+    if not due:
+        return [], []
+    try:
+        entries = fetch(url)
+    except Exception as exc:
+        logging.exception("Fetch failed: %s", url)
+        for sub, row in due:
+            backoff = failure_backoff_sec((row["fail_count"] or 0) + 1, sub.profile.cfg["polling"])
+            mark_feed_failure(sub.profile.conn, sub.source_id, str(exc), next_fetch_at(now, backoff))
+        return [], []
+    intervals = []
+    for sub, _ in due:
+        interval = poll_interval_sec(entries, sub.profile.cfg["polling"])
+        mark_feed_success(sub.profile.conn, sub.source_id, now.isoformat(), next_fetch_at(now, interval), interval)
+        intervals.append(f"{interval / 3600:.1f}h")
+    logging.info("Fetched %s entries from %s (next poll in %s)", len(entries), url, ", ".join(intervals))
+    return [sub for sub, _ in due], entries
+
+
+def enrichment_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+    # summary_zh/tags_json are unread here but still written so a database can
+    # be opened by a version from before item_bullets/item_tags.
+    return {
+        "summary_zh": json.dumps(
+            {
+                "bullets": result["summary_bullets_zh"],
+                "so_what": result["so_what_zh"],
+            },
+            ensure_ascii=False,
+        ),
+        "summary_bullets": result["summary_bullets_zh"],
+        "so_what": result["so_what_zh"],
+        "primary_category": result["primary_category_id"],
+        "tags": result["tags"],
+        "tags_json": json.dumps(result["tags"], ensure_ascii=False),
+        "impact": result.get("impact"),
+        "category_confidence": result.get("confidence"),
+        "category_reason": result.get("reason"),
+        "status": "processed",
+        "error": None,
+    }
+
+
+def failure_fields(exc: Exception) -> Dict[str, Any]:
+    return {
+        "status": "failed",
+        "error": str(exc),
+        "summary_zh": None,
+        "summary_bullets": [],
+        "so_what": None,
+        "primary_category": None,
+        "tags": [],
+        "tags_json": None,
+        "model": None,
+    }
+
+
+def record_filtered(conn, item: Item, reason: str) -> None:
+    item.collected_at = now_local().isoformat()
+    item.content_status = "skipped"
+    item.category_reason = reason
+    item.status = "filtered"
+    with span("db_write"):
+        insert_item(conn, item)
+    logging.info("Filtered %s: %s", item.url, reason)
+
+
+def run_pipeline(cfg: Dict[str, Any], stop_event: Optional[threading.Event] = None) -> None:
+    run_profiles([cfg], stop_event)
+
+
+def run_profiles(cfgs: List[Dict[str, Any]], stop_event: Optional[threading.Event] = None) -> None:
+    # Each config keeps its own database and outputs; the first one also
+    # records the run's trace stats and latency history and sets its budget.
+    for label, paths in (
+        ("storage.db_path", [cfg["storage"]["db_path"] for cfg in cfgs]),
+        ("storage.vector_path", [cfg["storage"]["vector_path"] for cfg in cfgs]),
+        ("weekly output", [os.path.join(cfg["output"]["path"], output_filename(cfg)) for cfg in cfgs]),
+    ):
+        paths = [os.path.abspath(path) for path in paths]
+        if len(set(paths)) != len(paths):
+            raise ConfigError(f"Configs run together need distinct {label} paths")
+
     setup_logging()
-    db_path = cfg["storage"]["db_path"]
-    init_db(db_path)
-    os.makedirs(cfg["output"]["path"], exist_ok=True)
+    for cfg in cfgs:
+        init_db(cfg["storage"]["db_path"])
+    start_run(cfgs[0], "run")
+    start_latency(cfgs[0])
+    start_budget(cfgs[0])
+    try:
+        _run_profiles(cfgs, stop_event or threading.Event())
+    finally:
+        tokens, cost = finish_budget()
+        logging.info("LLM usage this run: %s tokens, $%.4f", tokens, cost)
+        finish_latency(cfgs[0]["storage"]["db_path"])
+        finish_run(cfgs[0]["storage"]["db_path"])
 
-    new_items: List[Dict[str, Any]] = []
 
-    with get_connection(db_path) as conn:
-        for feed in cfg["feeds"]:
+def _subscriptions(profiles: List[Profile]) -> Tuple[Dict[str, List[Subscription]], Dict[str, List[Subscription]]]:
+    # Sources are keyed by what decides their entries, so profiles listing the
+    # same feed (under any name) share one download.
+    feeds: Dict[str, List[Subscription]] = {}
+    lists: Dict[str, List[Subscription]] = {}
+    for profile in profiles:
+        for feed in profile.cfg["feeds"]:
             if not feed.get("enabled", True):
                 continue
-
-            feed_id = upsert_feed(conn, feed)
-            try:
-                entries = fetch_feed_entries(feed["url"])
-                mark_feed_success(conn, feed_id, now_local().isoformat())
-                logging.info("Fetched %s entries from %s", len(entries), feed["url"])
-            except Exception as exc:
-                logging.exception("Feed fetch failed: %s", feed["url"])
-                mark_feed_failure(conn, feed_id, str(exc))
+            subs = feeds.setdefault(feed["url"], [])
+            if all(sub.profile is not profile for sub in subs):
+                feed_id = upsert_feed(profile.conn, feed)
+                subs.append(Subscription(profile, feed, feed_id, feed_id))
+        for src in profile.cfg.get("web_sources", []):
+            if not src.get("enabled", True):
                 continue
+            subs = lists.setdefault(list_fetch_key(src), [])
+            if all(sub.profile is not profile for sub in subs):
+                source_id = upsert_feed(profile.conn, {"name": src["name"], "url": src["list_url"], "enabled": True})
+                subs.append(Subscription(profile, src, source_id, None))
+    return feeds, lists
 
-            for entry in entries:
-                key = dedup_key(entry, cfg["dedup"]["key"])
-                if not key:
-                    continue
-                if item_exists(conn, key):
-                    continue
-
-                collected_at = now_local().isoformat()
-                content, content_status = fetch_and_extract(
-                    entry.get("url"),
-                    entry.get("rss_summary"),
-                    timeout=cfg["summarizer"].get("timeout_sec", 60),
-                    max_chars=cfg["summarizer"].get("max_chars_input", 12000),
-                )
-
-                item = {
-                    "feed_id": feed_id,
-                    "guid": entry.get("guid"),
-                    "url": entry.get("url"),
-                    "dedup_key": key,
-                    "title": entry.get("title"),
-                    "author": entry.get("author"),
-                    "published_at": entry.get("published_at"),
-                    "collected_at": collected_at,
-                    "source": feed.get("name"),
-                    "content_status": content_status,
-                    "rss_summary": entry.get("rss_summary"),
-                }
-
-                try:
-                    result = summarize_and_classify(item, content, cfg)
-                    item.update(
-                        {
-                            "summary_zh": json.dumps(
-                                {
-                                    "bullets": result["summary_bullets_zh"],
-                                    "so_what": result["so_what_zh"],
-                                },
-                                ensure_ascii=False,
-                            ),
-                            "primary_category": result["primary_category_id"],
-                            "tags_json": json.dumps(result["tags"], ensure_ascii=False),
-                            "impact": result.get("impact"),
-                            "category_confidence": result.get("confidence"),
-                            "category_reason": result.get("reason"),
-                            "status": "processed",
-                            "error": None,
-                        }
-                    )
-                    item["summary_bullets"] = result["summary_bullets_zh"]
-                    item["so_what"] = result["so_what_zh"]
-                    item["tags"] = result["tags"]
-                    new_items.append(item)
-                except Exception as exc:
-                    item.update(
-                        {
-                            "status": "failed",
-                            "error": str(exc),
-                            "summary_zh": None,
-                            "primary_category": None,
-                            "tags_json": None,
-                        }
-                    )
-                    insert_item(conn, item)
-                    logging.exception("Item processing failed: %s", entry.get("url"))
-
-        for src in cfg.get("web_sources", []):
-            if not src.get("enabled", True):
+
+def _claims(
+    entries: List[Item], subs: List[Subscription], stop_event: threading.Event
+) -> Iterator[List[Tuple[Profile, Item]]]:
+    for entry in entries:
+        if stop_event.is_set():
+            # Unprocessed entries are picked up by the next run.
+            for sub in subs:
+                mark_feed_due(sub.profile.conn, sub.source_id)
+            return
+        claims = []
+        for sub in subs:
+            cfg = sub.profile.cfg
+            key = dedup_key(entry, cfg["dedup"]["key"])
+            if not key:
                 continue
+            if item_exists(sub.profile.conn, key):
+                continue
+            item = replace(entry, feed_id=sub.feed_id, dedup_key=key, source=sub.source.get("name"))
+            passed, relevance, reason = passes_prefilter(item, sub.source, cfg)
+            if not passed:
+                record_filtered(sub.profile.conn, item, reason)
+                continue
+            item.relevance = relevance
+            claims.append((sub.profile, item))
+        if claims:
+            yield claims
+
+
+def new_items(profiles: List[Profile], stop_event: threading.Event) -> Iterator[List[Tuple[Profile, Item]]]:
+    # Yields each new article once, with one item per profile that wants it.
+    feeds, lists = _subscriptions(profiles)
+    for url, subs in feeds.items():
+        if stop_event.is_set():
+            break
+        timeout = fetch_timeout(subs)
+        due, entries = fetch_if_due(subs, url, lambda u: fetch_feed_entries(u, timeout))
+        yield from _claims(entries, due, stop_event)
+    checkpoint("ingest_feeds")
+
+    for subs in lists.values():
+        if stop_event.is_set():
+            break
+        src = subs[0].source
+        timeout = fetch_timeout(subs)
+        due, entries = fetch_if_due(subs, src["list_url"], lambda _: fetch_web_list_entries(src, timeout))
+        yield from _claims(entries, due, stop_event)
+    checkpoint("ingest_web_sources")
+
+
+def queue_items(profiles: List[Profile], stop_event: threading.Event) -> None:
+    # New articles are stored as pending before anything is summarized, so the
+    # backlog is taken in priority order and whatever a run does not reach
+    # (budget, shutdown, crash) is picked up by the next one.
+    for claims in new_items(profiles, stop_event):
+        collected_at = now_local().isoformat()
+        for profile, item in claims:
+            item.collected_at = collected_at
+            item.status = "pending"
+            with span("db_write"):
+                insert_item(profile.conn, item)
+            profile.queued += 1
+    for profile in profiles:
+        profile.conn.commit()
+        logging.info("Queued %s new items in %s", profile.queued, profile.cfg["storage"]["db_path"])
+
+
+def _sources_by_name(cfg: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {src["name"]: src for src in cfg["feeds"] + cfg.get("web_sources", [])}
+
+
+def _pending_item(row: Any, source: Dict[str, Any]) -> Item:
+    return Item(
+        url=row["url"],
+        title=row["title"],
+        guid=row["guid"],
+        author=row["author"],
+        published_at=row["published_at"],
+        rss_summary=row["rss_summary"],
+        item_id=row["id"],
+        feed_id=row["feed_id"],
+        dedup_key=row["dedup_key"],
+        collected_at=row["collected_at"],
+        source=row["source"],
+        source_tier=source.get("tier"),
+        relevance=row["relevance"],
+    )
+
+
+def pending_items(profiles: List[Profile], stop_event: threading.Event) -> Iterator[List[Tuple[Profile, Item]]]:
+    # Highest priority first: source weight, prefilter relevance and age (from
+    # publication, or collection when the feed has no date). Profiles pending
+    # the same article share one download at the best of their priorities.
+    # Only ids are held here; each row is loaded when its turn comes.
+    now = now_local()
+    queue: Dict[str, List[Any]] = {}
+    for profile in profiles:
+        sources = _sources_by_name(profile.cfg)
+        half_life = profile.cfg["budget"]["recency_half_life_hours"]
+        for row in list_pending_items(profile.conn):
+            age = age_hours(row["published_at"], now)
+            if age is None:
+                age = age_hours(row["collected_at"], now) or 0.0
+            weight = sources.get(row["source"], {}).get("priority", 1.0)
+            priority = item_priority(weight, row["relevance"], age, half_life)
+            entry = queue.setdefault(row["url"] or row["dedup_key"], [-math.inf, []])
+            entry[0] = max(entry[0], priority)
+            entry[1].append((profile, sources, row["id"]))
+    ordered = sorted(queue.values(), key=lambda entry: entry[0], reverse=True)
+    queue.clear()
 
+    for index, (_, members) in enumerate(ordered):
+        if stop_event.is_set() or budget_exhausted():
+            left = sum(len(rest) for _, rest in ordered[index:])
+            if stop_event.is_set():
+                logging.info("Shutdown requested; leaving %s items pending", left)
+            else:
+                tokens, cost = budget_spent()
+                logging.info("Run budget spent (%s tokens, $%.4f); leaving %s items pending", tokens, cost, left)
+            return
+        claims = []
+        for profile, sources, item_id in members:
+            row = get_item(profile.conn, item_id)
+            claims.append((profile, _pending_item(row, sources.get(row["source"], {}))))
+        yield claims
+
+
+def fetch_contents(articles: Iterable[List[Tuple[Profile, Item]]]) -> Iterator[List[Tuple[Profile, Item]]]:
+    for claims in articles:
+        # Downloaded and extracted once, within the largest budget any profile asks for.
+        cfgs = [profile.cfg for profile, _ in claims]
+        entry = claims[0][1]
+        content, content_status = fetch_and_extract(
+            entry.url,
+            entry.rss_summary,
+            timeout=max(cfg["summarizer"].get("timeout_sec", 60) for cfg in cfgs),
+            max_chars=max(max_fetch_chars(cfg) for cfg in cfgs),
+        )
+        collected_at = now_local().isoformat()
+        for _, item in claims:
+            item.collected_at = collected_at
+            item.content = content
+            item.content_status = content_status
+        yield claims
+
+
+def summarize_items(articles: Iterable[List[Tuple[Profile, Item]]]) -> Iterator[Tuple[Profile, Item]]:
+    for claims in articles:
+        for profile, item in claims:
             try:
-                entries = fetch_web_list_entries(src)
-                logging.info("Fetched %s entries from %s", len(entries), src["list_url"])
+                item.update(enrichment_fields(summarize_and_classify(item, item.content, profile.cfg)))
             except Exception as exc:
-                logging.exception("Web source fetch failed: %s", src.get("list_url"))
-                continue
+                item.update(failure_fields(exc))
+                logging.exception("Item processing failed: %s", item.url)
+            # Profiles share the article text; each drops its reference once summarized.
+            item.content = None
+            yield profile, item
+
+
+def _run_profiles(cfgs: List[Dict[str, Any]], stop_event: threading.Event) -> None:
+    with ExitStack() as stack:
+        profiles = [Profile(cfg, stack.enter_context(get_connection(cfg["storage"]["db_path"]))) for cfg in cfgs]
+        for profile in profiles:
+            if profile.cfg["related"].get("enabled", True):
+                from .vectors import open_vector_store
 
-            for entry in entries:
-                entry = {
-                    "guid": entry.get("url"),
-                    "url": entry.get("url"),
-                    "title": entry.get("title"),
-                    "author": None,
-                    "published_at": entry.get("published_at"),
-                    "rss_summary": entry.get("rss_summary"),
-                }
-
-                key = dedup_key(entry, cfg["dedup"]["key"])
-                if not key:
-                    continue
-                if item_exists(conn, key):
-                    continue
-
-                collected_at = now_local().isoformat()
-                content, content_status = fetch_and_extract(
-                    entry.get("url"),
-                    entry.get("rss_summary"),
-                    timeout=cfg["summarizer"].get("timeout_sec", 60),
-                    max_chars=cfg["summarizer"].get("max_chars_input", 12000),
-                )
-
-                item = {
-                    "feed_id": None,
-                    "guid": entry.get("guid"),
-                    "url": entry.get("url"),
-                    "dedup_key": key,
-                    "title": entry.get("title"),
-                    "author": None,
-                    "published_at": entry.get("published_at"),
-                    "collected_at": collected_at,
-                    "source": src.get("name"),
-                    "content_status": content_status,
-                    "rss_summary": entry.get("rss_summary"),
-                }
-
-                try:
-                    result = summarize_and_classify(item, content, cfg)
-                    item.update(
-                        {
-                            "summary_zh": json.dumps(
-                                {
-                                    "bullets": result["summary_bullets_zh"],
-                                    "so_what": result["so_what_zh"],
-                                },
-                                ensure_ascii=False,
-                            ),
-                            "primary_category": result["primary_category_id"],
-                            "tags_json": json.dumps(result["tags"], ensure_ascii=False),
-                            "impact": result.get("impact"),
-                            "category_confidence": result.get("confidence"),
-                            "category_reason": result.get("reason"),
-                            "status": "processed",
-                            "error": None,
-                        }
-                    )
-                    item["summary_bullets"] = result["summary_bullets_zh"]
-                    item["so_what"] = result["so_what_zh"]
-                    item["tags"] = result["tags"]
-                    new_items.append(item)
-                except Exception as exc:
-                    item.update(
-                        {
-                            "status": "failed",
-                            "error": str(exc),
-                            "summary_zh": None,
-                            "primary_category": None,
-                            "tags_json": None,
-                        }
-                    )
-                    insert_item(conn, item)
-                    logging.exception("Item processing failed: %s", entry.get("url"))
+                profile.vectors = open_vector_store(profile.cfg)
+        queue_items(profiles, stop_event)
+        # Items are written as soon as they are summarized and the digest is
+        # rendered from the database, so memory does not grow with the backlog.
+        for profile, item in summarize_items(fetch_contents(pending_items(profiles, stop_event))):
+            with span("db_write"):
+                complete_pending_item(profile.conn, item.item_id, item)
+                if profile.vectors is not None and item.status == "processed":
+                    profile.vectors.add_items([item])
+            profile.processed += 1
 
+        for profile in profiles:
+            logging.info("Summarized %s items in %s", profile.processed, profile.cfg["storage"]["db_path"])
+            # Vectors are committed after the rows they point at; after a crash
+            # the uncommitted tail is dropped and row ids can be reused safely.
+            profile.conn.commit()
+            if profile.vectors is not None:
+                profile.vectors.close()
+            write_outputs(profile.cfg, profile.conn, stop_event)
+
+
+def write_outputs(cfg: Dict[str, Any], conn: sqlite3.Connection, stop_event: threading.Event) -> None:
+    os.makedirs(cfg["output"]["path"], exist_ok=True)
+    now = now_local()
+    start, end = week_bounds(now)
+    all_items = [digest_item(row) for row in iter_items_between(conn, start.isoformat(), end.isoformat())]
+
+    with span("render_weekly", items=len(all_items)):
+        # Archived items can be linked as related coverage. Partitions are only
+        # attached to a separate read-only connection, never to the one the run
+        # writes through.
+        with read_only_connection(cfg["storage"]["db_path"]) as links_conn:
+            attach_archives(links_conn, cfg)
+            content_md = render_weekly(all_items, cfg, conn=links_conn)
+    filename = output_filename(cfg)
+    out_path = os.path.join(cfg["output"]["path"], filename)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content_md)
+    os.replace(tmp_path, out_path)
+    checkpoint("render_weekly")
+
+    blog_name = blog_output_filename(cfg)
+    blog_dir = cfg["output"].get("blog_path", cfg["output"]["path"])
+    blog_path = os.path.join(blog_dir, blog_name)
+    refresh_blog = False
+    if stop_event.is_set():
+        logging.info("Shutdown requested; leaving the blog for the next run")
+    elif cfg["output"].get("include_weekly_blog", True):
+        refresh_blog, reason = blog_needs_refresh(conn, blog_path, content_md, cfg)
+        if not refresh_blog:
+            logging.info("Skipping blog generation for %s: %s", blog_path, reason)
+
+    if refresh_blog:
+        os.makedirs(blog_dir, exist_ok=True)
+        with span("render_blog", mode=blog_mode(content_md, cfg)):
+            if cfg["blog"].get("stream", False):
+                with blog_stream(blog_path, cfg["blog"].get("stream_echo", True)) as on_chunk:
+                    blog_md = render_blog_from_week_md(content_md, cfg, conn, on_chunk)
+            else:
+                blog_md = render_blog_from_week_md(content_md, cfg, conn)
+        blog_dir_abs = os.path.abspath(blog_dir)
+        weekly_path_abs = os.path.abspath(out_path)
+        rel_link = os.path.relpath(weekly_path_abs, start=blog_dir_abs).replace(os.sep, "/")
+        if rel_link.endswith(".md"):
+            rel_link = rel_link[:-3]
+        if not rel_link.startswith("../"):
+            rel_link = f"../{rel_link.lstrip('./')}"
         now = now_local()
-        start, end = week_bounds(now)
-        existing_rows = list_items_between(conn, start.isoformat(), end.isoformat())
-        existing_items = []
-        for row in existing_rows:
-            existing_items.append(
-                {
-                    "title": row["title"],
-                    "url": row["url"],
-                    "source": row["source"],
-                    "published_at": row["published_at"],
-                    "collected_at": row["collected_at"],
-                    "primary_category": row["primary_category"],
-                    "impact": row["impact"],
-                    "summary_bullets": json.loads(row["summary_zh"]).get("bullets", []) if row["summary_zh"] else [],
-                    "so_what": json.loads(row["summary_zh"]).get("so_what", "") if row["summary_zh"] else "",
-                    "tags": json.loads(row["tags_json"]) if row["tags_json"] else [],
-                }
-            )
-
-        all_items = existing_items + [
-            {
-                "title": i["title"],
-                "url": i["url"],
-                "source": i["source"],
-                "published_at": i["published_at"],
-                "collected_at": i["collected_at"],
-                "primary_category": i["primary_category"],
-                "impact": i.get("impact"),
-                "summary_bullets": i.get("summary_bullets", []),
-                "so_what": i.get("so_what", ""),
-                "tags": i.get("tags", []),
-            }
-            for i in new_items
-        ]
-
-        content_md = render_weekly(all_items, cfg)
-        filename = output_filename(cfg)
-        out_path = os.path.join(cfg["output"]["path"], filename)
-        tmp_path = out_path + ".tmp"
-        with open(tmp_path, "w", encoding="utf-8") as f:
-            f.write(content_md)
-        os.replace(tmp_path, out_path)
-
-        if cfg["output"].get("include_weekly_blog", True):
-            blog_md = render_blog_from_week_md(content_md, cfg)
-            blog_name = blog_output_filename(cfg)
-            blog_dir = cfg["output"].get("blog_path", cfg["output"]["path"])
-            blog_path = os.path.join(blog_dir, blog_name)
-            os.makedirs(blog_dir, exist_ok=True)
-            blog_dir_abs = os.path.abspath(blog_dir)
-            weekly_path_abs = os.path.abspath(out_path)
-            rel_link = os.path.relpath(weekly_path_abs, start=blog_dir_abs).replace(os.sep, "/")
-            if rel_link.endswith(".md"):
-                rel_link = rel_link[:-3]
-            if not rel_link.startswith("../"):
-                rel_link = f"../{rel_link.lstrip('./')}"
-            now = now_local()
-            year, week, _ = now.isocalendar()
-            weekly_title = f"AI Weekly Digest — {year}-W{week:02d}"
-            blog_md = normalize_author(blog_md)
-            blog_title = extract_title(blog_md, weekly_title)
-            blog_md = ensure_frontmatter(blog_md, blog_title, now.strftime("%Y-%m-%d"))
-            blog_md = append_reference_section(blog_md, weekly_title, rel_link)
-            write_blog(blog_md, blog_path)
-
-        for item in new_items:
-            insert_item(conn, item)
+        year, week, _ = now.isocalendar()
+        weekly_title = f"AI Weekly Digest — {year}-W{week:02d}"
+        blog_md = normalize_author(blog_md)
+        blog_title = extract_title(blog_md, weekly_title)
+        blog_md = ensure_frontmatter(blog_md, blog_title, now.strftime("%Y-%m-%d"))
+        blog_md = append_reference_section(blog_md, weekly_title, rel_link)
+        write_blog(blog_md, blog_path)
+        record_blog_generation(conn, blog_path, content_md, cfg)
+        checkpoint("render_blog")
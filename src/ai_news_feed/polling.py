@@ -0,0 +1,59 @@
+﻿import statistics
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from dateutil import parser as date_parser
+
+from .models import Item
+from .utils import to_local
+
+# Only the most recent entries describe the current cadence; old archives in a
+# feed would otherwise stretch the interval.
+CADENCE_SAMPLE = 20
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return to_local(date_parser.parse(value))
+    except (ValueError, OverflowError):
+        return None
+
+
+def observed_gap_sec(entries: List[Item]) -> Optional[float]:
+    times = sorted((t for t in (_parse(e.published_at) for e in entries) if t), reverse=True)
+    times = times[:CADENCE_SAMPLE]
+    gaps = [(a - b).total_seconds() for a, b in zip(times, times[1:])]
+    gaps = [g for g in gaps if g > 0]
+    if not gaps:
+        return None
+    return statistics.median(gaps)
+
+
+def poll_interval_sec(entries: List[Item], polling_cfg: Dict[str, Any]) -> int:
+    min_sec = polling_cfg.get("min_interval_min", 30) * 60
+    max_sec = polling_cfg.get("max_interval_hours", 72) * 3600
+    gap = observed_gap_sec(entries)
+    if gap is None:
+        interval = polling_cfg.get("default_interval_hours", 6) * 3600
+    else:
+        interval = gap * polling_cfg.get("cadence_factor", 0.5)
+    return int(min(max_sec, max(min_sec, interval)))
+
+
+def failure_backoff_sec(fail_count: int, polling_cfg: Dict[str, Any]) -> int:
+    base = polling_cfg.get("failure_backoff_base_min", 30) * 60
+    cap = polling_cfg.get("failure_backoff_max_hours", 168) * 3600
+    return int(min(cap, base * 2 ** max(0, fail_count - 1)))
+
+
+def next_fetch_at(now: datetime, delay_sec: int) -> str:
+    return (now + timedelta(seconds=delay_sec)).isoformat()
+
+
+def feed_is_due(row: Any, now: datetime, polling_cfg: Dict[str, Any]) -> bool:
+    if not polling_cfg.get("enabled", True) or row is None:
+        return True
+    due_at = _parse(row["next_fetch_at"])
+    return due_at is None or due_at <= now
@@ -0,0 +1,156 @@
+﻿import cProfile
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional
+
+from .utils import now_local
+
+PROFILE_MODES = ("cprofile", "sampling", "memory")
+PROFILE_SUFFIXES = {"cprofile": ".prof", "sampling": ".folded", "memory": ".txt"}
+
+_memory_reports: Optional[List[str]] = None
+_memory_top_n = 25
+
+
+class StackSampler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.counts[";".join(reversed(stack))] += 1
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ThreadedProfile:
+    # cProfile before 3.12 only sees the thread that enabled it, and fetch,
+    # summarize and hedged requests run in worker threads. Each thread started
+    # while the session is open gets its own profiler; all are merged on dump.
+    # From 3.12 cProfile uses sys.monitoring, which already covers every thread
+    # and allows only one active profiler.
+    def __init__(self):
+        self.profilers: List[cProfile.Profile] = [cProfile.Profile()]
+        self._lock = threading.Lock()
+        self._per_thread = sys.version_info < (3, 12)
+
+    def _start_thread(self, frame, event, arg) -> None:
+        profiler = cProfile.Profile()
+        with self._lock:
+            self.profilers.append(profiler)
+        # Replaces this hook for the rest of the thread.
+        profiler.enable()
+
+    def enable(self) -> None:
+        if self._per_thread:
+            threading.setprofile(self._start_thread)
+        self.profilers[0].enable()
+
+    def disable(self) -> None:
+        self.profilers[0].disable()
+        if self._per_thread:
+            threading.setprofile(None)
+
+    def dump_stats(self, path: str) -> None:
+        with self._lock:
+            profilers = list(self.profilers)
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            profiler.create_stats()
+            if profiler.stats:
+                stats.add(profiler)
+        stats.dump_stats(path)
+
+
+def default_profile_path(mode: str, command: str) -> str:
+    stamp = now_local().strftime("%Y%m%d-%H%M%S")
+    return os.path.join("profiles", f"{command}-{stamp}{PROFILE_SUFFIXES[mode]}")
+
+
+def checkpoint(label: str) -> None:
+    if _memory_reports is None or not tracemalloc.is_tracing():
+        return
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        )
+    )
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"== {label}: current {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB"]
+    for stat in snapshot.statistics("lineno")[:_memory_top_n]:
+        lines.append(f"{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  {stat.traceback}")
+    _memory_reports.append("\n".join(lines))
+
+
+@contextmanager
+def profile_session(mode: Optional[str], out_path: Optional[str], command: str, sample_interval: float = 0.005):
+    global _memory_reports
+
+    if not mode:
+        yield
+        return
+
+    out_path = out_path or default_profile_path(mode, command)
+    parent = os.path.dirname(os.path.abspath(out_path))
+    os.makedirs(parent, exist_ok=True)
+
+    if mode == "cprofile":
+        profiler = ThreadedProfile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(out_path)
+    elif mode == "sampling":
+        sampler = StackSampler(sample_interval)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(out_path)
+    elif mode == "memory":
+        _memory_reports = []
+        tracemalloc.start(10)
+        try:
+            yield
+        finally:
+            checkpoint("end")
+            with open(out_path, "w", encoding="utf-8") as f:
+                f.write("\n\n".join(_memory_reports) + "\n")
+            tracemalloc.stop()
+            _memory_reports = None
+    else:
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+    print(f"Wrote {mode} profile to {out_path}", file=sys.stderr)
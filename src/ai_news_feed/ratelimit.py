@@ -0,0 +1,221 @@
+﻿import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    # Accepts OpenAI reset headers ("1s", "6m0s", "20ms") as well as plain seconds.
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        # Takes `amount` immediately (possibly going into debt) and returns how long
+        # the caller must wait before the reservation is covered.
+        if self.capacity <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill(time.monotonic())
+            self.available -= amount
+            return 0.0 if self.available >= 0 else -self.available / self.rate
+
+    def adjust(self, delta: float) -> None:
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self._refill(time.monotonic())
+            self.available = min(self.capacity, self.available - delta)
+
+    def drain_until(self, remaining: float) -> None:
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self._refill(time.monotonic())
+            self.available = min(self.available, remaining)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.lock = threading.Lock()
+        self.paused_until = 0.0
+
+    def acquire(self, estimated_tokens: int) -> None:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        with self.lock:
+            wait = max(wait, self.paused_until - time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int) -> None:
+        self.tokens.adjust(actual_tokens - estimated_tokens)
+
+    def pause(self, seconds: float) -> None:
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers: Optional[Mapping[str, str]]) -> None:
+        if not headers:
+            return
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                remaining_value = float(remaining)
+            except ValueError:
+                continue
+            bucket.drain_until(remaining_value)
+            if remaining_value <= 0:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self.pause(reset)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown_sec: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_sec = cooldown_sec
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Set while the half-open probe is in flight.
+        self.probing_since: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            if self.probing_since is not None:
+                # Everyone else waits for the probe. A probe that never reports
+                # back (a non-retryable error) frees the slot after a cooldown.
+                if now - self.probing_since < self.cooldown_sec:
+                    return False
+                self.probing_since = now
+                return True
+            if self.opened_at is None:
+                return True
+            if now - self.opened_at >= self.cooldown_sec:
+                # Half-open: let one probe through; a failure re-opens immediately.
+                self.opened_at = None
+                self.failures = self.failure_threshold - 1
+                self.probing_since = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing_since = None
+
+    def record_failure(self) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self.lock:
+            self.probing_since = None
+            self.failures += 1
+            if self.failures >= self.failure_threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                logging.warning(
+                    "LLM circuit breaker opened after %s consecutive failures; pausing LLM calls for %.0fs",
+                    self.failures,
+                    self.cooldown_sec,
+                )
+
+
+class LLMGuard:
+    def __init__(self, cfg: Dict[str, Any]):
+        summarizer = cfg.get("summarizer", {})
+        self.retries = max(1, int(summarizer.get("retries", 3)))
+        self.backoff_base = float(summarizer.get("backoff_base_sec", 1.0))
+        self.backoff_max = float(summarizer.get("backoff_max_sec", 30.0))
+        self.limiter = RateLimiter(
+            float(summarizer.get("requests_per_minute", 0) or 0),
+            float(summarizer.get("tokens_per_minute", 0) or 0),
+        )
+        self.breaker = CircuitBreaker(
+            int(summarizer.get("circuit_breaker_failures", 5)),
+            float(summarizer.get("circuit_breaker_cooldown_sec", 120)),
+        )
+
+    def backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_base)
+        # Full jitter exponential backoff.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+
+
+_guards: Dict[tuple, LLMGuard] = {}
+_guards_lock = threading.Lock()
+
+GUARD_KEYS = (
+    "retries",
+    "backoff_base_sec",
+    "backoff_max_sec",
+    "requests_per_minute",
+    "tokens_per_minute",
+    "circuit_breaker_failures",
+    "circuit_breaker_cooldown_sec",
+)
+
+
+def get_llm_guard(cfg: Optional[Dict[str, Any]]) -> LLMGuard:
+    cfg = cfg or {}
+    key = tuple(cfg.get("summarizer", {}).get(name) for name in GUARD_KEYS)
+    with _guards_lock:
+        guard = _guards.get(key)
+        if guard is None:
+            guard = _guards[key] = LLMGuard(cfg)
+        return guard
+
+
+def estimate_tokens(*texts: str, output_allowance: int = 800) -> int:
+    # Rough budget: ~3 characters per token across mixed Chinese/English input.
+    return sum(len(t) for t in texts) // 3 + output_allowance
@@ -0,0 +1,211 @@
+﻿import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from .latency import timed_call
+from .utils import LOCAL_TZ, now_local, set_clock_offset
+
+ARCHIVE_NAME = "archive.sqlite"
+TIMESTAMP_RE = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?([+-]\d{2}:?\d{2}|Z)?")
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"mode": None, "conn": None, "session": None}
+
+
+class ReplayMissError(ConnectionError):
+    pass
+
+
+def _open_archive(directory: str, create: bool) -> sqlite3.Connection:
+    path = os.path.join(directory, ARCHIVE_NAME)
+    if not create and not os.path.exists(path):
+        raise FileNotFoundError(f"No recording found: {path}")
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS exchanges (
+            key TEXT PRIMARY KEY,
+            loose_key TEXT,
+            kind TEXT,
+            url TEXT,
+            status INTEGER,
+            content_type TEXT,
+            body BLOB,
+            recorded_at TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_exchanges_loose_key ON exchanges(loose_key)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def configure(record_dir: Optional[str] = None, replay_dir: Optional[str] = None) -> None:
+    close()
+    if record_dir:
+        conn = _open_archive(record_dir, create=True)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('started_at', ?)", (now_local().isoformat(),))
+        _state.update({"mode": "record", "conn": conn})
+    elif replay_dir:
+        conn = _open_archive(replay_dir, create=False)
+        row = conn.execute("SELECT value FROM meta WHERE key = 'started_at'").fetchone()
+        if row is not None:
+            # Replay on the recorded clock so week bounds, filenames and prompts match the original run.
+            set_clock_offset(datetime.fromisoformat(row["value"]) - datetime.now(LOCAL_TZ))
+        _state.update({"mode": "replay", "conn": conn})
+
+
+def close() -> None:
+    with _lock:
+        if _state["conn"] is not None:
+            _state["conn"].commit()
+            _state["conn"].close()
+        if _state["mode"] == "replay":
+            set_clock_offset(timedelta(0))
+        _state.update({"mode": None, "conn": None})
+
+
+def mode() -> Optional[str]:
+    return _state["mode"]
+
+
+@contextmanager
+def recording_session(record_dir: Optional[str], replay_dir: Optional[str]):
+    configure(record_dir, replay_dir)
+    try:
+        yield
+    finally:
+        close()
+
+
+def _store(
+    key: str, kind: str, url: str, status: int, content_type: str, body: bytes, loose_key: Optional[str] = None
+) -> None:
+    with _lock:
+        _state["conn"].execute(
+            "INSERT OR REPLACE INTO exchanges (key, loose_key, kind, url, status, content_type, body, recorded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, loose_key or key, kind, url, status, content_type, zlib.compress(body), now_local().isoformat()),
+        )
+
+
+def _load(key: str, loose_key: Optional[str] = None):
+    with _lock:
+        row = _state["conn"].execute(
+            "SELECT status, content_type, body FROM exchanges WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None and loose_key:
+            row = _state["conn"].execute(
+                "SELECT status, content_type, body FROM exchanges WHERE loose_key = ? ORDER BY recorded_at DESC",
+                (loose_key,),
+            ).fetchone()
+    if row is None:
+        return None
+    return row["status"], row["content_type"], zlib.decompress(row["body"])
+
+
+def _build_response(url: str, status: int, content_type: str, body: bytes):
+    import requests
+
+    resp = requests.Response()
+    resp.status_code = status
+    resp.url = url
+    resp._content = body
+    resp.headers["Content-Type"] = content_type or ""
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers) or "utf-8"
+    return resp
+
+
+def _session():
+    # One pooled session per process keeps connections to feed and article hosts
+    # warm across runs of a long-lived `serve` process.
+    session = _state["session"]
+    if session is None:
+        import requests
+
+        with _lock:
+            session = _state["session"]
+            if session is None:
+                session = _state["session"] = requests.Session()
+    return session
+
+
+def _get(url: str, timeout: float, headers: Optional[Dict[str, str]]):
+    # The timeout and any hedged duplicate follow the host's observed latency.
+    return timed_call("http", urlparse(url).netloc, lambda t: _session().get(url, timeout=t, headers=headers), timeout)
+
+
+def http_get(url: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+    import requests
+
+    current = _state["mode"]
+    if current is None:
+        return _get(url, timeout, headers)
+
+    key = f"GET {url}"
+    if current == "replay":
+        stored = _load(key)
+        if stored is None:
+            raise ReplayMissError(f"Not in recording: {url}")
+        status, content_type, body = stored
+        if status == 0:
+            raise requests.ConnectionError(body.decode("utf-8", "replace"))
+        return _build_response(url, status, content_type, body)
+
+    try:
+        resp = _get(url, timeout, headers)
+    except requests.RequestException as exc:
+        _store(key, "http", url, 0, "", str(exc).encode("utf-8"))
+        raise
+    _store(key, "http", url, resp.status_code, resp.headers.get("Content-Type", ""), resp.content)
+    return resp
+
+
+def llm_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    digest = hashlib.sha256()
+    for part in (model, system_prompt, user_prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return f"LLM {digest.hexdigest()}"
+
+
+def llm_loose_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    # Prompts that embed collection/generation timestamps still match on replay.
+    return "LOOSE " + llm_key(model, system_prompt, TIMESTAMP_RE.sub("<ts>", user_prompt))[4:]
+
+
+def replay_llm(key: str, loose_key: Optional[str] = None) -> Optional[str]:
+    if _state["mode"] != "replay":
+        return None
+    stored = _load(key, loose_key)
+    if stored is None:
+        raise ReplayMissError(f"LLM exchange not in recording: {key}")
+    status, _, body = stored
+    if status != 200:
+        raise RuntimeError(body.decode("utf-8", "replace"))
+    return body.decode("utf-8")
+
+
+def record_llm(
+    key: str,
+    model: str,
+    text: Optional[str] = None,
+    error: Optional[BaseException] = None,
+    loose_key: Optional[str] = None,
+) -> None:
+    if _state["mode"] != "record":
+        return
+    if error is not None:
+        body = f"{type(error).__name__}: {error}".encode("utf-8")
+        _store(key, "llm", model, 500, "text/plain", body, loose_key)
+    else:
+        _store(key, "llm", model, 200, "text/plain", (text or "").encode("utf-8"), loose_key)
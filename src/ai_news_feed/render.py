@@ -0,0 +1,63 @@
+﻿import hashlib
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from .archive import attach_archives
+from .db import get_connection, iter_items_between, list_collected_dates
+from .markdown import digest_item, output_filename, render_weekly, strip_volatile_lines, week_label, week_start
+
+Week = Tuple[int, int]
+
+
+def digest_hash(week_md: str) -> str:
+    # The generation time and frontmatter date change on every render, so they
+    # are left out of the comparison.
+    return hashlib.sha256(strip_volatile_lines(week_md).encode("utf-8")).hexdigest()
+
+
+def weeks_with_items(conn) -> List[Week]:
+    weeks = {tuple(date.fromisoformat(day).isocalendar()[:2]) for day in list_collected_dates(conn)}
+    return sorted(weeks)
+
+
+def render_week(cfg: Dict[str, Any], week: Week, force: bool = False) -> Tuple[str, str, int]:
+    start = week_start(*week)
+    end = start + timedelta(days=7)
+    with get_connection(cfg["storage"]["db_path"]) as conn:
+        attach_archives(conn, cfg)
+        items = [digest_item(row) for row in iter_items_between(conn, start.isoformat(), end.isoformat())]
+        content_md = render_weekly(items, cfg, week, conn)
+
+    out_path = os.path.join(cfg["output"]["path"], output_filename(cfg, week))
+    if not force and os.path.exists(out_path):
+        with open(out_path, "r", encoding="utf-8") as f:
+            if digest_hash(f.read()) == digest_hash(content_md):
+                return out_path, "unchanged", len(items)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content_md)
+    os.replace(tmp_path, out_path)
+    return out_path, "written", len(items)
+
+
+def render_weeks(
+    cfg: Dict[str, Any], weeks: List[Week], force: bool = False, workers: Optional[int] = None
+) -> List[Tuple[str, str, str, int]]:
+    os.makedirs(cfg["output"]["path"], exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(weeks)))
+    job = partial(render_week, cfg, force=force)
+    if workers == 1:
+        results = [job(week) for week in weeks]
+    else:
+        # Each worker opens its own connection and loads one week at a time.
+        chunksize = max(1, len(weeks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(job, weeks, chunksize=chunksize))
+    rows = [(week_label(*week), path, status, count) for week, (path, status, count) in zip(weeks, results)]
+    written = sum(1 for row in rows if row[2] == "written")
+    logging.info("Rendered %s week(s): %s written, %s unchanged", len(rows), written, len(rows) - written)
+    return rows
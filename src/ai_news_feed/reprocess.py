@@ -0,0 +1,136 @@
+﻿import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Optional
+
+from .archive import attach_archives
+from .content import fetch_and_extract
+from .db import (
+    count_items_matching,
+    create_reprocess_job,
+    get_connection,
+    get_reprocess_job,
+    mark_item_failed,
+    max_item_id,
+    select_items_matching,
+    update_item_enrichment,
+    update_reprocess_job,
+)
+from .llm import summarize_and_classify
+from .models import Item
+from .pipeline import enrichment_fields
+from .routing import max_fetch_chars
+from .tracing import span
+from .utils import now_local
+
+
+def reprocess_job_id(filters: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(filters, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def _source_tiers(cfg: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    return {src["name"]: src.get("tier") for src in cfg["feeds"] + cfg.get("web_sources", [])}
+
+
+def enrich_row(row: Any, cfg: Dict[str, Any], tiers: Dict[str, Optional[str]]) -> Item:
+    item = Item(
+        title=row["title"],
+        url=row["url"],
+        source=row["source"],
+        source_tier=tiers.get(row["source"]),
+        published_at=row["published_at"],
+        collected_at=row["collected_at"],
+        rss_summary=row["rss_summary"],
+    )
+    # Only failed rows still have their RSS summary; the rest fall back to the
+    # title when the article can no longer be downloaded.
+    content, content_status = fetch_and_extract(
+        row["url"],
+        item.rss_summary,
+        timeout=cfg["summarizer"].get("timeout_sec", 60),
+        max_chars=max_fetch_chars(cfg),
+    )
+    if not content and row["status"] == "processed":
+        raise RuntimeError("Article unavailable; kept the existing enrichment")
+    item.content_status = content_status
+    result = summarize_and_classify(item, content, cfg)
+    item.update(enrichment_fields(result))
+    return item
+
+
+def reprocess_items(
+    cfg: Dict[str, Any],
+    filters: Dict[str, Any],
+    restart: bool = False,
+    batch_size: Optional[int] = None,
+    stop_event: Optional[threading.Event] = None,
+) -> Dict[str, Any]:
+    stop_event = stop_event or threading.Event()
+    job_id = reprocess_job_id(filters)
+    tiers = _source_tiers(cfg)
+    workers = max(1, int(cfg["summarizer"].get("concurrency", 3)))
+    batch_size = batch_size or workers * 4
+
+    with get_connection(cfg["storage"]["db_path"]) as conn:
+        # Archived items are re-enriched in place inside their partition.
+        attach_archives(conn, cfg, writable=True)
+        job = get_reprocess_job(conn, job_id)
+        if job is None or restart or job["status"] == "done":
+            # Rows inserted after the job starts are left to the regular pipeline.
+            max_id = max_item_id(conn)
+            total = count_items_matching(conn, filters, max_id)
+            create_reprocess_job(conn, job_id, json.dumps(filters, sort_keys=True), max_id, total, now_local().isoformat())
+            conn.commit()
+            job = get_reprocess_job(conn, job_id)
+            logging.info("Reprocess job %s: %s matching items", job_id, total)
+        else:
+            logging.info(
+                "Resuming reprocess job %s after item %s (%s/%s done)",
+                job_id,
+                job["last_item_id"],
+                job["done"] + job["failed"],
+                job["total"],
+            )
+
+        last_id = job["last_item_id"]
+        updated = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while not stop_event.is_set():
+                rows = select_items_matching(conn, filters, last_id, job["max_item_id"], batch_size)
+                if not rows:
+                    break
+                futures = {pool.submit(enrich_row, row, cfg, tiers): row for row in rows}
+                done = failed = 0
+                for future in as_completed(futures):
+                    row = futures[future]
+                    try:
+                        item = future.result()
+                    except Exception as exc:
+                        logging.warning("Reprocess failed for item %s (%s): %s", row["id"], row["url"], exc)
+                        mark_item_failed(conn, row["id"], str(exc), row["db_schema"])
+                        failed += 1
+                        continue
+                    with span("db_write"):
+                        update_item_enrichment(conn, row["id"], item, row["db_schema"])
+                    done += 1
+                # The checkpoint only moves once the whole batch is written, so an
+                # interrupted run repeats at most one batch.
+                last_id = rows[-1]["id"]
+                update_reprocess_job(conn, job_id, last_id, done, failed, "running", now_local().isoformat())
+                conn.commit()
+                updated += done
+                job = get_reprocess_job(conn, job_id)
+                logging.info("Reprocessed %s/%s items (%s failed)", job["done"] + job["failed"], job["total"], job["failed"])
+
+        status = "interrupted" if stop_event.is_set() else "done"
+        update_reprocess_job(conn, job_id, last_id, 0, 0, status, now_local().isoformat())
+        job = get_reprocess_job(conn, job_id)
+    if updated and cfg["related"].get("enabled", True):
+        from .vectors import rebuild_vector_store
+
+        # Appending would leave two vectors per item and count its terms twice
+        # in the document frequencies, so the store is rebuilt once instead.
+        logging.info("Rebuilt the related-coverage store: %s vectors", rebuild_vector_store(cfg))
+    return dict(job)
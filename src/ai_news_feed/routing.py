@@ -0,0 +1,50 @@
+﻿from typing import Any, Dict, List
+
+from .models import Item
+
+ROUTE_CONDITIONS = ("content_status", "source", "tier", "min_chars", "max_chars")
+
+
+def _as_list(value: Any) -> List[Any]:
+    return value if isinstance(value, list) else [value]
+
+
+def default_route(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    summarizer = cfg["summarizer"]
+    return {
+        "name": "default",
+        "model": summarizer["model"],
+        "max_chars_input": summarizer.get("max_chars_input", 12000),
+        "timeout_sec": summarizer.get("timeout_sec", 60),
+    }
+
+
+def route_matches(when: Dict[str, Any], item: Item, content_chars: int) -> bool:
+    if "content_status" in when and item.content_status not in _as_list(when["content_status"]):
+        return False
+    if "source" in when and item.source not in _as_list(when["source"]):
+        return False
+    if "tier" in when and item.source_tier not in _as_list(when["tier"]):
+        return False
+    if "min_chars" in when and content_chars < when["min_chars"]:
+        return False
+    if "max_chars" in when and content_chars > when["max_chars"]:
+        return False
+    return True
+
+
+def select_route(item: Item, content: str, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    route = default_route(cfg)
+    for rule in cfg["summarizer"].get("routes", []):
+        if route_matches(rule.get("when", {}), item, len(content or "")):
+            route.update({k: rule[k] for k in ("name", "model", "max_chars_input", "timeout_sec") if k in rule})
+            break
+    return route
+
+
+def max_fetch_chars(cfg: Dict[str, Any]) -> int:
+    # Articles are extracted up to the largest route budget so length-based rules
+    # see the real size; each route then truncates to its own max_chars_input.
+    limits = [cfg["summarizer"].get("max_chars_input", 12000)]
+    limits.extend(rule["max_chars_input"] for rule in cfg["summarizer"].get("routes", []) if "max_chars_input" in rule)
+    return max(limits)
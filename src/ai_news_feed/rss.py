@@ -1,9 +1,13 @@
 ﻿from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import List, Optional
+from urllib.parse import urlparse
 
-import feedparser
 from dateutil import parser as date_parser
 
+from .models import Item
+from .recording import http_get
+from .tracing import span
+
 
 def parse_datetime(value: Optional[str]) -> Optional[str]:
     if not value:
@@ -15,19 +19,32 @@ def parse_datetime(value: Optional[str]) -> Optional[str]:
         return None
 
 
-def fetch_feed_entries(url: str) -> List[Dict[str, Any]]:
-    parsed = feedparser.parse(url)
+def fetch_feed_entries(url: str, timeout: float) -> List[Item]:
+    import feedparser
+
+    with span("feed_fetch", host=urlparse(url).netloc) as sp:
+        if url.startswith(("http://", "https://")):
+            # Downloaded here rather than by feedparser so feeds get the timeout,
+            # latency history, hedging and record/replay of every other request.
+            resp = http_get(url, timeout=timeout, headers={"User-Agent": "ai-news-feed/1.0"})
+            resp.raise_for_status()
+            parsed = feedparser.parse(resp.content)
+        else:
+            parsed = feedparser.parse(url)
+        sp["entries"] = len(parsed.entries)
+    if not parsed.entries and isinstance(parsed.get("bozo_exception"), (OSError, ValueError)):
+        # feedparser swallows network errors; surface them so the feed is marked as failing.
+        raise parsed.bozo_exception
     entries = []
     for entry in parsed.entries:
         entries.append(
-            {
-                "guid": entry.get("id") or entry.get("guid"),
-                "url": entry.get("link"),
-                "title": entry.get("title"),
-                "author": entry.get("author"),
-                "published_at": parse_datetime(entry.get("published"))
-                or parse_datetime(entry.get("updated")),
-                "rss_summary": entry.get("summary") or entry.get("description"),
-            }
+            Item(
+                guid=entry.get("id") or entry.get("guid"),
+                url=entry.get("link"),
+                title=entry.get("title"),
+                author=entry.get("author"),
+                published_at=parse_datetime(entry.get("published")) or parse_datetime(entry.get("updated")),
+                rss_summary=entry.get("summary") or entry.get("description"),
+            )
         )
     return entries
@@ -0,0 +1,89 @@
+﻿from datetime import datetime, timedelta
+from typing import List, Set
+
+from .utils import LOCAL_TZ, to_local
+
+_NAMES = {
+    "month": {n: i for i, n in enumerate(["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], 1)},
+    "dow": {n: i for i, n in enumerate(["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"])},
+}
+
+
+class CronError(ValueError):
+    pass
+
+
+def _value(token: str, kind: str) -> int:
+    names = _NAMES.get(kind, {})
+    if token.upper() in names:
+        return names[token.upper()]
+    try:
+        return int(token)
+    except ValueError:
+        raise CronError(f"Invalid cron value: {token}")
+
+
+def _parse_field(field: str, kind: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = _value(step_str, "")
+            if step <= 0:
+                raise CronError(f"Invalid cron step: {field}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_str, end_str = part.split("-", 1)
+            start, end = _value(start_str, kind), _value(end_str, kind)
+        else:
+            start = _value(part, kind)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise CronError(f"Cron field out of range: {field}")
+        values.update(range(start, end + 1, step))
+    if kind == "dow" and 7 in values:
+        # 7 is an alias for Sunday.
+        values.discard(7)
+        values.add(0)
+    return values
+
+
+class CronSchedule:
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise CronError(f"Cron expression needs 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes = _parse_field(fields[0], "minute", 0, 59)
+        self.hours = _parse_field(fields[1], "hour", 0, 23)
+        self.days = _parse_field(fields[2], "day", 1, 31)
+        self.months = _parse_field(fields[3], "month", 1, 12)
+        self.weekdays = _parse_field(fields[4], "dow", 0, 7)
+        self.day_restricted = fields[2] != "*"
+        self.weekday_restricted = fields[4] != "*"
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        dom = day.day in self.days
+        dow = (day.isoweekday() % 7) in self.weekdays
+        # Standard cron: when both day fields are restricted, either may match.
+        if self.day_restricted and self.weekday_restricted:
+            return dom or dow
+        return dom and dow
+
+    def next_after(self, dt: datetime) -> datetime:
+        # Matching is done on local wall-clock time, like cron.
+        start = to_local(dt).replace(tzinfo=None, second=0, microsecond=0) + timedelta(minutes=1)
+        times: List[tuple] = sorted((h, m) for h in self.hours for m in self.minutes)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour, minute in times:
+                    candidate = day.replace(hour=hour, minute=minute)
+                    if candidate >= start:
+                        return candidate.replace(tzinfo=LOCAL_TZ)
+            day += timedelta(days=1)
+        raise CronError(f"Cron expression never fires: {self.expr!r}")
@@ -0,0 +1,52 @@
+﻿import re
+from typing import List, Optional
+
+# unicode61 treats a run of CJK characters as a single token, so Chinese text is
+# indexed one character per token and queried as phrases of adjacent characters.
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af\u3000-\u303f\uff00-\uffef"
+_CJK_RE = re.compile(f"([{_CJK}])")
+
+# snippet() highlight markers; private-use characters never occur in items.
+MARK_START = "\ue000"
+MARK_END = "\ue001"
+_CJK_GAP_RE = re.compile(f"([{_CJK}]{MARK_END}?) (?={MARK_START}?[{_CJK}])")
+
+# bm25 column weights: title, summary, tags, source.
+RANK_WEIGHTS = (3.0, 1.0, 2.0, 0.5)
+
+
+def segment(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    return re.sub(r"\s+", " ", _CJK_RE.sub(r" \1 ", text)).strip()
+
+
+def format_snippet(text: str, start: str = "[", end: str = "]") -> str:
+    text = _CJK_GAP_RE.sub(r"\1", text).replace(MARK_END + MARK_START, "")
+    return text.replace(MARK_START, start).replace(MARK_END, end)
+
+
+def search_fields(
+    title: Optional[str],
+    bullets: Optional[List[str]],
+    so_what: Optional[str],
+    tags: Optional[List[str]],
+    source: Optional[str],
+) -> List[str]:
+    return [
+        segment(title),
+        segment(" ".join(list(bullets or []) + [so_what or ""])),
+        segment(" ".join(tags or [])),
+        segment(source),
+    ]
+
+
+def build_match_query(query: str) -> str:
+    # Every whitespace-separated term must match; a trailing * makes it a prefix.
+    terms = []
+    for raw in query.split():
+        prefix = raw.endswith("*")
+        term = segment(raw.rstrip("*")).replace('"', '""')
+        if term:
+            terms.append(f'"{term}"' + ("*" if prefix else ""))
+    return " AND ".join(terms)
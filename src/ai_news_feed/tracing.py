@@ -0,0 +1,147 @@
+﻿import json
+import math
+import os
+import threading
+import time
+import uuid
+from array import array
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from .db import get_connection, insert_run, insert_run_stage_stats
+from .utils import now_local
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {"run_id": None, "command": None, "started_at": None, "file": None, "stats": {}, "pricing": {}}
+
+
+def start_run(cfg: Dict[str, Any], command: str) -> Optional[str]:
+    tracing_cfg = cfg.get("tracing", {})
+    if not tracing_cfg.get("enabled", True):
+        return None
+    trace_dir = tracing_cfg.get("trace_dir", "logs")
+    os.makedirs(trace_dir, exist_ok=True)
+    date_str = now_local().strftime("%Y-%m-%d")
+    with _lock:
+        if _state["file"] is not None:
+            _state["file"].close()
+        _state["run_id"] = uuid.uuid4().hex[:12]
+        _state["command"] = command
+        _state["started_at"] = now_local().isoformat()
+        _state["file"] = open(os.path.join(trace_dir, f"trace-{date_str}.jsonl"), "a", encoding="utf-8")
+        _state["stats"] = {}
+        _state["pricing"] = tracing_cfg.get("pricing", {}) or {}
+        return _state["run_id"]
+
+
+def estimate_cost(model: Optional[str], input_tokens: int, output_tokens: int) -> float:
+    return token_cost(_state["pricing"], model, input_tokens, output_tokens)
+
+
+def token_cost(pricing: Dict[str, Any], model: Optional[str], input_tokens: int, output_tokens: int) -> float:
+    price = pricing.get(model or "")
+    if not price:
+        return 0.0
+    return (
+        input_tokens * float(price.get("input_per_1m", 0)) + output_tokens * float(price.get("output_per_1m", 0))
+    ) / 1_000_000
+
+
+@contextmanager
+def span(stage: str, host: Optional[str] = None, **attrs: Any):
+    record: Dict[str, Any] = dict(attrs)
+    started = time.perf_counter()
+    status = "ok"
+    try:
+        yield record
+    except BaseException as exc:
+        status = "error"
+        record.setdefault("error", f"{type(exc).__name__}: {exc}"[:300])
+        raise
+    finally:
+        if _state["run_id"] is not None:
+            record.update(
+                {
+                    "run_id": _state["run_id"],
+                    "stage": stage,
+                    "host": host or "",
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "ts": now_local().isoformat(),
+                }
+            )
+            if "input_tokens" in record or "output_tokens" in record:
+                record["cost_usd"] = estimate_cost(
+                    record.get("model"), int(record.get("input_tokens") or 0), int(record.get("output_tokens") or 0)
+                )
+            with _lock:
+                if _state["file"] is not None:
+                    _state["file"].write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                    _add_span_stats(record)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _add_span_stats(record: Dict[str, Any]) -> None:
+    # Spans are folded into per-stage totals as they finish; only the durations
+    # are kept (for percentiles), so a long backfill does not hold every record.
+    keys = [(record["stage"], "")]
+    if record["host"]:
+        keys.append((record["stage"], record["host"]))
+    for key in keys:
+        group = _state["stats"].get(key)
+        if group is None:
+            group = _state["stats"][key] = {
+                "durations": array("d"),
+                "errors": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cost_usd": 0.0,
+            }
+        group["durations"].append(record["duration_ms"])
+        group["errors"] += record["status"] != "ok"
+        group["input_tokens"] += int(record.get("input_tokens") or 0)
+        group["output_tokens"] += int(record.get("output_tokens") or 0)
+        group["cost_usd"] += float(record.get("cost_usd") or 0)
+
+
+def summarize_stats(stats: Dict[tuple, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rows = []
+    for (stage, host), group in sorted(stats.items()):
+        durations = list(group["durations"])
+        rows.append(
+            {
+                "stage": stage,
+                "host": host,
+                "count": len(durations),
+                "errors": group["errors"],
+                "p50_ms": percentile(durations, 50),
+                "p95_ms": percentile(durations, 95),
+                "total_ms": sum(durations),
+                "input_tokens": group["input_tokens"],
+                "output_tokens": group["output_tokens"],
+                "cost_usd": group["cost_usd"],
+            }
+        )
+    return rows
+
+
+def finish_run(db_path: str) -> None:
+    with _lock:
+        run_id = _state["run_id"]
+        if run_id is None:
+            return
+        stats = _state["stats"]
+        if _state["file"] is not None:
+            _state["file"].close()
+        _state.update({"run_id": None, "file": None, "stats": {}})
+
+    with get_connection(db_path) as conn:
+        insert_run(conn, run_id, _state["command"], _state["started_at"], now_local().isoformat())
+        insert_run_stage_stats(conn, run_id, summarize_stats(stats))
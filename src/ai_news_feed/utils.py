@@ -1,12 +1,19 @@
 ﻿import re
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 LOCAL_TZ = ZoneInfo("Australia/Melbourne")
 
+_clock_offset = timedelta(0)
+
 
 def now_local():
-    return datetime.now(LOCAL_TZ)
+    return datetime.now(LOCAL_TZ) + _clock_offset
+
+
+def set_clock_offset(offset: timedelta) -> None:
+    global _clock_offset
+    _clock_offset = offset
 
 
 def to_local(dt):
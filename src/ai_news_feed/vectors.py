@@ -0,0 +1,217 @@
+﻿import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .archive import attach_archives
+from .cluster import hashed_vectors, item_text
+from .db import get_connection, get_item_links, iter_processed_item_rows
+from .markdown import digest_item
+from .models import Item
+
+META_NAME = "meta.json"
+_VECTORS_NAME = "vectors.f32"
+_IDS_NAME = "ids.i64"
+_COLLECTED_NAME = "collected.i64"
+# Rows scored per block, and queries per pass over the store; together they
+# bound the score matrix (8 MiB) however large the store or the week grows.
+_SCAN_ROWS = 8192
+_QUERY_ROWS = 256
+_REBUILD_BATCH = 1024
+
+
+class VectorStore:
+    # Append-only: rows go to flat files (vectors, item ids and collection
+    # times, in epoch seconds) and the row count in meta.json is the commit
+    # point, so a torn append is cut off the next time the store is opened for
+    # writing. Reads memory-map the files.
+    def __init__(self, path: str, dims: int):
+        self.path = path
+        meta: Dict[str, Any] = {}
+        meta_path = os.path.join(path, META_NAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        self.dims = int(meta.get("dims", dims))
+        if self.dims != dims:
+            logging.warning(
+                "Vector store %s has %s dimensions; related.dims=%s applies after a rebuild", path, self.dims, dims
+            )
+        self.count = int(meta.get("count", 0))
+        self.df = np.asarray(meta.get("df", [0] * self.dims), dtype=np.int64)
+        self._files: Optional[List[BinaryIO]] = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def append(self, item_ids: Sequence[int], collected: Sequence[int], vectors: np.ndarray) -> None:
+        if self._files is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._files = []
+            for name, itemsize in ((_VECTORS_NAME, 4 * self.dims), (_IDS_NAME, 8), (_COLLECTED_NAME, 8)):
+                f = open(self._file(name), "ab")
+                f.truncate(self.count * itemsize)
+                self._files.append(f)
+        self._files[0].write(np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+        self._files[1].write(np.asarray(item_ids, dtype="<i8").tobytes())
+        self._files[2].write(np.asarray(collected, dtype="<i8").tobytes())
+        self.count += len(item_ids)
+        self.df += np.count_nonzero(vectors, axis=0)
+
+    def add_items(self, items: List[Item]) -> None:
+        items = [item for item in items if item.item_id is not None]
+        if items:
+            self.append(
+                [item.item_id for item in items],
+                [_epoch(item.collected_at) for item in items],
+                hashed_vectors([item_text(item) for item in items], self.dims),
+            )
+
+    def close(self) -> None:
+        if self._files is None:
+            return
+        for f in self._files:
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        self._files = None
+        meta_path = self._file(META_NAME)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dims": self.dims, "count": self.count, "df": self.df.tolist()}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def _arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        vectors = np.memmap(self._file(_VECTORS_NAME), dtype="<f4", mode="r", shape=(self.count, self.dims))
+        item_ids = np.memmap(self._file(_IDS_NAME), dtype="<i8", mode="r", shape=(self.count,))
+        collected = np.memmap(self._file(_COLLECTED_NAME), dtype="<i8", mode="r", shape=(self.count,))
+        return vectors, item_ids, collected
+
+    def top_k(
+        self, queries: np.ndarray, k: int, before: Optional[int] = None, min_score: float = 0.0
+    ) -> List[List[Tuple[int, float]]]:
+        # Cosine similarity after weighting both sides by IDF, i.e. hashed
+        # TF-IDF, computed one block of stored rows at a time.
+        if not self.count or not len(queries) or k <= 0:
+            return [[] for _ in range(len(queries))]
+        weights = (np.log((1 + self.count) / (1 + self.df)) + 1.0).astype(np.float32) ** 2
+        results: List[List[Tuple[int, float]]] = []
+        for start in range(0, len(queries), _QUERY_ROWS):
+            results.extend(self._top_k(queries[start : start + _QUERY_ROWS], weights, k, before, min_score))
+        return results
+
+    def _top_k(
+        self, queries: np.ndarray, weights: np.ndarray, k: int, before: Optional[int], min_score: float
+    ) -> List[List[Tuple[int, float]]]:
+        results: List[List[Tuple[int, float]]] = [[] for _ in range(len(queries))]
+        weighted = queries * weights
+        query_norms = np.sqrt(np.einsum("ij,ij->i", weighted, queries))
+        query_norms[query_norms == 0] = np.inf
+
+        vectors, item_ids, collected = self._arrays()
+        # One row per query; partitioning along contiguous rows is much faster
+        # than down the columns.
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.count, _SCAN_ROWS):
+            block = np.asarray(vectors[start : start + _SCAN_ROWS])
+            norms = np.sqrt(np.einsum("ij,ij->i", block, block * weights))
+            norms[norms == 0] = np.inf
+            scores = weighted @ block.T
+            scores /= query_norms[:, None]
+            scores /= norms[None, :]
+            if before is not None:
+                scores[:, np.asarray(collected[start : start + len(block)]) >= before] = -np.inf
+            # Each block's own top k is merged into the running top k.
+            rows = np.broadcast_to(np.arange(len(block)), scores.shape)
+            if len(block) > k:
+                rows = np.argpartition(scores, -k, axis=1)[:, -k:]
+                scores = np.take_along_axis(scores, rows, axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_ids = np.asarray(item_ids)[np.take_along_axis(best_rows, order, axis=1)]
+        for q in range(len(queries)):
+            seen = set()
+            for item_id, score in zip(best_ids[q].tolist(), best_scores[q].tolist()):
+                # Stores written before reprocess rebuilt them may repeat an
+                # id; the first hit is the best.
+                if score > 0 and score >= min_score and item_id not in seen:
+                    seen.add(item_id)
+                    results[q].append((item_id, score))
+        return results
+
+
+def _epoch(value: Optional[str]) -> int:
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def open_vector_store(cfg: Dict[str, Any]) -> VectorStore:
+    return VectorStore(cfg["storage"]["vector_path"], int(cfg["related"]["dims"]))
+
+
+def rebuild_vector_store(cfg: Dict[str, Any]) -> int:
+    path = cfg["storage"]["vector_path"]
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    store = VectorStore(tmp_path, int(cfg["related"]["dims"]))
+    with get_connection(cfg["storage"]["db_path"]) as conn:
+        attach_archives(conn, cfg)
+        batch: List[Item] = []
+        for row in iter_processed_item_rows(conn):
+            batch.append(digest_item(row))
+            if len(batch) >= _REBUILD_BATCH:
+                store.add_items(batch)
+                batch = []
+        store.add_items(batch)
+    store.close()
+    if store.count == 0:
+        # Nothing was written; an empty store is the same as none.
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.rmtree(path, ignore_errors=True)
+        return 0
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return store.count
+
+
+def attach_related(items: List[Item], cfg: Dict[str, Any], conn) -> None:
+    # Past coverage only: anything collected after the week's first item is
+    # left out, so re-rendering an old week never links to later stories.
+    settings = cfg["related"]
+    store = open_vector_store(cfg)
+    if not store.count or not items:
+        return
+    top_k = int(settings["top_k"])
+    # Extra candidates cover hits dropped below (archived stubs, same URL).
+    matches = store.top_k(
+        hashed_vectors([item_text(item) for item in items], store.dims),
+        top_k * 2,
+        before=min(_epoch(item.collected_at) for item in items),
+        min_score=float(settings["min_score"]),
+    )
+    links = {row["id"]: row for row in get_item_links(conn, sorted({i for found in matches for i, _ in found}))}
+    for item, found in zip(items, matches):
+        seen = {item.url} | {other.get("url") for other in item.also_reported}
+        for item_id, _ in found:
+            row = links.get(item_id)
+            if row is None or row["url"] in seen:
+                continue
+            seen.add(row["url"])
+            item.related.append(
+                {"title": row["title"], "url": row["url"], "source": row["source"], "date": (row["collected_at"] or "")[:10]}
+            )
+            if len(item.related) >= top_k:
+                break
@@ -1,11 +1,31 @@
-﻿import re
-from typing import Any, Dict, List, Optional
+﻿import json
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 from urllib.parse import urljoin, urlparse
 
-import requests
-from bs4 import BeautifulSoup
 from dateutil import parser as date_parser
 
+from .models import Item
+from .recording import http_get
+from .tracing import span
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
+# Settings that decide which entries a list page yields; sources that agree on
+# all of them can share one fetch.
+LIST_FETCH_KEYS = (
+    "list_url",
+    "item_selector",
+    "title_selector",
+    "url_selector",
+    "date_selector",
+    "summary_selector",
+    "include_url_regex",
+    "exclude_url_regex",
+    "max_items",
+)
+
 
 def _parse_datetime(text: Optional[str]) -> Optional[str]:
     if not text:
@@ -43,10 +63,10 @@ def _within_domain(base_url: str, url: str) -> bool:
 
 def _extract_from_items(
     list_url: str,
-    soup: BeautifulSoup,
+    soup: "BeautifulSoup",
     src: Dict[str, Any],
-) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
+) -> List[Item]:
+    items: List[Item] = []
 
     item_selector = src.get("item_selector")
     title_selector = src.get("title_selector")
@@ -81,20 +101,13 @@ def _extract_from_items(
                 summary = snode.get_text(strip=True)
 
         if title and url:
-            items.append(
-                {
-                    "title": title,
-                    "url": url,
-                    "published_at": published_at,
-                    "rss_summary": summary,
-                }
-            )
+            items.append(Item(guid=url, url=url, title=title, published_at=published_at, rss_summary=summary))
 
     return items
 
 
-def _extract_heuristic(list_url: str, soup: BeautifulSoup, src: Dict[str, Any]) -> List[Dict[str, Any]]:
-    items: List[Dict[str, Any]] = []
+def _extract_heuristic(list_url: str, soup: "BeautifulSoup", src: Dict[str, Any]) -> List[Item]:
+    items: List[Item] = []
     seen = set()
 
     include_regex = src.get("include_url_regex")
@@ -130,23 +143,23 @@ def _extract_heuristic(list_url: str, soup: BeautifulSoup, src: Dict[str, Any])
         if time_tag:
             published_at = _parse_datetime(time_tag.get("datetime") or time_tag.get_text(strip=True))
 
-        items.append(
-            {
-                "title": title,
-                "url": url,
-                "published_at": published_at,
-                "rss_summary": None,
-            }
-        )
+        items.append(Item(guid=url, url=url, title=title, published_at=published_at))
         seen.add(url)
 
     return items
 
 
-def fetch_web_list_entries(src: Dict[str, Any]) -> List[Dict[str, Any]]:
+def list_fetch_key(src: Dict[str, Any]) -> str:
+    return json.dumps({key: src.get(key) for key in LIST_FETCH_KEYS}, sort_keys=True)
+
+
+def fetch_web_list_entries(src: Dict[str, Any], timeout: float) -> List[Item]:
+    from bs4 import BeautifulSoup
+
     list_url = src["list_url"]
-    resp = requests.get(list_url, timeout=30, headers={"User-Agent": "ai-news-feed/1.0"})
-    resp.raise_for_status()
+    with span("web_list_fetch", host=urlparse(list_url).netloc):
+        resp = http_get(list_url, timeout=timeout, headers={"User-Agent": "ai-news-feed/1.0"})
+        resp.raise_for_status()
     soup = BeautifulSoup(resp.text, "html.parser")
 
     items = _extract_from_items(list_url, soup, src)
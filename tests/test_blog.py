@@ -0,0 +1,23 @@
+﻿import os
+
+import pytest
+
+from ai_news_feed.blog import blog_stream
+
+
+def test_failed_stream_leaves_no_tmp_file(tmp_path):
+    out_path = str(tmp_path / "blog.md")
+    with pytest.raises(RuntimeError):
+        with blog_stream(out_path, echo=False) as on_chunk:
+            on_chunk("## 部分内容")
+            raise RuntimeError("stream dropped")
+    assert not os.path.exists(out_path + ".tmp")
+    assert not os.path.exists(out_path)
+
+
+def test_completed_stream_keeps_tmp_file_for_publishing(tmp_path):
+    out_path = str(tmp_path / "blog.md")
+    with blog_stream(out_path, echo=False) as on_chunk:
+        on_chunk("## 完整内容")
+    with open(out_path + ".tmp", encoding="utf-8") as f:
+        assert f.read() == "## 完整内容"
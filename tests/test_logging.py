@@ -0,0 +1,30 @@
+﻿import logging
+import os
+from datetime import datetime
+
+from ai_news_feed import pipeline
+from ai_news_feed.utils import LOCAL_TZ
+
+
+def test_setup_logging_moves_to_the_new_day(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    root.handlers = []
+    monkeypatch.setattr(pipeline, "_log_file", {"path": None, "handler": None})
+    try:
+        for day in (1, 1, 2):
+            monkeypatch.setattr(pipeline, "now_local", lambda day=day: datetime(2025, 3, day, 9, tzinfo=LOCAL_TZ))
+            pipeline.setup_logging()
+            logging.info("day %s", day)
+        file_handlers = [h for h in root.handlers if isinstance(h, logging.FileHandler)]
+        assert len(file_handlers) == 1
+        file_handlers[0].flush()
+        with open(os.path.join("logs", "app-2025-03-01.log"), encoding="utf-8") as f:
+            assert "day 2" not in f.read()
+        with open(os.path.join("logs", "app-2025-03-02.log"), encoding="utf-8") as f:
+            assert "day 2" in f.read()
+    finally:
+        for handler in root.handlers:
+            handler.close()
+        root.handlers, root.level = saved_handlers, saved_level
@@ -0,0 +1,17 @@
+﻿import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_news_feed.profiling import profile_session
+
+
+def _worker_task(n):
+    return sum(i * i for i in range(n))
+
+
+def test_cprofile_includes_worker_threads(tmp_path):
+    out_path = str(tmp_path / "run.prof")
+    with profile_session("cprofile", out_path, "run"):
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            list(pool.map(_worker_task, [10000] * 6))
+    calls = {func[2]: stat[1] for func, stat in pstats.Stats(out_path).stats.items()}
+    assert calls.get("_worker_task") == 6
@@ -0,0 +1,43 @@
+﻿import threading
+import time
+
+from ai_news_feed.ratelimit import CircuitBreaker
+
+
+def _open_breaker(cooldown_sec: float) -> CircuitBreaker:
+    breaker = CircuitBreaker(failure_threshold=2, cooldown_sec=cooldown_sec)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+    return breaker
+
+
+def test_half_open_admits_exactly_one_probe():
+    breaker = _open_breaker(0.05)
+    time.sleep(0.06)
+    start = threading.Barrier(8)
+    allowed = []
+
+    def call() -> None:
+        start.wait()
+        allowed.append(breaker.allow())
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert allowed.count(True) == 1
+
+
+def test_probe_outcome_closes_or_reopens():
+    breaker = _open_breaker(0.05)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
@@ -0,0 +1,124 @@
+﻿import os
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from ai_news_feed import reprocess  # noqa: E402
+from ai_news_feed.config import load_config  # noqa: E402
+from ai_news_feed.db import (  # noqa: E402
+    complete_pending_item,
+    get_connection,
+    get_item,
+    init_db,
+    insert_item,
+    iter_items_between,
+)
+from ai_news_feed.markdown import digest_item, render_weekly  # noqa: E402
+from ai_news_feed.models import Item  # noqa: E402
+from ai_news_feed.vectors import open_vector_store, rebuild_vector_store  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TITLE = "OpenAI releases o5 reasoning model with native tool use"
+BULLETS = ["OpenAI 发布 o5 推理模型，原生支持工具调用。", "新模型在数学和代码基准上大幅领先。", "API 价格与 o4 持平。"]
+
+
+def _config(tmp_path):
+    cfg = load_config(os.path.join(REPO_ROOT, "config.yaml"))
+    cfg["storage"].update(
+        db_path=str(tmp_path / "news.db"),
+        vector_path=str(tmp_path / "news.vectors"),
+        archive_path=str(tmp_path / "archive"),
+    )
+    cfg["summarizer"]["concurrency"] = 1
+    return cfg
+
+
+def _processed(url, collected_at, title=TITLE):
+    return Item(
+        url=url,
+        title=title,
+        dedup_key=url,
+        source="Example",
+        collected_at=collected_at,
+        content_status="full",
+        summary_bullets=BULLETS,
+        so_what="推理模型竞争加剧。",
+        primary_category="model_releases",
+        tags=["OpenAI", "o5", "推理模型"],
+        status="processed",
+    )
+
+
+def _render(cfg, conn, start, end, week):
+    items = [digest_item(row) for row in iter_items_between(conn, start, end)]
+    return render_weekly(items, cfg, week=week, conn=conn)
+
+
+def _summarize(item, content, cfg):
+    return {
+        "summary_bullets_zh": BULLETS,
+        "so_what_zh": "推理模型竞争加剧。",
+        "primary_category_id": "model_releases",
+        "tags": ["OpenAI", "o5", "推理模型"],
+        "impact": "High",
+        "confidence": 0.9,
+        "reason": "模型发布",
+    }
+
+
+def test_reprocess_keeps_related_links_in_the_past(tmp_path, monkeypatch):
+    cfg = _config(tmp_path)
+    init_db(cfg["storage"]["db_path"])
+    with get_connection(cfg["storage"]["db_path"]) as conn:
+        insert_item(conn, _processed("https://a.example/o5", "2025-03-05T09:00:00+11:00"))
+        insert_item(conn, _processed("https://b.example/o5-follow-up", "2025-03-19T09:00:00+11:00"))
+    rebuild_vector_store(cfg)
+
+    monkeypatch.setattr(reprocess, "fetch_and_extract", lambda url, summary, timeout, max_chars: ("正文", "full"))
+    monkeypatch.setattr(reprocess, "summarize_and_classify", _summarize)
+    job = reprocess.reprocess_items(cfg, {})
+    assert job["done"] == 2
+
+    # One vector per item: reprocessing must not double the document counts.
+    assert open_vector_store(cfg).count == 2
+    with get_connection(cfg["storage"]["db_path"]) as conn:
+        earlier = _render(cfg, conn, "2025-03-03T00:00:00+11:00", "2025-03-10T00:00:00+11:00", (2025, 10))
+        later = _render(cfg, conn, "2025-03-17T00:00:00+11:00", "2025-03-24T00:00:00+11:00", (2025, 12))
+    assert "https://b.example/o5-follow-up" not in earlier
+    assert "相关报道" not in earlier
+    assert "https://a.example/o5" in later.split("相关报道")[1]
+
+
+def test_reprocess_falls_back_to_the_rss_summary_of_failed_items(tmp_path, monkeypatch):
+    cfg = _config(tmp_path)
+    init_db(cfg["storage"]["db_path"])
+    collected_at = "2025-03-05T09:00:00+11:00"
+    with get_connection(cfg["storage"]["db_path"]) as conn:
+        item_id = insert_item(
+            conn,
+            Item(
+                url="https://a.example/o5",
+                title=TITLE,
+                dedup_key="https://a.example/o5",
+                source="Example",
+                collected_at=collected_at,
+                rss_summary="Feed summary",
+                status="pending",
+            ),
+        )
+        complete_pending_item(
+            conn, item_id, Item(collected_at=collected_at, status="failed", error="Article unavailable")
+        )
+        assert get_item(conn, item_id)["rss_summary"] == "Feed summary"
+
+    summaries = []
+    monkeypatch.setattr(
+        reprocess,
+        "fetch_and_extract",
+        lambda url, summary, timeout, max_chars: summaries.append(summary) or (summary, "rss_only"),
+    )
+    monkeypatch.setattr(reprocess, "summarize_and_classify", _summarize)
+    job = reprocess.reprocess_items(cfg, {"status": ["failed"]})
+    assert job["done"] == 1
+    assert summaries == ["Feed summary"]